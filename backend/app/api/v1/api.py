@@ -9,6 +9,8 @@ from app.api.v1.endpoints import (
     timeline,
     chat,
     search,
+    sync,
+    imports,
 )
 
 api_router = APIRouter()
@@ -23,3 +25,5 @@ api_router.include_router(
 api_router.include_router(timeline.router, prefix="/timeline", tags=["Timeline"])
 api_router.include_router(chat.router, prefix="/chat", tags=["Chat"])
 api_router.include_router(search.router, prefix="/search", tags=["Search"])
+api_router.include_router(sync.router, prefix="/sync", tags=["Sync"])
+api_router.include_router(imports.router, prefix="/import", tags=["Import"])
@@ -1,11 +1,22 @@
 """Chat endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, and_, tuple_
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 from uuid import UUID
+import asyncio
+import functools
+import json
+import logging
 
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.config import settings
+from app.core.database import get_db, AsyncSessionLocal
+from app.core.etag import chat_session_etag, chat_sessions_etag
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.responses import ORJSONResponse, dump_list
+from app.core.security import get_current_user_or_supabase
 from app.models.user import User
 from app.models.chat import ChatSession, ChatMessage, MessageRole
 from app.schemas.chat import (
@@ -15,7 +26,17 @@ from app.schemas.chat import (
     ChatMessageResponse,
     ChatRequest,
     ChatResponse,
+    PatientContextResponse,
 )
+from app.schemas.common import CursorPage
+from app.services import llm
+from app.services.answer_cache import answer_cache, CachedAnswer
+from app.services.chat_context import ChatContextBuilder, save_references
+from app.services.chat_history import schedule_summary_fold
+from app.services.data_version import get_data_version
+from app.services.patient_context import patient_context_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -23,7 +44,7 @@ router = APIRouter()
 @router.post("/sessions", response_model=ChatSessionResponse, status_code=status.HTTP_201_CREATED)
 async def create_chat_session(
     session_data: ChatSessionCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_or_supabase),
     db: AsyncSession = Depends(get_db),
 ):
     """Create a new chat session"""
@@ -34,9 +55,13 @@ async def create_chat_session(
     return session
 
 
-@router.get("/sessions", response_model=list[ChatSessionResponse])
+@router.get(
+    "/sessions",
+    response_model=list[ChatSessionResponse],
+    dependencies=[Depends(chat_sessions_etag)],
+)
 async def list_chat_sessions(
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_or_supabase),
     db: AsyncSession = Depends(get_db),
 ):
     """List all chat sessions for the current user"""
@@ -49,40 +74,209 @@ async def list_chat_sessions(
     return sessions
 
 
-@router.get("/sessions/{session_id}/messages", response_model=list[ChatMessageResponse])
+@router.get(
+    "/sessions/{session_id}/messages",
+    response_model=CursorPage[ChatMessageResponse],
+    dependencies=[Depends(chat_session_etag)],
+)
 async def get_chat_messages(
     session_id: UUID,
-    current_user: User = Depends(get_current_user),
+    before: Optional[str] = Query(None, description="Cursor: messages older than this"),
+    after: Optional[str] = Query(None, description="Cursor: messages newer than this"),
+    page_size: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user_or_supabase),
     db: AsyncSession = Depends(get_db),
 ):
-    """Get all messages in a chat session"""
-    # Verify session belongs to user
-    result = await db.execute(
-        select(ChatSession).where(
-            ChatSession.id == session_id, ChatSession.user_id == current_user.id
+    """
+    Get a page of messages in a chat session, oldest first
+
+    Without a cursor the newest page is returned. Pass `prev_cursor` as
+    `before` to load older messages and `next_cursor` as `after` to load newer
+    ones. Pages are keyset-paginated on (created_at, id).
+    """
+    if before is not None and after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only one of before and after may be given",
         )
+    cursor = decode_cursor(before or after, datetime.fromisoformat, UUID)
+    message_key = tuple_(ChatMessage.created_at, ChatMessage.id)
+
+    # Outer join so the ownership check and the page come back in one query:
+    # no rows means no such session for this user, a NULL message an empty page
+    join_on = ChatMessage.session_id == ChatSession.id
+    if before is not None:
+        join_on = and_(join_on, message_key < cursor)
+    elif after is not None:
+        join_on = and_(join_on, message_key > cursor)
+    if after is not None:
+        order_by = (ChatMessage.created_at, ChatMessage.id)
+    else:
+        order_by = (ChatMessage.created_at.desc(), ChatMessage.id.desc())
+
+    result = await db.execute(
+        select(ChatSession.id, ChatMessage)
+        .select_from(ChatSession)
+        .outerjoin(ChatMessage, join_on)
+        .where(ChatSession.id == session_id, ChatSession.user_id == current_user.id)
+        .order_by(*order_by)
+        .limit(page_size + 1)
     )
-    session = result.scalar_one_or_none()
+    rows = result.all()
 
-    if not session:
+    if not rows:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found"
         )
 
-    # Get messages
-    result = await db.execute(
-        select(ChatMessage)
-        .where(ChatMessage.session_id == session_id)
-        .order_by(ChatMessage.created_at)
+    messages = [row.ChatMessage for row in rows if row.ChatMessage is not None]
+    has_more = len(messages) > page_size
+    messages = messages[:page_size]
+    if after is None:
+        messages.reverse()
+
+    page = CursorPage.model_construct(
+        items=dump_list(ChatMessageResponse, messages), page_size=page_size
+    )
+    # The message a cursor points at is always on the far side of the page
+    if after is None:
+        more_older, more_newer = has_more, before is not None
+    else:
+        more_older, more_newer = True, has_more
+    if messages and more_older:
+        page.prev_cursor = encode_cursor(messages[0].created_at, messages[0].id)
+    if messages and more_newer:
+        page.next_cursor = encode_cursor(messages[-1].created_at, messages[-1].id)
+    return ORJSONResponse(page)
+
+
+@router.get("/context", response_model=PatientContextResponse)
+async def get_patient_context(
+    current_user: User = Depends(get_current_user_or_supabase),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get the compact patient context used in chat prompts
+
+    Active medications, allergies and diagnoses plus a deduplicated timeline,
+    trimmed to a token budget. Cached until the user's records change.
+    """
+    context = await patient_context_cache.get(db, current_user.id)
+    return PatientContextResponse(
+        context=context.text,
+        token_count=context.token_count,
+        data_version=context.data_version,
+        event_count=context.event_count,
+        omitted_event_count=context.omitted_event_count,
+    )
+
+
+def _wants_event_stream(request: Request) -> bool:
+    """Check whether the client negotiated a server-sent event stream"""
+    return "text/event-stream" in request.headers.get("accept", "")
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _assistant_message(session_id: UUID, user_id: UUID, completion: llm.Completion) -> ChatMessage:
+    """Build the assistant message for a finished completion"""
+    return ChatMessage(
+        session_id=session_id,
+        user_id=user_id,
+        role=MessageRole.ASSISTANT,
+        content=completion.text,
+        token_count=completion.output_tokens,
+        model_name=completion.model_name,
+        doc_metadata={
+            "provider": completion.provider,
+            "time_to_first_token": completion.time_to_first_token,
+        },
+    )
+
+
+async def _replay(text: str) -> AsyncIterator[str]:
+    """Replay a cached answer as a single token"""
+    yield text
+
+
+def _remember_answer(
+    user_id: UUID,
+    question: str,
+    query_vector: Optional[List[float]],
+    data_version: int,
+    completion: llm.Completion,
+    sources: List[Dict[str, Any]],
+) -> None:
+    """Store a generated answer in the semantic answer cache"""
+    if query_vector is None or not completion.text:
+        return
+    answer_cache.store(
+        user_id,
+        query_vector,
+        CachedAnswer(
+            question=question,
+            answer=completion.text,
+            sources=sources,
+            model_name=completion.model_name,
+            token_count=completion.output_tokens,
+            data_version=data_version,
+            embedding=(),
+        ),
+    )
+
+
+async def _stream_assistant_reply(
+    session_id: UUID,
+    user_id: UUID,
+    completion: llm.Completion,
+    tokens: AsyncIterator[str],
+    sources: List[Dict[str, Any]],
+    on_complete: Optional[Callable[[llm.Completion], None]] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream the assistant reply as server-sent events
+
+    Emits one `token` event per text delta, then persists the assistant message
+    and finishes with a `sources` event carrying the saved message and sources.
+    """
+    try:
+        async for text in tokens:
+            yield _sse("token", {"text": text})
+    except Exception as e:
+        logger.error(f"Chat stream failed: {str(e)}", exc_info=True)
+        yield _sse("error", {"detail": "Failed to generate response"})
+        return
+
+    if on_complete is not None:
+        on_complete(completion)
+
+    # The request-scoped session is already closed once streaming starts
+    async with AsyncSessionLocal() as db:
+        assistant_message = _assistant_message(session_id, user_id, completion)
+        db.add(assistant_message)
+        await db.flush()
+        await save_references(db, assistant_message.id, sources)
+        await db.commit()
+        await db.refresh(assistant_message)
+
+    yield _sse(
+        "sources",
+        {
+            "session_id": str(session_id),
+            "message": ChatMessageResponse.model_validate(assistant_message).model_dump(mode="json"),
+            "sources": sources,
+        },
     )
-    messages = result.scalars().all()
-    return messages
 
 
 @router.post("/", response_model=ChatResponse)
 async def send_chat_message(
     chat_request: ChatRequest,
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    current_user: User = Depends(get_current_user_or_supabase),
     db: AsyncSession = Depends(get_db),
 ):
     """
@@ -91,10 +285,16 @@ async def send_chat_message(
     This endpoint:
     1. Creates or uses existing session
     2. Saves user message
-    3. Performs RAG search for relevant context
-    4. Generates AI response using context
-    5. Saves AI response
-    6. Returns response with sources
+    3. Returns a cached answer if a near-identical question was already
+       answered against the same version of the user's data
+    4. Performs RAG search for relevant context
+    5. Generates AI response using context
+    6. Saves AI response
+    7. Returns response with sources
+
+    Clients sending `Accept: text/event-stream` receive the response as
+    server-sent events: `token` events as the model generates text, then a
+    final `sources` event with the saved message and its sources.
     """
     # Create or get session
     if chat_request.session_id:
@@ -120,19 +320,92 @@ async def send_chat_message(
         user_id=current_user.id,
         role=MessageRole.USER,
         content=chat_request.message,
+        token_count=llm.estimate_tokens(chat_request.message),
     )
     db.add(user_message)
+    await db.commit()
 
-    # TODO: Implement RAG search and AI response generation
-    # For now, return a placeholder response
-    assistant_response = ChatMessage(
-        session_id=session.id,
-        user_id=current_user.id,
-        role=MessageRole.ASSISTANT,
-        content="This is a placeholder response. RAG and AI integration will be implemented.",
-        model_name="placeholder",
+    # Answers only depend on the question and the user's data when the turn
+    # does not build on earlier conversation, so only those are cached
+    cacheable = settings.CHAT_ANSWER_CACHE_ENABLED and (
+        chat_request.session_id is None or not chat_request.include_history
     )
+    query_vector: Optional[List[float]] = None
+    data_version = 0
+    cached = None
+    if cacheable:
+        try:
+            query_vector, data_version = await asyncio.gather(
+                llm.embed(chat_request.message), get_data_version(db, current_user.id)
+            )
+            cached = answer_cache.lookup(current_user.id, query_vector, data_version)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {str(e)}")
+
+    on_complete = None
+    if cached is not None:
+        completion = llm.Completion(
+            provider="answer_cache",
+            model_name=cached.model_name,
+            text=cached.answer,
+            output_tokens=cached.token_count,
+        )
+        sources = cached.sources
+        tokens = _replay(completion.text)
+    else:
+        # Retrieve context for the answer
+        context = await ChatContextBuilder(
+            user_id=current_user.id,
+            session_id=session.id,
+            exclude_message_id=user_message.id,
+            query_vector=query_vector,
+        ).build(
+            chat_request.message,
+            include_history=chat_request.include_history,
+            max_history=chat_request.max_history,
+        )
+        if context.history_fold_until is not None:
+            schedule_summary_fold(session.id, context.history_fold_until)
+
+        sources = context.sources()
+        completion = llm.new_completion()
+        tokens = llm.stream_chat(
+            context.messages(chat_request.message), completion, system=context.system_prompt()
+        )
+        if cacheable:
+            on_complete = functools.partial(
+                _remember_answer,
+                current_user.id,
+                chat_request.message,
+                query_vector,
+                data_version,
+                sources=sources,
+            )
+
+    if _wants_event_stream(request):
+        return StreamingResponse(
+            _stream_assistant_reply(
+                session.id, current_user.id, completion, tokens, sources, on_complete
+            ),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        async for _ in tokens:
+            pass
+    except Exception as e:
+        logger.error(f"Chat completion failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY, detail="Failed to generate response"
+        )
+    if on_complete is not None:
+        on_complete(completion)
+
+    assistant_response = _assistant_message(session.id, current_user.id, completion)
     db.add(assistant_response)
+    await db.flush()
+    await save_references(db, assistant_response.id, sources)
 
     await db.commit()
     await db.refresh(assistant_response)
@@ -140,5 +413,5 @@ async def send_chat_message(
     return ChatResponse(
         session_id=session.id,
         message=ChatMessageResponse.model_validate(assistant_response),
-        sources=[],
+        sources=sources,
     )
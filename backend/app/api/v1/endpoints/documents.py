@@ -1,21 +1,36 @@
 """Document endpoints"""
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List
+from sqlalchemy import select
+from typing import List, Optional, Union
 from uuid import UUID
+from datetime import datetime
 
 from app.core.database import get_db
+from app.core.etag import user_data_etag
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.document import Document, DocumentType, ProcessingStatus
-from app.schemas.document import DocumentResponse, DocumentList, DocumentUpload
-from app.schemas.common import PaginatedResponse
+from app.schemas.document import (
+    DocumentResponse,
+    DocumentList,
+    DocumentUpload,
+    DocumentItem,
+    DOCUMENT_FIELDS,
+)
+from app.core.responses import ORJSONResponse
+from app.schemas.common import PaginatedResponse, CursorPage
 from app.core.config import settings
+from app.core.pagination import Keyset, check_pagination_mode, paginate_keyset
+from app.services.row_counts import get_row_count
 from supabase import create_client
 
 router = APIRouter()
 
+# Newest upload first; matches idx_documents_user_uploaded
+DOCUMENT_KEYSET = Keyset(Document.uploaded_at, Document.id, parse=datetime.fromisoformat)
+
+
 
 @router.post("/upload", response_model=DocumentUpload, status_code=status.HTTP_201_CREATED)
 async def upload_document(
@@ -86,38 +101,84 @@ async def upload_document(
         )
 
 
-@router.get("/", response_model=PaginatedResponse)
+@router.get(
+    "/",
+    response_model=Union[CursorPage[DocumentItem], PaginatedResponse],
+    dependencies=[Depends(user_data_etag)],
+)
 async def list_documents(
-    page: int = Query(1, ge=1),
+    page: Optional[int] = Query(None, ge=1, description="Page number; defaults to 1"),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: bool = Query(False, description="Page through cursors; implied by after or before"),
+    after: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    before: Optional[str] = Query(None, description="prev_cursor of the following page"),
+    include_total: bool = Query(True, description="Set to false to skip the total count"),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; defaults to a summary"
+    ),
     document_type: DocumentType = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """List all documents for the current user"""
-    query = select(Document).where(Document.user_id == current_user.id)
+    """
+    List all documents for the current user, newest upload first
+
+    Offset pagination by default; `cursor=true`, `after` or `before`
+    switch to cursor pagination, which cannot be combined with `page`. Totals
+    come from trigger-maintained counters unless `include_total=false`.
+    """
+    use_cursor = check_pagination_mode(page, after, before, cursor)
+    selected = DOCUMENT_FIELDS.parse(fields)
+    query = (
+        select(Document)
+        .options(DOCUMENT_FIELDS.load_only(selected, Document.uploaded_at))
+        .where(Document.user_id == current_user.id)
+    )
 
     if document_type:
         query = query.where(Document.document_type == document_type)
 
-    # Get total count
-    count_query = select(func.count()).select_from(query.subquery())
-    total = await db.scalar(count_query)
+    total = None
+    if include_total:
+        total = await get_row_count(db, current_user.id, "documents", document_type)
+
+    if use_cursor:
+        documents, next_cursor, prev_cursor = await paginate_keyset(
+            db, query, DOCUMENT_KEYSET, page_size, after=after, before=before
+        )
+        return ORJSONResponse(
+            CursorPage.model_construct(
+                items=DOCUMENT_FIELDS.serialize(documents, selected),
+                page_size=page_size,
+                total=total,
+                next_cursor=next_cursor,
+                prev_cursor=prev_cursor,
+            )
+        )
 
     # Get paginated results
-    query = query.offset((page - 1) * page_size).limit(page_size).order_by(Document.uploaded_at.desc())
+    page = page or 1
+    query = (
+        query.order_by(*DOCUMENT_KEYSET.order_by())
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+    )
     result = await db.execute(query)
     documents = result.scalars().all()
 
-    return PaginatedResponse.create(
-        items=[DocumentResponse.model_validate(doc) for doc in documents],
-        total=total,
-        page=page,
-        page_size=page_size,
+    return ORJSONResponse(
+        PaginatedResponse.create(
+            items=DOCUMENT_FIELDS.serialize(documents, selected),
+            total=total,
+            page=page,
+            page_size=page_size,
+        )
     )
 
 
-@router.get("/{document_id}", response_model=DocumentResponse)
+@router.get(
+    "/{document_id}", response_model=DocumentResponse, dependencies=[Depends(user_data_etag)]
+)
 async def get_document(
     document_id: UUID,
     current_user: User = Depends(get_current_user),
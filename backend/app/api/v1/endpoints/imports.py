@@ -0,0 +1,40 @@
+"""Record import endpoints"""
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_db
+from app.core.security import get_current_user
+from app.models.user import User
+from app.schemas.imports import FhirImportSummary
+from app.schemas.medical_entity import EntityMergeResponse
+from app.services.entity_dedup import deduplicate_new_entities
+from app.services.fhir_import import FhirImportError, import_fhir_bundle
+
+router = APIRouter()
+
+
+@router.post("/fhir", response_model=FhirImportSummary, status_code=status.HTTP_201_CREATED)
+async def import_fhir(
+    file: UploadFile = File(..., description="FHIR R4 Bundle (JSON)"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Import a FHIR R4 bundle exported from a patient portal
+
+    The bundle is parsed as a stream and written in batches, so large
+    exports import with flat memory use. Observations, medication
+    statements, conditions, immunizations and allergies become medical
+    entities, with timeline events where they are dated; other resources
+    are counted as skipped. Imported entities are then deduplicated
+    against the user's records. The import is all-or-nothing.
+    """
+    try:
+        summary = await import_fhir_bundle(db, current_user.id, file)
+    except FhirImportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if summary.entities_created:
+        _, merges = await deduplicate_new_entities(db, current_user.id)
+        summary.merges = [EntityMergeResponse.model_validate(merge) for merge in merges]
+    await db.commit()
+    return summary
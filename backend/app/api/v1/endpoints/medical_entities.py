@@ -1,23 +1,48 @@
 """Medical Entity endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import and_, func, or_, select
 from uuid import UUID
-from typing import List
+from typing import List, Optional, Tuple, Union
+from datetime import date
+from decimal import Decimal
 
 from app.core.database import get_db
+from app.core.etag import check_etag, user_data_etag
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.medical_entity import MedicalEntity, EntityType
 from app.schemas.medical_entity import (
     MedicalEntityCreate,
+    MedicalEntityBulkCreate,
+    MedicalEntityBulkResponse,
+    EntityDedupResponse,
+    EntityMergeResponse,
     MedicalEntityUpdate,
     MedicalEntityResponse,
+    MedicalEntityItem,
+    LabSeriesResponse,
+    MedicationPeriodResponse,
+    ENTITY_FIELDS,
 )
-from app.schemas.common import PaginatedResponse
+from app.core.responses import ORJSONResponse, dump_list
+from app.schemas.common import PaginatedResponse, CursorPage
+from app.core.pagination import Keyset, check_pagination_mode, paginate_keyset
+from app.services.entity_dedup import deduplicate_new_entities
+from app.services.entity_ingest import ingest_medical_entities
+from app.services.lab_series import get_lab_series
+from app.services.medication_periods import find_active_medications, medication_period_cache
+from app.services.data_version import get_data_version
+from app.services.row_counts import get_row_count
+from app.services.timeline_derivation import derive_timeline_events
 
 router = APIRouter()
 
+# Most recent first, undated entities last; matches idx_entities_user_date
+ENTITY_KEYSET = Keyset(
+    MedicalEntity.entity_date, MedicalEntity.id, parse=date.fromisoformat, nullable=True
+)
+
 
 @router.post("/", response_model=MedicalEntityResponse, status_code=status.HTTP_201_CREATED)
 async def create_medical_entity(
@@ -25,46 +50,309 @@ async def create_medical_entity(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Create a new medical entity"""
+    """Create a new medical entity, with its derived timeline events"""
     entity = MedicalEntity(user_id=current_user.id, **entity_data.model_dump())
     db.add(entity)
+    await db.flush()
+    await derive_timeline_events(db, current_user.id, entity_ids=[entity.id])
     await db.commit()
     await db.refresh(entity)
     return entity
 
 
-@router.get("/", response_model=PaginatedResponse)
+@router.post(
+    "/bulk", response_model=MedicalEntityBulkResponse, status_code=status.HTTP_201_CREATED
+)
+async def bulk_create_medical_entities(
+    bulk_data: MedicalEntityBulkCreate,
+    atomic: bool = Query(False, description="Reject the whole batch if any item is invalid"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Create many medical entities at once
+
+    Items are validated individually; valid ones are loaded with a single
+    COPY and rejected ones are reported by index. With `atomic=true` a batch
+    containing any invalid item is rejected with 422 and nothing is created.
+    New entities are then deduplicated as by POST /deduplicate, in the same
+    transaction.
+    """
+    result = await ingest_medical_entities(
+        db, current_user.id, bulk_data.entities, atomic=atomic
+    )
+    if atomic and result.errors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[error.model_dump(mode="json") for error in result.errors],
+        )
+    if result.created:
+        _, merges = await deduplicate_new_entities(db, current_user.id)
+        result.merges = [EntityMergeResponse.model_validate(merge) for merge in merges]
+    await db.commit()
+    return result
+
+
+@router.post("/deduplicate", response_model=EntityDedupResponse)
+async def deduplicate_medical_entities(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Merge duplicate medical entities written since the last run
+
+    New entities are compared against same-type entities with the same
+    name and a nearby date. Each set of duplicates is merged into the
+    verified or oldest one, with timeline links and chat references moved
+    over to it.
+    """
+    checked, merges = await deduplicate_new_entities(db, current_user.id)
+    await db.commit()
+    return EntityDedupResponse(
+        checked=checked,
+        merged=sum(len(merge.merged_ids) for merge in merges),
+        merges=[EntityMergeResponse.model_validate(merge) for merge in merges],
+    )
+
+
+@router.get(
+    "/",
+    response_model=Union[CursorPage[MedicalEntityItem], PaginatedResponse],
+    dependencies=[Depends(user_data_etag)],
+)
 async def list_medical_entities(
-    page: int = Query(1, ge=1),
+    page: Optional[int] = Query(None, ge=1, description="Page number; defaults to 1"),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: bool = Query(False, description="Page through cursors; implied by after or before"),
+    after: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    before: Optional[str] = Query(None, description="prev_cursor of the following page"),
+    include_total: bool = Query(True, description="Set to false to skip the total count"),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; defaults to a summary"
+    ),
     entity_type: EntityType = None,
+    name: Optional[str] = Query(
+        None, min_length=1, description="Medication or lab test name, matched case-insensitively"
+    ),
+    min_value: Optional[Decimal] = Query(None, description="Lowest lab result value"),
+    max_value: Optional[Decimal] = Query(None, description="Highest lab result value"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """List all medical entities for the current user"""
-    query = select(MedicalEntity).where(MedicalEntity.user_id == current_user.id)
+    """
+    List all medical entities for the current user, most recent first
+
+    Offset pagination by default; `cursor=true`, `after` or `before`
+    switch to cursor pagination, which cannot be combined with `page`. Totals
+    come from trigger-maintained counters unless `include_total=false`. Name
+    and value filters use the generated medication_name, lab_test_name and
+    lab_value columns and their indexes.
+    """
+    use_cursor = check_pagination_mode(page, after, before, cursor)
+    selected = ENTITY_FIELDS.parse(fields)
+    query = (
+        select(MedicalEntity)
+        .options(ENTITY_FIELDS.load_only(selected, MedicalEntity.entity_date))
+        .where(MedicalEntity.user_id == current_user.id)
+    )
 
     if entity_type:
         query = query.where(MedicalEntity.entity_type == entity_type)
+    if name:
+        name_key = name.strip().lower()
+        query = query.where(
+            or_(
+                and_(
+                    MedicalEntity.medication_name.is_not(None),
+                    func.lower(MedicalEntity.medication_name) == name_key,
+                ),
+                and_(
+                    MedicalEntity.lab_test_name.is_not(None),
+                    func.lower(MedicalEntity.lab_test_name) == name_key,
+                ),
+            )
+        )
+    if min_value is not None:
+        query = query.where(MedicalEntity.lab_value >= min_value)
+    if max_value is not None:
+        query = query.where(MedicalEntity.lab_value <= max_value)
+
+    total = None
+    if include_total and (name or min_value is not None or max_value is not None):
+        # The counters are per type only, so other filters still need a count
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    elif include_total:
+        total = await get_row_count(db, current_user.id, "medical_entities", entity_type)
 
-    count_query = select(func.count()).select_from(query.subquery())
-    total = await db.scalar(count_query)
+    if use_cursor:
+        entities, next_cursor, prev_cursor = await paginate_keyset(
+            db, query, ENTITY_KEYSET, page_size, after=after, before=before
+        )
+        return ORJSONResponse(
+            CursorPage.model_construct(
+                items=ENTITY_FIELDS.serialize(entities, selected),
+                page_size=page_size,
+                total=total,
+                next_cursor=next_cursor,
+                prev_cursor=prev_cursor,
+            )
+        )
 
-    query = query.offset((page - 1) * page_size).limit(page_size).order_by(
-        MedicalEntity.entity_date.desc()
+    page = page or 1
+    query = (
+        query.order_by(*ENTITY_KEYSET.order_by())
+        .offset((page - 1) * page_size)
+        .limit(page_size)
     )
     result = await db.execute(query)
     entities = result.scalars().all()
 
-    return PaginatedResponse.create(
-        items=[MedicalEntityResponse.model_validate(e) for e in entities],
-        total=total,
-        page=page,
-        page_size=page_size,
+    return ORJSONResponse(
+        PaginatedResponse.create(
+            items=ENTITY_FIELDS.serialize(entities, selected),
+            total=total,
+            page=page,
+            page_size=page_size,
+        )
+    )
+
+
+def _period_query(
+    on: Optional[date] = Query(None, description="Medications taken on this date"),
+    start_date: Optional[date] = Query(None, description="Or: taken at any time from this date"),
+    end_date: Optional[date] = Query(None, description="... up to this date"),
+) -> Tuple[date, date]:
+    """Resolve `on` or a `start_date`/`end_date` range into an inclusive range, default today"""
+    if on is not None and (start_date is not None or end_date is not None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give either on or start_date/end_date, not both",
+        )
+    if on is not None:
+        return on, on
+    start = start_date or end_date or date.today()
+    end = end_date or start
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start_date must not be after end_date",
+        )
+    return start, end
+
+
+async def medication_period_etag(
+    request: Request,
+    period: Tuple[date, date] = Depends(_period_query),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> None:
+    """
+    ETag for medication reads: the data version and the resolved date range
+
+    The range defaults to today, so a tag from yesterday must not match.
+    """
+    version = await get_data_version(db, current_user.id)
+    check_etag(request, "data", current_user.id, version, *period)
+
+
+@router.get(
+    "/medications/active",
+    response_model=List[MedicalEntityResponse],
+    dependencies=[Depends(medication_period_etag)],
+)
+async def list_active_medications(
+    period: Tuple[date, date] = Depends(_period_query),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    List medications taken on a date, or at any time in a date range
+
+    Defaults to today. Medications without an end date count as ongoing;
+    medications without a start date are left out.
+    """
+    start, end = period
+    medications = await find_active_medications(db, current_user.id, start, end)
+    return ORJSONResponse(dump_list(MedicalEntityResponse, medications))
+
+
+@router.get(
+    "/medications/periods",
+    response_model=List[MedicationPeriodResponse],
+    dependencies=[Depends(medication_period_etag)],
+)
+async def list_medication_periods(
+    period: Tuple[date, date] = Depends(_period_query),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Medication periods on a date or in a range, with the medications each overlaps
+
+    A lightweight variant of /medications/active for the timeline canvas,
+    answered from a per-user in-memory interval tree; repeated hover
+    queries cost one data version lookup.
+    """
+    start, end = period
+    tree = await medication_period_cache.get(db, current_user.id)
+    periods = tree.overlapping(start, end)
+    return ORJSONResponse(
+        [
+            MedicationPeriodResponse(
+                entity_id=period.entity_id,
+                start_date=period.start_date,
+                end_date=period.end_date,
+                name=period.name,
+                dosage=period.dosage,
+                frequency=period.frequency,
+                overlaps_with=[
+                    other.entity_id
+                    for other in tree.overlapping(period.start_date, period.last_day)
+                    if other.entity_id != period.entity_id
+                ],
+            )
+            for period in periods
+        ]
+    )
+
+
+@router.get(
+    "/lab-series", response_model=LabSeriesResponse, dependencies=[Depends(user_data_etag)]
+)
+async def get_lab_result_series(
+    test: str = Query(..., min_length=1, description="Lab test name, matched case-insensitively"),
+    window: int = Query(5, ge=1, le=100, description="Measurements per rolling mean"),
+    points: Optional[int] = Query(
+        None, ge=3, le=5000, description="Downsample to this many points for charting"
+    ),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get one lab test's results over time with trend statistics
+
+    Each point carries a trailing rolling mean and a low/high flag against
+    its reference range; the series carries a least-squares slope per year.
+    With `points`, long series are reduced with LTTB downsampling, which
+    keeps peaks and the overall shape.
+    """
+    series = await get_lab_series(
+        db,
+        current_user.id,
+        test,
+        window=window,
+        max_points=points,
+        start_date=start_date,
+        end_date=end_date,
     )
+    return ORJSONResponse(series)
 
 
-@router.get("/{entity_id}", response_model=MedicalEntityResponse)
+@router.get(
+    "/{entity_id}", response_model=MedicalEntityResponse, dependencies=[Depends(user_data_etag)]
+)
 async def get_medical_entity(
     entity_id: UUID,
     current_user: User = Depends(get_current_user),
@@ -93,7 +381,7 @@ async def update_medical_entity(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Update a medical entity"""
+    """Update a medical entity and refresh its derived timeline events"""
     result = await db.execute(
         select(MedicalEntity).where(
             MedicalEntity.id == entity_id, MedicalEntity.user_id == current_user.id
@@ -109,6 +397,8 @@ async def update_medical_entity(
     for field, value in entity_update.model_dump(exclude_unset=True).items():
         setattr(entity, field, value)
 
+    await db.flush()
+    await derive_timeline_events(db, current_user.id, entity_ids=[entity.id])
     await db.commit()
     await db.refresh(entity)
     return entity
@@ -1,24 +1,81 @@
 """Search endpoints"""
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func
-from typing import List
+from sqlalchemy import select, or_, func, literal_column
+from typing import List, Optional
+from uuid import UUID
+import asyncio
+import heapq
 
-from app.core.database import get_db
+from app.core.database import get_db, AsyncSessionLocal
+from app.core.responses import ORJSONResponse
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.document import Document
 from app.models.medical_entity import MedicalEntity
-from app.schemas.document import DocumentResponse
-from app.schemas.medical_entity import MedicalEntityResponse
+from app.models.voice_log import VoiceLog
+from app.schemas.document import DocumentItem, DOCUMENT_FIELDS
+from app.schemas.medical_entity import MedicalEntityItem, ENTITY_FIELDS
+from app.schemas.search import (
+    SearchSource,
+    SearchResult,
+    UnifiedSearchResponse,
+    VoiceLogSearchResult,
+)
 
 router = APIRouter()
 
+# Text search configuration. Spelled as a literal (not a bound parameter) so the
+# expressions below match the to_tsvector('english', ...) GIN indexes.
+FTS_CONFIG = literal_column("'english'::regconfig")
 
-@router.get("/documents", response_model=List[DocumentResponse])
+# ts_rank normalization 32 maps rank into [0, 1) so ranks are comparable across sources
+RANK_NORMALIZATION = 32
+
+HEADLINE_OPTIONS = "MaxFragments=2, MaxWords=20, MinWords=5, StartSel=<b>, StopSel=</b>"
+
+# Keys tried in order to get a display name out of entity_data
+ENTITY_TITLE_KEYS = (
+    "name",
+    "test_name",
+    "condition_name",
+    "symptom_name",
+    "procedure_name",
+    "allergen",
+    "vaccine_name",
+    "provider",
+    "type",
+)
+
+
+def _ts_query(query: str):
+    """Build a tsquery from free-form user input"""
+    return func.websearch_to_tsquery(FTS_CONFIG, query)
+
+
+def _entity_title(entity_type, entity_data: dict) -> str:
+    """Pick a human-readable title for a medical entity"""
+    for key in ENTITY_TITLE_KEYS:
+        value = entity_data.get(key)
+        if value:
+            return str(value)
+    return entity_type.value.replace("_", " ").title()
+
+
+def _entity_snippet(entity_data: dict, max_length: int = 200) -> str:
+    """Flatten entity_data into a short 'key: value' snippet"""
+    parts = [f"{key}: {value}" for key, value in entity_data.items() if value not in (None, "")]
+    snippet = "; ".join(parts)
+    return snippet if len(snippet) <= max_length else snippet[: max_length - 1] + "…"
+
+
+@router.get("/documents", response_model=List[DocumentItem])
 async def search_documents(
     query: str = Query(..., min_length=1),
     limit: int = Query(20, ge=1, le=100),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; defaults to a summary"
+    ),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -27,24 +84,32 @@ async def search_documents(
 
     Uses full-text search on file names and extracted text
     """
+    selected = DOCUMENT_FIELDS.parse(fields)
     # Simple search - can be enhanced with PostgreSQL full-text search
-    search_query = select(Document).where(
-        Document.user_id == current_user.id,
-        or_(
-            Document.file_name.ilike(f"%{query}%"),
-            Document.extracted_text.ilike(f"%{query}%"),
-        ),
+    search_query = (
+        select(Document)
+        .options(DOCUMENT_FIELDS.load_only(selected))
+        .where(
+            Document.user_id == current_user.id,
+            or_(
+                Document.file_name.ilike(f"%{query}%"),
+                Document.extracted_text.ilike(f"%{query}%"),
+            ),
+        )
     )
 
     result = await db.execute(search_query.limit(limit))
     documents = result.scalars().all()
-    return documents
+    return ORJSONResponse(DOCUMENT_FIELDS.serialize(documents, selected))
 
 
-@router.get("/entities", response_model=List[MedicalEntityResponse])
+@router.get("/entities", response_model=List[MedicalEntityItem])
 async def search_medical_entities(
     query: str = Query(..., min_length=1),
     limit: int = Query(20, ge=1, le=100),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; defaults to a summary"
+    ),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -53,15 +118,20 @@ async def search_medical_entities(
 
     Searches within entity_data JSONB field
     """
+    selected = ENTITY_FIELDS.parse(fields)
     # Simple JSONB search
-    search_query = select(MedicalEntity).where(
-        MedicalEntity.user_id == current_user.id,
-        func.cast(MedicalEntity.entity_data, str).ilike(f"%{query}%"),
+    search_query = (
+        select(MedicalEntity)
+        .options(ENTITY_FIELDS.load_only(selected))
+        .where(
+            MedicalEntity.user_id == current_user.id,
+            func.cast(MedicalEntity.entity_data, str).ilike(f"%{query}%"),
+        )
     )
 
     result = await db.execute(search_query.limit(limit))
     entities = result.scalars().all()
-    return entities
+    return ORJSONResponse(ENTITY_FIELDS.serialize(entities, selected))
 
 
 @router.get("/semantic")
@@ -91,3 +161,194 @@ async def semantic_search(
         "query": query,
         "results": [],
     }
+
+
+async def _search_voice_logs(
+    db: AsyncSession, user_id: UUID, query: str, limit: int
+) -> List[VoiceLogSearchResult]:
+    """Ranked full-text search over voice log transcripts"""
+    ts_query = _ts_query(query)
+    ts_vector = func.to_tsvector(FTS_CONFIG, VoiceLog.transcribed_text)
+    rank = func.ts_rank(ts_vector, ts_query, RANK_NORMALIZATION).label("rank")
+    snippet = func.ts_headline(
+        FTS_CONFIG, VoiceLog.transcribed_text, ts_query, HEADLINE_OPTIONS
+    ).label("snippet")
+
+    result = await db.execute(
+        select(
+            VoiceLog.id,
+            VoiceLog.document_id,
+            VoiceLog.duration_seconds,
+            VoiceLog.tags,
+            VoiceLog.recorded_at,
+            rank,
+            snippet,
+        )
+        .where(VoiceLog.user_id == user_id, ts_vector.op("@@")(ts_query))
+        .order_by(rank.desc(), VoiceLog.recorded_at.desc())
+        .limit(limit)
+    )
+    return [
+        VoiceLogSearchResult(
+            id=row.id,
+            document_id=row.document_id,
+            snippet=row.snippet,
+            rank=float(row.rank),
+            duration_seconds=row.duration_seconds,
+            tags=row.tags or [],
+            recorded_at=row.recorded_at,
+        )
+        for row in result
+    ]
+
+
+async def _search_documents_ranked(
+    db: AsyncSession, user_id: UUID, query: str, limit: int
+) -> List[SearchResult]:
+    """
+    Ranked full-text search over document text, falling back to file name matches
+
+    The two branches are served by idx_documents_extracted_text_fts and
+    idx_documents_file_name_trgm, combined with a bitmap OR.
+    """
+    ts_query = _ts_query(query)
+    ts_vector = func.to_tsvector(FTS_CONFIG, Document.extracted_text)
+    rank = func.ts_rank(ts_vector, ts_query, RANK_NORMALIZATION).label("rank")
+    snippet = func.ts_headline(
+        FTS_CONFIG, Document.extracted_text, ts_query, HEADLINE_OPTIONS
+    ).label("snippet")
+
+    result = await db.execute(
+        select(
+            Document.id,
+            Document.file_name,
+            Document.document_date,
+            Document.uploaded_at,
+            rank,
+            snippet,
+        )
+        .where(
+            Document.user_id == user_id,
+            or_(
+                ts_vector.op("@@")(ts_query),
+                # Escapes % and _ so they match literally
+                Document.file_name.icontains(query, autoescape=True),
+            ),
+        )
+        .order_by(rank.desc())
+        .limit(limit)
+    )
+    return [
+        SearchResult(
+            source=SearchSource.DOCUMENT,
+            id=row.id,
+            title=row.file_name,
+            snippet=row.snippet,
+            rank=float(row.rank or 0),
+            occurred_on=row.document_date or row.uploaded_at.date(),
+        )
+        for row in result
+    ]
+
+
+async def _search_entities_ranked(
+    db: AsyncSession, user_id: UUID, query: str, limit: int
+) -> List[SearchResult]:
+    """Ranked full-text search over the string values of entity_data"""
+    ts_query = _ts_query(query)
+    # Matches the expression indexed by idx_entities_data_fts
+    ts_vector = func.jsonb_to_tsvector(
+        FTS_CONFIG, MedicalEntity.entity_data, literal_column("'[\"string\"]'::jsonb")
+    )
+    rank = func.ts_rank(ts_vector, ts_query, RANK_NORMALIZATION).label("rank")
+
+    result = await db.execute(
+        select(
+            MedicalEntity.id,
+            MedicalEntity.entity_type,
+            MedicalEntity.entity_data,
+            MedicalEntity.entity_date,
+            rank,
+        )
+        .where(MedicalEntity.user_id == user_id, ts_vector.op("@@")(ts_query))
+        .order_by(rank.desc())
+        .limit(limit)
+    )
+    return [
+        SearchResult(
+            source=SearchSource.MEDICAL_ENTITY,
+            id=row.id,
+            title=_entity_title(row.entity_type, row.entity_data),
+            snippet=_entity_snippet(row.entity_data),
+            rank=float(row.rank),
+            occurred_on=row.entity_date,
+        )
+        for row in result
+    ]
+
+
+async def _search_in_own_session(search_fn, user_id: UUID, query: str, limit: int):
+    """
+    Run a search function on its own pooled session
+
+    A single AsyncSession cannot run statements concurrently, so each source
+    of a unified search checks out its own connection.
+    """
+    async with AsyncSessionLocal() as session:
+        return await search_fn(session, user_id, query, limit)
+
+
+@router.get("/voice-logs", response_model=List[VoiceLogSearchResult])
+async def search_voice_logs(
+    query: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Search voice log transcripts
+
+    Uses PostgreSQL full-text search on transcribed_text, ranked by relevance,
+    with highlighted snippets
+    """
+    return await _search_voice_logs(db, current_user.id, query, limit)
+
+
+@router.get("/", response_model=UnifiedSearchResponse)
+async def unified_search(
+    query: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Search documents, medical entities and voice logs at once
+
+    The three sources are queried concurrently and merged into a single
+    relevance-ordered list
+    """
+
+    async def voice_log_hits(db, user_id, query, limit):
+        return [
+            SearchResult(
+                source=SearchSource.VOICE_LOG,
+                id=hit.id,
+                title=f"Voice note ({hit.recorded_at:%b %d, %Y})",
+                snippet=hit.snippet,
+                rank=hit.rank,
+                occurred_on=hit.recorded_at.date(),
+            )
+            for hit in await _search_voice_logs(db, user_id, query, limit)
+        ]
+
+    per_source = await asyncio.gather(
+        *(
+            _search_in_own_session(search_fn, current_user.id, query, limit)
+            for search_fn in (_search_documents_ranked, _search_entities_ranked, voice_log_hits)
+        )
+    )
+
+    # Each source is already sorted by rank, so a k-way merge is enough
+    merged = heapq.merge(*per_source, key=lambda hit: hit.rank, reverse=True)
+    results = [hit for _, hit in zip(range(limit), merged)]
+
+    return UnifiedSearchResponse(query=query, results=results)
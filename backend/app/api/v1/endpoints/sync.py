@@ -0,0 +1,219 @@
+"""Delta sync endpoints"""
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Select, select, func, tuple_
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.responses import ORJSONResponse, dump_list
+from app.core.security import get_current_user
+from app.models.user import User
+from app.models.document import Document
+from app.models.medical_entity import MedicalEntity
+from app.models.timeline import TimelineEvent
+from app.models.sync_tombstone import SyncTombstone
+from app.schemas.document import DocumentResponse, DOCUMENT_FIELDS
+from app.schemas.medical_entity import MedicalEntityResponse
+from app.schemas.timeline import TimelineEventResponse
+from app.schemas.sync import SyncResponse, SyncTombstone as SyncTombstoneResponse
+from app.services.change_tracking import SNAPSHOT_XMIN
+
+router = APIRouter()
+
+# Everything but the extracted text, which is large and only needed on demand
+SYNC_DOCUMENT_FIELDS = tuple(
+    name for name in DocumentResponse.model_fields if name != "extracted_text"
+)
+
+
+@dataclass(frozen=True)
+class _Stage:
+    """One table read by a sync pass, in (change_xid, id) order"""
+
+    field: str  # SyncResponse field
+    model: Any
+    schema: Any
+    parse_id: Callable[[str], Any]
+    options: Tuple = ()
+    # False for the tombstone log, which a full pass has no use for
+    in_full_pass: bool = True
+
+
+SYNC_STAGES = (
+    _Stage(
+        "documents",
+        Document,
+        DOCUMENT_FIELDS.response_schema(SYNC_DOCUMENT_FIELDS),
+        UUID,
+        (DOCUMENT_FIELDS.load_only(SYNC_DOCUMENT_FIELDS, Document.change_xid),),
+    ),
+    _Stage("medical_entities", MedicalEntity, MedicalEntityResponse, UUID),
+    _Stage("timeline_events", TimelineEvent, TimelineEventResponse, UUID),
+    # Last, so clients apply a pass's upserts before its deletions
+    _Stage("deleted", SyncTombstone, SyncTombstoneResponse, int, in_full_pass=False),
+)
+
+
+@dataclass
+class _SyncToken:
+    """
+    Where a client is in its sync
+
+    since_xid is the watermark the current pass reads from (None for a full
+    pass) and next_xid the one the following pass will, taken when the
+    current pass started. While a pass is paging, stage, last_xid and
+    last_id point at the last row returned.
+    """
+
+    since_xid: Optional[int] = None
+    since_at: Optional[datetime] = None
+    next_xid: Optional[int] = None
+    next_at: Optional[datetime] = None
+    stage: Optional[int] = None
+    last_xid: Optional[int] = None
+    last_id: Optional[Any] = None
+
+    def encode(self) -> str:
+        return encode_cursor(
+            self.since_xid,
+            self.since_at,
+            self.next_xid,
+            self.next_at,
+            self.stage,
+            self.last_xid,
+            self.last_id,
+        )
+
+
+def _invalid_token() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+
+
+def _decode_token(since: Optional[str]) -> _SyncToken:
+    """Parse and sanity-check a sync token; no token starts a full pass"""
+    values = decode_cursor(
+        since, int, datetime.fromisoformat, int, datetime.fromisoformat, int, int, str
+    )
+    if values is None:
+        return _SyncToken()
+    token = _SyncToken(*values)
+    pairs = (
+        (token.since_xid, token.since_at),
+        (token.next_xid, token.next_at),
+        (token.last_xid, token.last_id),
+    )
+    if any((a is None) != (b is None) for a, b in pairs):
+        raise _invalid_token()
+    if any(at is not None and at.tzinfo is None for at in (token.since_at, token.next_at)):
+        raise _invalid_token()
+    if token.stage is not None:
+        if token.next_xid is None or not 0 <= token.stage < len(SYNC_STAGES):
+            raise _invalid_token()
+        if token.last_id is not None:
+            try:
+                token.last_id = SYNC_STAGES[token.stage].parse_id(token.last_id)
+            except ValueError:
+                raise _invalid_token()
+    elif token.next_xid is not None or token.last_xid is not None:
+        raise _invalid_token()
+    return token
+
+
+def _stage_query(
+    stage: _Stage, user_id: UUID, since_xid: Optional[int], after: Optional[Tuple]
+) -> Select:
+    model = stage.model
+    query = select(model).options(*stage.options).where(model.user_id == user_id)
+    if since_xid is not None:
+        query = query.where(model.change_xid >= since_xid)
+    if after is not None:
+        query = query.where(tuple_(model.change_xid, model.id) > after)
+    return query.order_by(model.change_xid, model.id)
+
+
+@router.get("/", response_model=SyncResponse)
+async def sync(
+    since: Optional[str] = Query(
+        None, description="token from the previous sync; omit for a full sync"
+    ),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Documents, medical entities and timeline events changed since a token
+
+    Returns rows written since the token and the ids of rows deleted since
+    then (from the tombstone log), at most SYNC_PAGE_SIZE per response.
+    While `has_more` is true, call again with the returned token to get the
+    rest of the pass. Without a token, or with one older than the tombstone
+    retention, every row is returned.
+
+    Rows are matched by change_xid, the id of the transaction that wrote
+    them, against a snapshot watermark rather than by timestamp, so writes
+    from long transactions that commit after a sync are picked up by the
+    next one. Rows can repeat between passes and pages; clients apply rows
+    as upserts by id, then deletions, so the repeats are harmless.
+    """
+    token = _decode_token(since)
+    now, watermark = (await db.execute(select(func.now(), SNAPSHOT_XMIN))).one()
+
+    reset = False
+    retention = timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    if token.since_at is not None and token.since_at < now - retention:
+        # Deletions since the token may have been pruned; start over in full
+        token, reset = _SyncToken(), True
+    if token.stage is None:
+        # A new pass; the next one reads from what this one may not see
+        token.next_xid, token.next_at, token.stage = watermark, now, 0
+
+    rows: Dict[str, List[Any]] = {stage.field: [] for stage in SYNC_STAGES}
+    remaining = settings.SYNC_PAGE_SIZE
+    resume: Optional[_SyncToken] = None
+    for index in range(token.stage, len(SYNC_STAGES)):
+        stage = SYNC_STAGES[index]
+        if token.since_xid is None and not stage.in_full_pass:
+            continue
+        after = None
+        if index == token.stage and token.last_xid is not None:
+            after = (token.last_xid, token.last_id)
+        if remaining == 0:
+            resume = _SyncToken(
+                token.since_xid, token.since_at, token.next_xid, token.next_at, index
+            )
+            break
+        result = await db.execute(
+            _stage_query(stage, current_user.id, token.since_xid, after).limit(remaining + 1)
+        )
+        page = list(result.scalars().all())
+        if len(page) > remaining:
+            page = page[:remaining]
+            last = page[-1]
+            resume = _SyncToken(
+                token.since_xid,
+                token.since_at,
+                token.next_xid,
+                token.next_at,
+                index,
+                last.change_xid,
+                last.id,
+            )
+        rows[stage.field] = page
+        remaining -= len(page)
+        if resume is not None:
+            break
+
+    if resume is None:
+        resume = _SyncToken(since_xid=token.next_xid, since_at=token.next_at)
+    return ORJSONResponse(
+        SyncResponse.model_construct(
+            token=resume.encode(),
+            has_more=resume.stage is not None,
+            reset=reset,
+            **{stage.field: dump_list(stage.schema, rows[stage.field]) for stage in SYNC_STAGES},
+        )
+    )
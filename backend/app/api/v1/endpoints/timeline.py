@@ -1,23 +1,150 @@
 """Timeline endpoints"""
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert
+from sqlalchemy.orm import selectinload
 from uuid import UUID
 from datetime import date
+from typing import Any, Dict, List, Optional, Set, Union
+import uuid
 
 from app.core.database import get_db
+from app.core.etag import user_data_etag
 from app.core.security import get_current_user
 from app.models.user import User
-from app.models.timeline import TimelineEvent, EventType
+from app.models.document import Document
+from app.models.medical_entity import MedicalEntity
+from app.models.timeline import TimelineEvent, TimelineEventEntity, EventType
 from app.schemas.timeline import (
     TimelineEventCreate,
+    TimelineEventBulkCreate,
     TimelineEventUpdate,
     TimelineEventResponse,
+    TimelineEventDetail,
+    TimelineEventItem,
+    TimelineAggregateResponse,
+    TimelineDeriveResponse,
+    TimelineGranularity,
+    TIMELINE_FIELDS,
 )
-from app.schemas.common import PaginatedResponse
+from app.core.responses import ORJSONResponse, dump_list
+from app.schemas.common import PaginatedResponse, CursorPage
+from app.schemas.medical_entity import MedicalEntityResponse
+from app.core.pagination import Keyset, check_pagination_mode, paginate_keyset
+from app.services.row_counts import get_row_count
+from app.services.timeline_aggregate import timeline_aggregate_cache
+from app.services.timeline_derivation import derive_timeline_events
 
 router = APIRouter()
 
+# Most recent first; matches idx_timeline_user_date
+TIMELINE_KEYSET = Keyset(TimelineEvent.event_date, TimelineEvent.id, parse=date.fromisoformat)
+
+# Link rows per INSERT, keeping each statement well under asyncpg's bind parameter limit
+LINK_INSERT_BATCH_SIZE = 5000
+
+# Relations that can be embedded with `include=`
+TIMELINE_INCLUDES = {"entities": TimelineEvent.medical_entities}
+
+INCLUDE_QUERY = Query(
+    None, description="Comma-separated relations to embed: entities (the linked medical entities)"
+)
+
+
+def _parse_include(include: Optional[str]) -> Set[str]:
+    """Parse a comma-separated `include` parameter, rejecting unknown relations"""
+    if not include:
+        return set()
+    requested = {name.strip() for name in include.split(",") if name.strip()}
+    unknown = requested - set(TIMELINE_INCLUDES)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown include: {', '.join(sorted(unknown))}. "
+            f"Available: {', '.join(TIMELINE_INCLUDES)}",
+        )
+    return requested
+
+
+def _include_options(includes: Set[str]) -> list:
+    """
+    selectinload options for the included relations
+
+    Each relation costs one extra query for the whole page (an IN over the
+    page's event ids) instead of one lazy load per event.
+    """
+    return [selectinload(TIMELINE_INCLUDES[name]) for name in sorted(includes)]
+
+
+def _embed_entities(items: List[Dict[str, Any]], events, includes: Set[str]) -> None:
+    """Add the eagerly loaded medical entities to serialized events"""
+    if "entities" not in includes:
+        return
+    for item, event in zip(items, events):
+        item["medical_entities"] = dump_list(MedicalEntityResponse, event.medical_entities)
+
+
+async def _check_references(
+    db: AsyncSession, user_id: UUID, events: List[TimelineEventCreate]
+) -> None:
+    """
+    Verify that every referenced document and medical entity belongs to the user
+
+    One query per table for the whole batch, however many events reference
+    them.
+
+    Raises:
+        HTTPException: 404 listing the ids that do not exist or belong to
+            someone else
+    """
+    references = (
+        ("Medical entities", MedicalEntity, {i for e in events for i in e.medical_entity_ids}),
+        ("Documents", Document, {e.document_id for e in events if e.document_id is not None}),
+    )
+    for label, model, ids in references:
+        if not ids:
+            continue
+        result = await db.execute(
+            select(model.id).where(model.user_id == user_id, model.id.in_(ids))
+        )
+        missing = ids - set(result.scalars().all())
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"{label} not found: {', '.join(sorted(str(i) for i in missing))}",
+            )
+
+
+async def _insert_events(
+    db: AsyncSession, user_id: UUID, events: List[TimelineEventCreate]
+) -> List[TimelineEvent]:
+    """
+    Insert events and their entity links with multi-row INSERTs
+
+    Event ids are generated up front so the link rows can be built without
+    waiting for the events' RETURNING. Does not commit.
+
+    Returns:
+        The created events, in input order
+    """
+    rows = []
+    links = []
+    for event_data in events:
+        row = event_data.model_dump(exclude={"medical_entity_ids", "metadata"})
+        row.update(id=uuid.uuid4(), user_id=user_id, doc_metadata=event_data.metadata)
+        rows.append(row)
+        links.extend(
+            {"timeline_event_id": row["id"], "medical_entity_id": entity_id}
+            for entity_id in dict.fromkeys(event_data.medical_entity_ids)
+        )
+
+    result = await db.execute(insert(TimelineEvent).values(rows).returning(TimelineEvent))
+    created = {event.id: event for event in result.scalars().all()}
+    for start in range(0, len(links), LINK_INSERT_BATCH_SIZE):
+        batch = links[start : start + LINK_INSERT_BATCH_SIZE]
+        await db.execute(insert(TimelineEventEntity).values(batch))
+    return [created[row["id"]] for row in rows]
+
 
 @router.post("/", response_model=TimelineEventResponse, status_code=status.HTTP_201_CREATED)
 async def create_timeline_event(
@@ -25,26 +152,95 @@ async def create_timeline_event(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Create a new timeline event"""
-    event = TimelineEvent(user_id=current_user.id, **event_data.model_dump(exclude={"medical_entity_ids"}))
-    db.add(event)
+    """Create a new timeline event, linked to its medical entities"""
+    await _check_references(db, current_user.id, [event_data])
+    [event] = await _insert_events(db, current_user.id, [event_data])
     await db.commit()
-    await db.refresh(event)
     return event
 
 
-@router.get("/", response_model=PaginatedResponse)
+@router.post(
+    "/bulk", response_model=List[TimelineEventResponse], status_code=status.HTTP_201_CREATED
+)
+async def create_timeline_events_bulk(
+    bulk_data: TimelineEventBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Create many timeline events and their entity links in one transaction
+
+    All referenced documents and medical entities are checked up front;
+    if any is missing, nothing is created. Events are returned in request
+    order.
+    """
+    await _check_references(db, current_user.id, bulk_data.events)
+    events = await _insert_events(db, current_user.id, bulk_data.events)
+    await db.commit()
+    return ORJSONResponse(
+        dump_list(TimelineEventResponse, events), status_code=status.HTTP_201_CREATED
+    )
+
+
+@router.post("/derive", response_model=TimelineDeriveResponse)
+async def derive_timeline(
+    document_id: Optional[UUID] = Query(None, description="Only entities from this document"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Create timeline events for medical entities that do not have one yet
+
+    Medications, lab results, diagnoses, procedures, immunizations, vitals,
+    symptoms and appointments with a date each get their event, linked back
+    to the entity. Safe to re-run: derived events are refreshed from their
+    entities instead of duplicated, and entities on the timeline through
+    another event are skipped.
+    """
+    created = await derive_timeline_events(db, current_user.id, document_id=document_id)
+    await db.commit()
+    return TimelineDeriveResponse(created=created)
+
+
+@router.get(
+    "/",
+    response_model=Union[CursorPage[TimelineEventItem], PaginatedResponse],
+    dependencies=[Depends(user_data_etag)],
+)
 async def list_timeline_events(
-    page: int = Query(1, ge=1),
+    page: Optional[int] = Query(None, ge=1, description="Page number; defaults to 1"),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: bool = Query(False, description="Page through cursors; implied by after or before"),
+    after: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    before: Optional[str] = Query(None, description="prev_cursor of the following page"),
+    include_total: bool = Query(True, description="Set to false to skip the total count"),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; defaults to a summary"
+    ),
+    include: Optional[str] = INCLUDE_QUERY,
     event_type: EventType = None,
     start_date: date = None,
     end_date: date = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """List all timeline events for the current user"""
-    query = select(TimelineEvent).where(TimelineEvent.user_id == current_user.id)
+    """
+    List all timeline events for the current user, most recent first
+
+    Offset pagination by default; `cursor=true`, `after` or `before`
+    switch to cursor pagination, which cannot be combined with `page`. Totals
+    come from trigger-maintained counters unless `include_total=false`. With
+    `include=entities` each event carries its linked medical entities,
+    loaded for the whole page in one extra query.
+    """
+    use_cursor = check_pagination_mode(page, after, before, cursor)
+    selected = TIMELINE_FIELDS.parse(fields)
+    includes = _parse_include(include)
+    query = (
+        select(TimelineEvent)
+        .options(TIMELINE_FIELDS.load_only(selected, TimelineEvent.event_date))
+        .where(TimelineEvent.user_id == current_user.id)
+    )
 
     if event_type:
         query = query.where(TimelineEvent.event_type == event_type)
@@ -53,34 +249,97 @@ async def list_timeline_events(
     if end_date:
         query = query.where(TimelineEvent.event_date <= end_date)
 
-    count_query = select(func.count()).select_from(query.subquery())
-    total = await db.scalar(count_query)
+    total = None
+    if include_total and (start_date or end_date):
+        # The counters are per type only, so date ranges still need a count
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    elif include_total:
+        total = await get_row_count(db, current_user.id, "timeline_events", event_type)
 
-    query = query.offset((page - 1) * page_size).limit(page_size).order_by(
-        TimelineEvent.event_date.desc()
+    query = query.options(*_include_options(includes))
+    if use_cursor:
+        events, next_cursor, prev_cursor = await paginate_keyset(
+            db, query, TIMELINE_KEYSET, page_size, after=after, before=before
+        )
+        items = TIMELINE_FIELDS.serialize(events, selected)
+        _embed_entities(items, events, includes)
+        return ORJSONResponse(
+            CursorPage.model_construct(
+                items=items,
+                page_size=page_size,
+                total=total,
+                next_cursor=next_cursor,
+                prev_cursor=prev_cursor,
+            )
+        )
+
+    page = page or 1
+    query = (
+        query.order_by(*TIMELINE_KEYSET.order_by())
+        .offset((page - 1) * page_size)
+        .limit(page_size)
     )
     result = await db.execute(query)
     events = result.scalars().all()
+    items = TIMELINE_FIELDS.serialize(events, selected)
+    _embed_entities(items, events, includes)
 
-    return PaginatedResponse.create(
-        items=[TimelineEventResponse.model_validate(e) for e in events],
-        total=total,
-        page=page,
-        page_size=page_size,
+    return ORJSONResponse(
+        PaginatedResponse.create(
+            items=items,
+            total=total,
+            page=page,
+            page_size=page_size,
+        )
     )
 
 
-@router.get("/{event_id}", response_model=TimelineEventResponse)
+@router.get(
+    "/aggregate", response_model=TimelineAggregateResponse, dependencies=[Depends(user_data_etag)]
+)
+async def aggregate_timeline_events(
+    granularity: TimelineGranularity = TimelineGranularity.MONTH,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Count timeline events per date bucket and event type
+
+    For zoomed-out timeline views. Buckets are days, ISO weeks, months or
+    years; results are cached until the user's data changes.
+    """
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start_date must not be after end_date",
+        )
+    aggregate = await timeline_aggregate_cache.get(
+        db, current_user.id, granularity, start_date, end_date
+    )
+    return ORJSONResponse(aggregate)
+
+
+@router.get(
+    "/{event_id}", response_model=TimelineEventDetail, dependencies=[Depends(user_data_etag)]
+)
 async def get_timeline_event(
     event_id: UUID,
+    include: Optional[str] = INCLUDE_QUERY,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Get a specific timeline event"""
+    """
+    Get a specific timeline event
+
+    With `include=entities` the event carries its linked medical entities.
+    """
+    includes = _parse_include(include)
     result = await db.execute(
-        select(TimelineEvent).where(
-            TimelineEvent.id == event_id, TimelineEvent.user_id == current_user.id
-        )
+        select(TimelineEvent)
+        .options(*_include_options(includes))
+        .where(TimelineEvent.id == event_id, TimelineEvent.user_id == current_user.id)
     )
     event = result.scalar_one_or_none()
 
@@ -89,7 +348,9 @@ async def get_timeline_event(
             status_code=status.HTTP_404_NOT_FOUND, detail="Timeline event not found"
         )
 
-    return event
+    items = dump_list(TimelineEventResponse, [event])
+    _embed_entities(items, [event], includes)
+    return ORJSONResponse(items[0])
 
 
 @router.put("/{event_id}", response_model=TimelineEventResponse)
@@ -1,12 +1,15 @@
 """User endpoints"""
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from datetime import date
 
 from app.core.database import get_db
 from app.core.security import get_current_user
 from app.models.user import User
 from app.schemas.user import UserResponse, UserUpdate
+from app.services.account_export import stream_account_export
 
 router = APIRouter()
 
@@ -32,3 +35,26 @@ async def update_current_user_profile(
     await db.commit()
     await db.refresh(current_user)
     return current_user
+
+
+@router.get(
+    "/me/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/zip": {}}}},
+)
+async def export_current_user_data(
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Download everything stored for the current user as a ZIP
+
+    Contains the profile, every record as NDJSON and the original files.
+    The archive is streamed as it is built, so exports of any size start
+    immediately and use constant server memory.
+    """
+    file_name = f"healthflow-export-{date.today().isoformat()}.zip"
+    return StreamingResponse(
+        stream_account_export(current_user.id),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'},
+    )
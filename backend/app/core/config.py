@@ -26,6 +26,8 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_ANON_KEY: str
     SUPABASE_SERVICE_KEY: str
+    # Signs Supabase session tokens; JWT_SECRET is used when unset
+    SUPABASE_JWT_SECRET: Optional[str] = None
     USE_SUPABASE_STORAGE: bool = True
     SUPABASE_STORAGE_BUCKET: str = "documents"
 
@@ -47,6 +49,58 @@ class Settings(BaseSettings):
 
     DEDALUS_API_KEY: Optional[str] = None
     DEDALUS_BASE_URL: Optional[str] = None
+    DEDALUS_MODEL: str = "gpt-4-turbo-preview"
+
+    # LLM gateway
+    EMBEDDING_PROVIDER: str = "openai"  # openai, stub
+    LLM_MAX_CONCURRENCY: int = 16  # In-flight requests per provider
+    LLM_MAX_CONNECTIONS: int = 32  # Pooled HTTP connections per provider
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 60.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    LLM_RETRY_MAX_DELAY_SECONDS: float = 8.0
+    LLM_HEDGE_PROVIDER: Optional[str] = None  # Second provider raced against slow requests
+    LLM_HEDGE_AFTER_SECONDS: float = 2.0  # Wait for a first token before hedging
+    LLM_STUB_TOKEN_DELAY_SECONDS: float = 0.0
+
+    # Chat
+    CHAT_PROVIDER: str = "anthropic"  # anthropic, openai, dedalus, stub
+    CHAT_MAX_TOKENS: int = 1024
+    CHAT_CONTEXT_CHUNKS: int = 5
+    CHAT_CONTEXT_MIN_SIMILARITY: float = 0.3
+    CHAT_RETRIEVAL_TIMEOUT_SECONDS: float = 3.0  # Query embedding + vector search
+    CHAT_CONTEXT_QUERY_TIMEOUT_SECONDS: float = 1.0  # Each plain database source
+    CHAT_HISTORY_TOKEN_BUDGET: int = 2000  # Summary + recent messages sent to the model
+    CHAT_SUMMARY_BATCH_SIZE: int = 40  # Messages folded into the summary per pass
+    CHAT_SUMMARY_MAX_TOKENS: int = 400
+    CHAT_ANSWER_CACHE_ENABLED: bool = True
+    CHAT_ANSWER_CACHE_SIMILARITY: float = 0.95  # Cosine similarity needed for a hit
+    CHAT_ANSWER_CACHE_MAX_ENTRIES: int = 50  # Per user
+    CHAT_ANSWER_CACHE_MAX_USERS: int = 10000
+    CHAT_ANSWER_CACHE_TTL_SECONDS: int = 86400
+    PATIENT_CONTEXT_TOKEN_BUDGET: int = 1500  # Entities + timeline in the system prompt
+    PATIENT_CONTEXT_MAX_EVENTS: int = 500  # Newest timeline events read per build
+    PATIENT_CONTEXT_CACHE_MAX_USERS: int = 10000
+
+    # Timeline
+    TIMELINE_AGGREGATE_CACHE_MAX_ENTRIES: int = 10000  # (user, granularity, range) keys
+    MEDICATION_PERIOD_CACHE_MAX_USERS: int = 10000  # In-memory interval trees
+
+    # Delta sync
+    SYNC_PAGE_SIZE: int = 1000  # Rows per sync response, across all tables
+    SYNC_TOMBSTONE_RETENTION_DAYS: int = 30  # Older tokens get a full resync
+
+    # Import
+    FHIR_IMPORT_BATCH_SIZE: int = 1000  # Resources buffered before each COPY
+
+    # Export
+    EXPORT_ROW_BATCH_SIZE: int = 1000  # Rows fetched per server-side cursor round trip
+    EXPORT_FILE_CHUNK_BYTES: int = 1024 * 1024  # Storage read size for original files
+    EXPORT_STORAGE_TIMEOUT_SECONDS: float = 60.0
+
+    # Entity deduplication
+    DEDUP_DATE_WINDOW_DAYS: int = 3  # Max date difference between duplicates
+    DEDUP_SIMILARITY_THRESHOLD: float = 0.8  # Attribute similarity needed to merge
 
     # Storage (S3/MinIO)
     S3_BUCKET: str = "healthflow-documents"
@@ -1,6 +1,7 @@
 """
 Database configuration and session management
 """
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from typing import AsyncGenerator
@@ -31,6 +32,10 @@ AsyncSessionLocal = async_sessionmaker(
 # Base class for models
 Base = declarative_base()
 
+# Id of the writing transaction, stamped on rows read by delta sync; updates are
+# stamped by the set_change_xid() trigger
+CURRENT_XID = text("pg_current_xact_id()::text::bigint")
+
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -68,6 +73,10 @@ async def init_db():
             Embedding,
             ChatSession,
             ChatMessage,
+            UserDataVersion,
+            UserRowCount,
+            SyncTombstone,
+            EntityDedupState,
         )
 
         await conn.run_sync(Base.metadata.create_all)
@@ -0,0 +1,114 @@
+"""
+Conditional GET
+
+Read endpoints tag their responses with a weak ETag derived from a cheap
+version lookup: the user's data version for documents, entities and the
+timeline, and chat session timestamps for chat. The lookup runs as a
+dependency before the endpoint, so a matching If-None-Match returns 304
+without running the endpoint's queries, serialization or compression.
+"""
+from hashlib import sha1
+from typing import Any, Optional
+from uuid import UUID
+
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.security import get_current_user
+from app.models.chat import ChatSession
+from app.models.user import User
+from app.services.data_version import get_data_version
+
+# Clients may cache but must revalidate; shared caches must not store
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Weak ETag over version parts
+
+    The app version is included so a deploy that changes response shapes
+    invalidates every tag. Weak because GZip changes the bytes, not the
+    content.
+    """
+    digest = sha1(":".join(str(part) for part in (settings.APP_VERSION, *parts)).encode())
+    return f'W/"{digest.hexdigest()[:20]}"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against a tag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def check_etag(request: Request, *parts: Any) -> None:
+    """
+    Tag the response, or stop with 304 if the client's copy is current
+
+    The tag is stored on request.state; middleware copies it onto the
+    response.
+
+    Raises:
+        HTTPException: 304 when If-None-Match matches
+    """
+    etag = make_etag(*parts)
+    if _matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+        )
+    request.state.etag = etag
+
+
+async def user_data_etag(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> None:
+    """ETag for documents, medical entities and timeline reads: the user's data version"""
+    version = await get_data_version(db, current_user.id)
+    check_etag(request, "data", current_user.id, version)
+
+
+async def chat_sessions_etag(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> None:
+    """
+    ETag for the chat session list
+
+    New messages bump their session's updated_at through the last_message_at
+    trigger; the count catches deleted sessions.
+    """
+    result = await db.execute(
+        select(func.count(), func.max(ChatSession.updated_at)).where(
+            ChatSession.user_id == current_user.id
+        )
+    )
+    count, last_updated = result.one()
+    check_etag(request, "chat_sessions", current_user.id, count, last_updated)
+
+
+async def chat_session_etag(
+    session_id: UUID,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> None:
+    """ETag for one chat session's messages: the session's updated_at"""
+    last_updated = await db.scalar(
+        select(ChatSession.updated_at).where(
+            ChatSession.id == session_id, ChatSession.user_id == current_user.id
+        )
+    )
+    # Unknown sessions get no tag; the endpoint answers 404
+    if last_updated is not None:
+        check_etag(request, "chat_session", current_user.id, session_id, last_updated)
@@ -0,0 +1,101 @@
+"""
+Sparse fieldsets for list endpoints
+
+A `fields=` query parameter picks which response fields to return. Only the
+columns behind those fields are selected, so heavy columns such as
+extracted_text and entity_data are neither read nor sent unless asked for.
+Without `fields`, lists use a lightweight summary schema.
+"""
+from copy import copy
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy.orm import load_only
+
+from app.core.responses import dump_list
+
+
+@lru_cache(maxsize=256)
+def _subset_schema(schema: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """Schema with only the given fields of another schema"""
+    definitions: Dict[str, Any] = {
+        name: (schema.model_fields[name].annotation, copy(schema.model_fields[name]))
+        for name in fields
+    }
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+
+class FieldSelection:
+    """Maps response fields of a schema onto the ORM columns that back them"""
+
+    def __init__(
+        self,
+        model: Any,
+        schema: Type[BaseModel],
+        summary_schema: Type[BaseModel],
+        attributes: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Args:
+            model: ORM model class
+            schema: Full response schema; any of its fields can be requested
+            summary_schema: Schema used when no fields are requested
+            attributes: Response field to ORM attribute names where they differ
+        """
+        self.model = model
+        self.schema = schema
+        self.summary_schema = summary_schema
+        self.attributes = attributes or {}
+
+    def parse(self, fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+        """
+        Parse a comma-separated `fields` parameter
+
+        Returns:
+            The requested fields in schema order, always including id, or
+            None for the summary schema
+
+        Raises:
+            HTTPException: 400 if a field does not exist
+        """
+        if not fields:
+            return None
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested - set(self.schema.model_fields)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}. "
+                f"Available: {', '.join(self.schema.model_fields)}",
+            )
+        requested.add("id")
+        return tuple(name for name in self.schema.model_fields if name in requested)
+
+    def response_schema(self, selected: Optional[Tuple[str, ...]]) -> Type[BaseModel]:
+        """Schema to serialize rows with"""
+        if selected is None:
+            return self.summary_schema
+        return _subset_schema(self.schema, selected)
+
+    def load_only(self, selected: Optional[Tuple[str, ...]], *always: Any):
+        """
+        Loader option selecting only the columns behind the response fields
+
+        Args:
+            selected: Result of parse()
+            always: Extra ORM attributes to load regardless, e.g. sort keys
+                needed for cursors
+        """
+        names = selected if selected is not None else tuple(self.summary_schema.model_fields)
+        columns = [getattr(self.model, self.attributes.get(name, name)) for name in names]
+        return load_only(*columns, *always)
+
+    def serialize(self, rows, selected: Optional[Tuple[str, ...]]) -> List[Dict[str, Any]]:
+        """Validate ORM rows with the schema for the selection and dump them to dicts"""
+        return dump_list(self.response_schema(selected), rows)
@@ -0,0 +1,105 @@
+"""
+In-process metrics
+
+A small Prometheus-compatible registry so latency metrics can be scraped from
+/metrics without pulling in an extra dependency.
+"""
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Tuple, Sequence, Union
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative histogram with optional labels"""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            # Per series: one counter per bucket, then +Inf count, then sum
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            index = bisect_left(self.buckets, value)
+            for i in range(index, len(self.buckets)):
+                series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        """Render in Prometheus text exposition format"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(key, le=str(bound))} {count:g}")
+                lines.append(f"{self.name}_bucket{_labels(key, le='+Inf')} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_labels(key)} {series[-2]:g}")
+                lines.append(f"{self.name}_sum{_labels(key)} {series[-1]:.6f}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._series: Dict[LabelValues, float] = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Increment the counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        """Render in Prometheus text exposition format"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_labels(key)} {value:g}")
+        return lines
+
+
+def _labels(key: LabelValues, **extra: str) -> str:
+    """Format a label set"""
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+_registry: Dict[str, Union[Histogram, Counter]] = {}
+
+
+def histogram(name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Get or create a histogram in the global registry"""
+    if name not in _registry:
+        _registry[name] = Histogram(name, description, buckets)
+    return _registry[name]
+
+
+def counter(name: str, description: str) -> Counter:
+    """Get or create a counter in the global registry"""
+    if name not in _registry:
+        _registry[name] = Counter(name, description)
+    return _registry[name]
+
+
+def render_metrics() -> str:
+    """Render every registered metric"""
+    lines: List[str] = []
+    for metric in _registry.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
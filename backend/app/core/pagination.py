@@ -0,0 +1,179 @@
+"""
+Keyset pagination helpers
+
+Cursors are opaque to clients: the sort key of the last row of a page,
+JSON-encoded and base64url-wrapped. Keyset queries seek straight to the
+cursor through the sort index instead of scanning and discarding an
+offset's worth of rows.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Callable, List, Optional, Tuple
+from uuid import UUID
+import binascii
+import json
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, and_, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+def _serialize(value: Any) -> Any:
+    """Make one key value JSON-compatible"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode a sort key as an opaque cursor"""
+    payload = json.dumps([_serialize(value) for value in values], separators=(",", ":"))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], *parsers: Callable[[Any], Any]) -> Optional[Tuple]:
+    """
+    Decode a cursor into a sort key
+
+    Args:
+        cursor: Cursor from a previous page, or None
+        parsers: One parser per key column, e.g. datetime.fromisoformat, UUID.
+            None values are passed through unparsed.
+
+    Returns:
+        The decoded key, or None when no cursor was given
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed
+    """
+    if cursor is None:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError("cursor has the wrong number of values")
+        return tuple(
+            None if value is None else parse(value) for parse, value in zip(parsers, values)
+        )
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def check_pagination_mode(
+    page: Optional[int], after: Optional[str], before: Optional[str], cursor: bool = False
+) -> bool:
+    """
+    Decide between offset and cursor pagination for a list request
+
+    Offset pagination stays the default, so existing clients keep getting
+    a PaginatedResponse; `cursor=true`, `after` or `before` select cursor
+    paging and a CursorPage.
+
+    Returns:
+        True for cursor paging
+
+    Raises:
+        HTTPException: 400 if page is given together with cursor, after or before
+    """
+    use_cursor = cursor or after is not None or before is not None
+    if page is not None and use_cursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="page cannot be combined with cursor, after or before",
+        )
+    return use_cursor
+
+
+@dataclass
+class Keyset:
+    """
+    Descending (sort, id) ordering for keyset pagination
+
+    Matches composite indexes of the form (user_id, sort DESC [NULLS LAST],
+    id DESC). A nullable sort column orders NULLs last, like those indexes.
+    """
+
+    sort: InstrumentedAttribute
+    id: InstrumentedAttribute
+    parse: Callable[[Any], Any]
+    nullable: bool = False
+
+    def order_by(self, reverse: bool = False) -> Tuple:
+        """ORDER BY clauses for the list order, or its reverse"""
+        if reverse:
+            sort = self.sort.asc().nulls_first() if self.nullable else self.sort.asc()
+            return sort, self.id.asc()
+        sort = self.sort.desc().nulls_last() if self.nullable else self.sort.desc()
+        return sort, self.id.desc()
+
+    def seek(self, key: Tuple, reverse: bool = False):
+        """Condition selecting the rows after key in the list order, or before it"""
+        value, row_id = key
+        if not self.nullable:
+            if reverse:
+                return tuple_(self.sort, self.id) > (value, row_id)
+            return tuple_(self.sort, self.id) < (value, row_id)
+
+        if value is None:
+            if reverse:
+                return or_(self.sort.is_not(None), and_(self.sort.is_(None), self.id > row_id))
+            return and_(self.sort.is_(None), self.id < row_id)
+        if reverse:
+            return tuple_(self.sort, self.id) > (value, row_id)
+        return or_(tuple_(self.sort, self.id) < (value, row_id), self.sort.is_(None))
+
+    def cursor(self, row: Any) -> str:
+        """Cursor pointing at a row"""
+        return encode_cursor(getattr(row, self.sort.key), getattr(row, self.id.key))
+
+
+async def paginate_keyset(
+    db: AsyncSession,
+    query: Select,
+    keyset: Keyset,
+    page_size: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+) -> Tuple[List[Any], Optional[str], Optional[str]]:
+    """
+    Fetch one keyset page of an ORM query
+
+    Args:
+        db: Database session
+        query: Filtered select of a single entity, without ordering or limits
+        keyset: Ordering of the list
+        page_size: Rows per page
+        after: next_cursor of the previous page
+        before: prev_cursor of the following page
+
+    Returns:
+        The page's rows in list order, the next cursor and the previous cursor
+    """
+    if after is not None and before is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only one of before and after may be given",
+        )
+    reverse = before is not None
+    key = decode_cursor(after or before, keyset.parse, UUID)
+    if key is not None:
+        query = query.where(keyset.seek(key, reverse=reverse))
+
+    result = await db.execute(query.order_by(*keyset.order_by(reverse)).limit(page_size + 1))
+    rows = list(result.scalars().all())
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    # The row a cursor points at is always on the far side of the page
+    more_next = has_more if not reverse else True
+    more_prev = has_more if reverse else after is not None
+    next_cursor = keyset.cursor(rows[-1]) if rows and more_next else None
+    prev_cursor = keyset.cursor(rows[0]) if rows and more_prev else None
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,56 @@
+"""
+Fast JSON responses
+
+ORJSONResponse is the application's default response class. List endpoints
+that have already validated their rows return it directly, which skips
+FastAPI's second validation pass against response_model; response_model is
+then only used for the OpenAPI schema.
+"""
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, List, Type
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+def _default(obj: Any) -> Any:
+    """Serialize types orjson does not handle natively, the way pydantic does"""
+    if isinstance(obj, BaseModel):
+        # Shallow: nested values go back through orjson
+        return dict(obj)
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def json_dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes with orjson, the way responses are rendered"""
+    return orjson.dumps(
+        content, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    )
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
+
+@lru_cache(maxsize=256)
+def list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    """Cached TypeAdapter for a list of schema instances"""
+    return TypeAdapter(List[schema])
+
+
+def dump_list(schema: Type[BaseModel], rows: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Validate ORM rows against a schema and dump them to dicts
+
+    One validation pass over the whole list, done by a cached adapter, instead
+    of a model_validate per row plus FastAPI's response_model re-validation.
+    """
+    adapter = list_adapter(schema)
+    return adapter.dump_python(adapter.validate_python(rows, from_attributes=True), by_alias=True)
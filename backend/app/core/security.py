@@ -20,6 +20,9 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # HTTP Bearer token
 security = HTTPBearer()
 
+# Audience of Supabase session access tokens
+SUPABASE_AUDIENCE = "authenticated"
+
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -84,6 +87,37 @@ def verify_token(token: str) -> Dict[str, Any]:
         )
 
 
+def verify_supabase_access_token(token: str) -> Dict[str, Any]:
+    """
+    Verify and decode a Supabase session access token
+
+    Supabase signs them with the project's JWT secret and sets aud to
+    "authenticated", which verify_token rejects.
+
+    Args:
+        token: access_token of a Supabase session
+
+    Returns:
+        Decoded token payload
+
+    Raises:
+        HTTPException: If token is invalid or expired
+    """
+    try:
+        return jwt.decode(
+            token,
+            settings.SUPABASE_JWT_SECRET or settings.JWT_SECRET,
+            algorithms=["HS256"],
+            audience=SUPABASE_AUDIENCE,
+        )
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -113,7 +147,37 @@ async def get_current_user(
     """
     token = credentials.credentials
     payload = verify_token(token)
+    return await _user_from_payload(db, payload)
+
+
+async def get_current_user_or_supabase(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """
+    Get current authenticated user from a backend or Supabase session token
+
+    For endpoints the frontend calls with the browser's Supabase session,
+    such as chat. Backend-issued tokens are accepted as by get_current_user.
+    A Supabase user seen for the first time gets their users row, as with
+    SupabaseAuth.
 
+    Raises:
+        HTTPException: If authentication fails
+    """
+    token = credentials.credentials
+    try:
+        payload = verify_token(token)
+    except HTTPException:
+        payload = verify_supabase_access_token(token)
+        return await _user_from_payload(db, payload, create=True)
+    return await _user_from_payload(db, payload)
+
+
+async def _user_from_payload(
+    db: AsyncSession, payload: Dict[str, Any], create: bool = False
+) -> User:
+    """The user a verified token's sub claim names, created from the claims if asked"""
     user_id: str = payload.get("sub")
     if user_id is None:
         raise HTTPException(
@@ -125,6 +189,15 @@ async def get_current_user(
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
 
+    if user is None and create:
+        user = User(
+            id=user_id,
+            email=payload.get("email"),
+            full_name=(payload.get("user_metadata") or {}).get("full_name"),
+        )
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -5,17 +5,22 @@ FastAPI application entry point
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.exceptions import RequestValidationError
+from starlette.datastructures import Headers
 from contextlib import asynccontextmanager
 import time
 import logging
 
 from app.core.config import settings
+from app.core.etag import CACHE_CONTROL
 from app.core.logging_config import setup_logging
+from app.core.metrics import render_metrics
+from app.core.responses import ORJSONResponse
 from app.api.v1.api import api_router
 from app.core.database import engine
 from app.models import Base
+from app.services import llm
 
 # Setup logging
 setup_logging()
@@ -37,6 +42,7 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info(f"Shutting down {settings.APP_NAME}")
+    await llm.gateway.aclose()
     await engine.dispose()
 
 
@@ -49,6 +55,7 @@ app = FastAPI(
     redoc_url="/redoc" if settings.DEBUG else None,
     openapi_url=f"{settings.API_V1_PREFIX}/openapi.json",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS Middleware
@@ -60,8 +67,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """GZip middleware that leaves server-sent event streams uncompressed"""
+
+    async def __call__(self, scope, receive, send):
+        # Compressing an event stream would hold tokens back in the gzip buffer
+        if scope["type"] == "http" and "text/event-stream" in Headers(scope=scope).get("accept", ""):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
 # GZip Middleware
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(StreamingAwareGZipMiddleware, minimum_size=1000)
 
 
 # Request timing middleware
@@ -75,6 +93,18 @@ async def add_process_time_header(request: Request, call_next):
     return response
 
 
+# Conditional GET middleware
+@app.middleware("http")
+async def add_etag_header(request: Request, call_next):
+    """Copy the ETag computed by a read endpoint's dependency onto its response"""
+    response = await call_next(request)
+    etag = getattr(request.state, "etag", None)
+    if etag is not None and response.status_code == status.HTTP_200_OK:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
 # Exception handlers
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -118,6 +148,12 @@ async def health_check():
     }
 
 
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics endpoint"""
+    return render_metrics()
+
+
 @app.get("/", tags=["Root"])
 async def root():
     """Root endpoint"""
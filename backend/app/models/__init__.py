@@ -7,6 +7,10 @@ from app.models.timeline import TimelineEvent, TimelineEventEntity
 from app.models.voice_log import VoiceLog
 from app.models.embedding import DocumentChunk, Embedding
 from app.models.chat import ChatSession, ChatMessage, ChatMessageReference
+from app.models.data_version import UserDataVersion
+from app.models.row_count import UserRowCount
+from app.models.sync_tombstone import SyncTombstone
+from app.models.entity_dedup_state import EntityDedupState
 
 __all__ = [
     "Base",
@@ -21,4 +25,8 @@ __all__ = [
     "ChatSession",
     "ChatMessage",
     "ChatMessageReference",
+    "UserDataVersion",
+    "UserRowCount",
+    "SyncTombstone",
+    "EntityDedupState",
 ]
@@ -0,0 +1,27 @@
+"""User data version model"""
+from sqlalchemy import Column, BigInteger, TIMESTAMP, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class UserDataVersion(Base):
+    """
+    Per-user data version
+
+    Bumped by database triggers on every write to documents, medical entities
+    and timeline events. Anything derived from a user's data and cached at an
+    older version is stale.
+    """
+
+    __tablename__ = "user_data_versions"
+
+    user_id = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<UserDataVersion {self.user_id} - {self.version}>"
@@ -6,7 +6,7 @@ from sqlalchemy.sql import func
 import uuid
 import enum
 
-from app.core.database import Base
+from app.core.database import Base, CURRENT_XID
 
 
 class DocumentType(str, enum.Enum):
@@ -79,6 +79,9 @@ class Document(Base):
         onupdate=func.now(),
     )
 
+    # Transaction that last wrote the row; delta sync reads rows past a watermark
+    change_xid = Column(BigInteger, nullable=False, server_default=CURRENT_XID)
+
     # Relationships
     user = relationship("User", back_populates="documents")
     medical_entities = relationship("MedicalEntity", back_populates="document")
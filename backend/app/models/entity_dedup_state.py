@@ -0,0 +1,24 @@
+"""Entity dedup state model"""
+from sqlalchemy import Column, BigInteger, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.core.database import Base
+
+
+class EntityDedupState(Base):
+    """
+    How far a user's medical entities have been checked for duplicates
+
+    The dedup engine only looks at entities written at or after the change
+    watermark checked_xid, so each run is incremental.
+    """
+
+    __tablename__ = "entity_dedup_state"
+
+    user_id = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    checked_xid = Column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<EntityDedupState {self.user_id} - {self.checked_xid}>"
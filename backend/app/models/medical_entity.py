@@ -1,12 +1,23 @@
 """Medical Entity model"""
-from sqlalchemy import Column, Date, TIMESTAMP, Enum, ForeignKey, Boolean, Numeric
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Computed,
+    Date,
+    Enum,
+    ForeignKey,
+    Numeric,
+    Text,
+    TIMESTAMP,
+)
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
 import enum
 
-from app.core.database import Base
+from app.core.database import Base, CURRENT_XID
 
 
 class EntityType(str, enum.Enum):
@@ -50,6 +61,30 @@ class MedicalEntity(Base):
     extraction_confidence = Column(Numeric(3, 2), nullable=True)
     is_verified = Column(Boolean, default=False, server_default="false")
 
+    # Frequently filtered entity_data keys, generated by Postgres (read-only)
+    medication_name = Column(
+        Text,
+        Computed("CASE WHEN entity_type = 'medication' THEN entity_data->>'name' END"),
+    )
+    lab_test_name = Column(
+        Text,
+        Computed("CASE WHEN entity_type = 'lab_result' THEN entity_data->>'test_name' END"),
+    )
+    lab_value = Column(
+        Numeric,
+        Computed(
+            "CASE WHEN entity_type = 'lab_result' "
+            "THEN substring(entity_data->>'value' FROM '-?[0-9]+(?:\\.[0-9]+)?')::NUMERIC END"
+        ),
+    )
+    lab_unit = Column(
+        Text,
+        Computed(
+            "CASE WHEN entity_type = 'lab_result' "
+            "THEN NULLIF(btrim(entity_data->>'unit'), '') END"
+        ),
+    )
+
     # Audit
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
     updated_at = Column(
@@ -59,6 +94,9 @@ class MedicalEntity(Base):
         onupdate=func.now(),
     )
 
+    # Transaction that last wrote the row; delta sync reads rows past a watermark
+    change_xid = Column(BigInteger, nullable=False, server_default=CURRENT_XID)
+
     # Relationships
     user = relationship("User", back_populates="medical_entities")
     document = relationship("Document", back_populates="medical_entities")
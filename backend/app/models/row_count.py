@@ -0,0 +1,26 @@
+"""User row count model"""
+from sqlalchemy import Column, String, BigInteger, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.core.database import Base
+
+
+class UserRowCount(Base):
+    """
+    Per-user, per-type row count of a table
+
+    Maintained by database triggers on documents, medical entities and
+    timeline events so list endpoints can report totals without counting.
+    """
+
+    __tablename__ = "user_row_counts"
+
+    user_id = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    table_name = Column(String, primary_key=True)
+    row_type = Column(String, primary_key=True)
+    row_count = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"<UserRowCount {self.user_id} {self.table_name}/{self.row_type} - {self.row_count}>"
@@ -0,0 +1,29 @@
+"""Sync tombstone model"""
+from sqlalchemy import Column, String, BigInteger, TIMESTAMP, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+from app.core.database import Base, CURRENT_XID
+
+
+class SyncTombstone(Base):
+    """
+    Record of a deleted document, medical entity or timeline event
+
+    Written by database triggers on delete so delta sync can tell clients
+    which rows to drop.
+    """
+
+    __tablename__ = "sync_tombstones"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    table_name = Column(String, nullable=False)
+    row_id = Column(UUID(as_uuid=True), nullable=False)
+    deleted_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    change_xid = Column(BigInteger, nullable=False, server_default=CURRENT_XID)
+
+    def __repr__(self):
+        return f"<SyncTombstone {self.table_name}/{self.row_id}>"
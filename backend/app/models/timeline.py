@@ -1,12 +1,23 @@
 """Timeline models"""
-from sqlalchemy import Column, String, Date, Text, TIMESTAMP, Enum, ForeignKey, Boolean, Table
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    Enum,
+    ForeignKey,
+    String,
+    Table,
+    Text,
+    TIMESTAMP,
+)
 from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
 import enum
 
-from app.core.database import Base
+from app.core.database import Base, CURRENT_XID
 
 
 class EventType(str, enum.Enum):
@@ -72,6 +83,13 @@ class TimelineEvent(Base):
     is_starred = Column(Boolean, default=False, server_default="false")
     user_notes = Column(Text, nullable=True)
 
+    # Medical entity the event was derived from; None for client-created events
+    source_entity_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("medical_entities.id", ondelete="CASCADE"),
+        nullable=True,
+    )
+
     # Audit
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
     updated_at = Column(
@@ -81,6 +99,9 @@ class TimelineEvent(Base):
         onupdate=func.now(),
     )
 
+    # Transaction that last wrote the row; delta sync reads rows past a watermark
+    change_xid = Column(BigInteger, nullable=False, server_default=CURRENT_XID)
+
     # Relationships
     user = relationship("User", back_populates="timeline_events")
     document = relationship("Document", back_populates="timeline_events")
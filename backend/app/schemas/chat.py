@@ -1,5 +1,5 @@
 """Chat schemas"""
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, AliasChoices
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from uuid import UUID
@@ -53,7 +53,10 @@ class ChatMessageResponse(ChatMessageBase):
     id: UUID
     session_id: UUID
     user_id: UUID
-    metadata: Dict[str, Any]
+    # The ORM attribute is doc_metadata (metadata is reserved by SQLAlchemy)
+    metadata: Dict[str, Any] = Field(
+        default={}, validation_alias=AliasChoices("doc_metadata", "metadata")
+    )
     token_count: Optional[int] = None
     model_name: Optional[str] = None
     model_version: Optional[str] = None
@@ -77,3 +80,13 @@ class ChatResponse(BaseModel):
     session_id: UUID
     message: ChatMessageResponse
     sources: Optional[List[Dict[str, Any]]] = []
+
+
+class PatientContextResponse(BaseModel):
+    """Compact patient context schema"""
+
+    context: str
+    token_count: int
+    data_version: int
+    event_count: int
+    omitted_event_count: int
@@ -1,6 +1,8 @@
 """Common Pydantic schemas"""
 from pydantic import BaseModel
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, Generic, List, TypeVar
+
+T = TypeVar("T")
 
 
 class SuccessResponse(BaseModel):
@@ -36,15 +38,15 @@ class PaginatedResponse(BaseModel):
     """Paginated response wrapper"""
 
     items: list
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
 
     @classmethod
-    def create(cls, items: list, total: int, page: int, page_size: int):
-        """Create paginated response"""
-        total_pages = (total + page_size - 1) // page_size
+    def create(cls, items: list, total: Optional[int], page: int, page_size: int):
+        """Create paginated response; total is None when counting was skipped"""
+        total_pages = (total + page_size - 1) // page_size if total is not None else None
         return cls(
             items=items,
             total=total,
@@ -52,3 +54,14 @@ class PaginatedResponse(BaseModel):
             page_size=page_size,
             total_pages=total_pages,
         )
+
+
+class CursorPage(BaseModel, Generic[T]):
+    """Keyset-paginated response wrapper"""
+
+    items: List[T]
+    page_size: int
+    total: Optional[int] = None
+    # Pass back as the matching cursor parameter to fetch the adjacent page
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
@@ -1,10 +1,11 @@
 """Document schemas"""
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, Field, ConfigDict, AliasChoices
+from typing import Optional, Dict, Any, List, Union
 from datetime import date, datetime
 from uuid import UUID
 
-from app.models.document import DocumentType, ProcessingStatus
+from app.core.fieldsets import FieldSelection
+from app.models.document import Document, DocumentType, ProcessingStatus
 
 
 class DocumentBase(BaseModel):
@@ -49,6 +50,10 @@ class DocumentResponse(DocumentBase):
 
     id: UUID
     user_id: UUID
+    # The ORM attribute is doc_metadata (metadata is reserved by SQLAlchemy)
+    metadata: Dict[str, Any] = Field(
+        default={}, validation_alias=AliasChoices("doc_metadata", "metadata")
+    )
     storage_path: str
     mime_type: str
     file_size: int
@@ -63,6 +68,23 @@ class DocumentResponse(DocumentBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class DocumentSummary(BaseModel):
+    """Document list item schema, without extracted text or metadata"""
+
+    id: UUID
+    file_name: str
+    document_type: DocumentType
+    document_subtype: Optional[str] = None
+    document_date: Optional[date] = None
+    tags: List[str] = []
+    mime_type: str
+    file_size: int
+    processing_status: ProcessingStatus
+    uploaded_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class DocumentList(BaseModel):
     """Document list response"""
 
@@ -70,3 +92,13 @@ class DocumentList(BaseModel):
     total: int
     page: int
     page_size: int
+
+
+# Summary by default in lists; any DocumentResponse field on request
+DOCUMENT_FIELDS = FieldSelection(
+    Document,
+    DocumentResponse,
+    DocumentSummary,
+    attributes={"metadata": "doc_metadata"},
+)
+DocumentItem = Union[DocumentSummary, Dict[str, Any]]
@@ -0,0 +1,17 @@
+"""Record import schemas"""
+from pydantic import BaseModel
+from typing import Dict, List
+
+from app.schemas.medical_entity import EntityMergeResponse
+
+
+class FhirImportSummary(BaseModel):
+    """Outcome of a FHIR bundle import"""
+
+    entities_created: int
+    events_created: int
+    # Resources imported and skipped, by FHIR resourceType
+    imported: Dict[str, int] = {}
+    skipped: Dict[str, int] = {}
+    # Deduplication run after the import; merged ids no longer exist
+    merges: List[EntityMergeResponse] = []
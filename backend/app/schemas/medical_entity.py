@@ -1,11 +1,15 @@
 """Medical Entity schemas"""
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
 from datetime import date, datetime
 from uuid import UUID
 from decimal import Decimal
 
-from app.models.medical_entity import EntityType
+from app.core.fieldsets import FieldSelection
+from app.models.medical_entity import MedicalEntity, EntityType
+
+# Upper bound for one POST /medical-entities/bulk request
+MEDICAL_ENTITY_BULK_MAX_ITEMS = 10000
 
 
 class MedicalEntityBase(BaseModel):
@@ -21,7 +25,57 @@ class MedicalEntityCreate(MedicalEntityBase):
     """Medical entity creation schema"""
 
     document_id: Optional[UUID] = None
-    extraction_confidence: Optional[Decimal] = None
+    extraction_confidence: Optional[Decimal] = Field(None, ge=0, le=1)
+
+
+class MedicalEntityBulkCreate(BaseModel):
+    """Bulk medical entity ingest schema"""
+
+    # Validated one by one so a bad item is reported instead of failing the batch
+    entities: List[Dict[str, Any]] = Field(
+        ...,
+        min_length=1,
+        max_length=MEDICAL_ENTITY_BULK_MAX_ITEMS,
+        description="MedicalEntityCreate objects",
+    )
+
+
+class BulkItemError(BaseModel):
+    """Why one item of a bulk request was rejected"""
+
+    index: int
+    errors: List[Dict[str, Any]]
+
+
+class EntityMergeResponse(BaseModel):
+    """Duplicates merged into one entity"""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    survivor_id: UUID
+    merged_ids: List[UUID]
+
+
+class MedicalEntityBulkResponse(BaseModel):
+    """Result of a bulk medical entity ingest"""
+
+    created: int
+    # Timeline events derived from the new entities
+    events_created: int = 0
+    # Per input item: the new entity's id, or None if the item was rejected
+    ids: List[Optional[UUID]]
+    errors: List[BulkItemError] = []
+    # Deduplication run after the ingest; merged ids no longer exist
+    merges: List[EntityMergeResponse] = []
+
+
+class EntityDedupResponse(BaseModel):
+    """Result of a deduplication run"""
+
+    # Entities written since the previous run
+    checked: int
+    merged: int
+    merges: List[EntityMergeResponse] = []
 
 
 class MedicalEntityUpdate(BaseModel):
@@ -46,3 +100,62 @@ class MedicalEntityResponse(MedicalEntityBase):
     updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class MedicalEntitySummary(BaseModel):
+    """Medical entity list item schema, without entity data"""
+
+    id: UUID
+    entity_type: EntityType
+    entity_date: Optional[date] = None
+    entity_end_date: Optional[date] = None
+    document_id: Optional[UUID] = None
+    is_verified: bool
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Summary by default in lists; any MedicalEntityResponse field on request
+ENTITY_FIELDS = FieldSelection(MedicalEntity, MedicalEntityResponse, MedicalEntitySummary)
+MedicalEntityItem = Union[MedicalEntitySummary, Dict[str, Any]]
+
+
+class LabSeriesPoint(BaseModel):
+    """One lab measurement in a series"""
+
+    entity_id: UUID
+    measured_on: date
+    value: float
+    rolling_mean: float
+    reference_low: Optional[float] = None
+    reference_high: Optional[float] = None
+    flag: Optional[str] = None  # "low" or "high" outside the reference range
+
+
+class LabSeriesResponse(BaseModel):
+    """A lab test's values over time, with trend statistics"""
+
+    test: str
+    unit: Optional[str] = None  # Most common unit; other units are left out
+    count: int  # Measurements in the series, before downsampling
+    other_unit_count: int = 0
+    rolling_window: int
+    slope_per_year: Optional[float] = None  # Least-squares trend, in unit per year
+    out_of_range_count: int = 0
+    downsampled: bool = False
+    points: List[LabSeriesPoint] = []  # Oldest first
+
+
+class MedicationPeriodResponse(BaseModel):
+    """A medication's period on the timeline"""
+
+    entity_id: UUID
+    start_date: date
+    end_date: Optional[date] = None  # None while ongoing
+    name: Optional[str] = None
+    dosage: Optional[str] = None
+    frequency: Optional[str] = None
+    # Other medications whose periods overlap this one
+    overlaps_with: List[UUID] = []
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,44 @@
+"""Search schemas"""
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import date, datetime
+from uuid import UUID
+import enum
+
+
+class SearchSource(str, enum.Enum):
+    """Search result source enum"""
+
+    DOCUMENT = "document"
+    MEDICAL_ENTITY = "medical_entity"
+    VOICE_LOG = "voice_log"
+
+
+class VoiceLogSearchResult(BaseModel):
+    """Voice log full-text search result"""
+
+    id: UUID
+    document_id: Optional[UUID] = None
+    snippet: Optional[str] = None
+    rank: float
+    duration_seconds: Optional[int] = None
+    tags: List[str] = []
+    recorded_at: datetime
+
+
+class SearchResult(BaseModel):
+    """Single hit in a unified search"""
+
+    source: SearchSource
+    id: UUID
+    title: str
+    snippet: Optional[str] = None
+    rank: float
+    occurred_on: Optional[date] = None
+
+
+class UnifiedSearchResponse(BaseModel):
+    """Unified search response, ordered by relevance across all sources"""
+
+    query: str
+    results: List[SearchResult]
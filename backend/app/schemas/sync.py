@@ -0,0 +1,44 @@
+"""Delta sync schemas"""
+from pydantic import AliasChoices, BaseModel, Field
+from typing import List
+from datetime import datetime
+from uuid import UUID
+import enum
+
+from app.schemas.document import DocumentResponse
+from app.schemas.medical_entity import MedicalEntityResponse
+from app.schemas.timeline import TimelineEventResponse
+
+
+class SyncTable(str, enum.Enum):
+    """Synced table enum"""
+
+    DOCUMENTS = "documents"
+    MEDICAL_ENTITIES = "medical_entities"
+    TIMELINE_EVENTS = "timeline_events"
+
+
+class SyncTombstone(BaseModel):
+    """A row deleted since the last sync"""
+
+    # Read from SyncTombstone rows, whose columns are table_name and row_id
+    table: SyncTable = Field(validation_alias=AliasChoices("table_name", "table"))
+    id: UUID = Field(validation_alias=AliasChoices("row_id", "id"))
+    deleted_at: datetime
+
+
+class SyncResponse(BaseModel):
+    """Rows changed since a sync token"""
+
+    # Pass back as `since` on the next sync
+    token: str
+    # True when the pass is incomplete; sync again with the token for the rest
+    has_more: bool = False
+    # True when the token was too old to sync from; the response holds every
+    # row and the client should replace its local copy
+    reset: bool = False
+    # Documents omit extracted_text; fetch a document to read it
+    documents: List[DocumentResponse] = []
+    medical_entities: List[MedicalEntityResponse] = []
+    timeline_events: List[TimelineEventResponse] = []
+    deleted: List[SyncTombstone] = []
@@ -1,10 +1,16 @@
 """Timeline schemas"""
-from pydantic import BaseModel, ConfigDict
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, ConfigDict, Field, AliasChoices
+from typing import Optional, Dict, Any, List, Union
 from datetime import date, datetime
 from uuid import UUID
+import enum
 
-from app.models.timeline import EventType
+from app.core.fieldsets import FieldSelection
+from app.models.timeline import TimelineEvent, EventType
+from app.schemas.medical_entity import MedicalEntityResponse
+
+# Upper bound for one POST /timeline/bulk request
+TIMELINE_BULK_MAX_EVENTS = 1000
 
 
 class TimelineEventBase(BaseModel):
@@ -26,6 +32,14 @@ class TimelineEventCreate(TimelineEventBase):
     medical_entity_ids: List[UUID] = []
 
 
+class TimelineEventBulkCreate(BaseModel):
+    """Bulk timeline event creation schema"""
+
+    events: List[TimelineEventCreate] = Field(
+        ..., min_length=1, max_length=TIMELINE_BULK_MAX_EVENTS
+    )
+
+
 class TimelineEventUpdate(BaseModel):
     """Timeline event update schema"""
 
@@ -43,6 +57,10 @@ class TimelineEventResponse(TimelineEventBase):
 
     id: UUID
     user_id: UUID
+    # The ORM attribute is doc_metadata (metadata is reserved by SQLAlchemy)
+    metadata: Dict[str, Any] = Field(
+        default={}, validation_alias=AliasChoices("doc_metadata", "metadata")
+    )
     document_id: Optional[UUID] = None
     is_starred: bool
     user_notes: Optional[str] = None
@@ -50,3 +68,68 @@ class TimelineEventResponse(TimelineEventBase):
     updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class TimelineEventDetail(TimelineEventResponse):
+    """Timeline event response with its linked medical entities"""
+
+    # Only present with include=entities
+    medical_entities: Optional[List[MedicalEntityResponse]] = None
+
+
+class TimelineEventSummary(BaseModel):
+    """Timeline event list item schema, without metadata or notes"""
+
+    id: UUID
+    event_type: EventType
+    title: str
+    description: Optional[str] = None
+    event_date: date
+    document_id: Optional[UUID] = None
+    is_starred: bool
+    tags: List[str] = []
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Summary by default in lists; any TimelineEventResponse field on request
+TIMELINE_FIELDS = FieldSelection(
+    TimelineEvent,
+    TimelineEventResponse,
+    TimelineEventSummary,
+    attributes={"metadata": "doc_metadata"},
+)
+TimelineEventItem = Union[TimelineEventSummary, Dict[str, Any]]
+
+
+class TimelineDeriveResponse(BaseModel):
+    """Result of deriving timeline events from medical entities"""
+
+    created: int
+
+
+class TimelineGranularity(str, enum.Enum):
+    """Bucket size for timeline aggregation"""
+
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+    YEAR = "year"
+
+
+class TimelineBucket(BaseModel):
+    """Event counts for one date bucket"""
+
+    start: date  # First day of the bucket; weeks start on Monday
+    total: int
+    counts: Dict[str, int]  # Per event type
+
+
+class TimelineAggregateResponse(BaseModel):
+    """Timeline event density over a date range"""
+
+    granularity: TimelineGranularity
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    total: int
+    buckets: List[TimelineBucket]  # Oldest first; empty buckets are omitted
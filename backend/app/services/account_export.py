@@ -0,0 +1,230 @@
+"""
+Full account export
+
+Builds a ZIP of everything stored for a user as a stream of bytes:
+
+- profile.json: the user row
+- <table>.ndjson: one JSON object per row for documents, medical entities,
+  timeline events and their entity links, chat sessions, messages and
+  message references, and voice logs
+- files/documents/<id>/<file name> and files/voice_logs/<id>/<file name>:
+  the original uploads and recordings
+- manifest.json: row and file counts, and any files that could not be read
+
+Rows are read through server-side cursors EXPORT_ROW_BATCH_SIZE at a time,
+in one read-only REPEATABLE READ transaction so every table comes from the
+same snapshot. The list of stored files is read in that transaction too;
+the connection goes back to the pool before the files are downloaded from
+storage in EXPORT_FILE_CHUNK_BYTES chunks. Each piece is compressed into the
+archive and handed to the response as soon as it is written, so memory use
+does not grow with the size of the account. Embeddings are derived data and
+are not exported.
+"""
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from uuid import UUID
+import posixpath
+import zipfile
+
+import httpx
+from sqlalchemy import Select, select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.responses import json_dumps
+from app.models.chat import ChatMessage, ChatMessageReference, ChatSession
+from app.models.document import Document
+from app.models.medical_entity import MedicalEntity
+from app.models.timeline import TimelineEvent, TimelineEventEntity
+from app.models.user import User
+from app.models.voice_log import VoiceLog
+
+# Export keys that differ from column names, to match the API's field names
+RENAMED_KEYS = {"doc_metadata": "metadata"}
+
+# Original files are mostly compressed already (PDF, JPEG, audio)
+FILE_COMPRESS_LEVEL = 1
+
+
+class _ZipSink:
+    """
+    Write-only target for ZipFile that keeps bytes until they are drained
+
+    It has no tell() or seek(), so ZipFile writes streaming-friendly local
+    headers with data descriptors instead of seeking back to patch sizes.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _table_queries(user_id: UUID) -> List[Tuple[str, Select]]:
+    """Export file name and query for every table exported as NDJSON"""
+    events = TimelineEvent.__table__
+    messages = ChatMessage.__table__
+    return [
+        ("documents", select(Document.__table__).where(Document.user_id == user_id)),
+        (
+            "medical_entities",
+            select(MedicalEntity.__table__).where(MedicalEntity.user_id == user_id),
+        ),
+        ("timeline_events", select(events).where(events.c.user_id == user_id)),
+        (
+            "timeline_event_entities",
+            select(TimelineEventEntity.__table__)
+            .join(events, events.c.id == TimelineEventEntity.timeline_event_id)
+            .where(events.c.user_id == user_id),
+        ),
+        ("chat_sessions", select(ChatSession.__table__).where(ChatSession.user_id == user_id)),
+        ("chat_messages", select(messages).where(messages.c.user_id == user_id)),
+        (
+            "chat_message_references",
+            select(ChatMessageReference.__table__)
+            .join(messages, messages.c.id == ChatMessageReference.chat_message_id)
+            .where(messages.c.user_id == user_id),
+        ),
+        ("voice_logs", select(VoiceLog.__table__).where(VoiceLog.user_id == user_id)),
+    ]
+
+
+def _file_queries(user_id: UUID) -> List[Tuple[str, Select]]:
+    """Archive folder and (id, file name, storage path) query for each kind of stored file"""
+    return [
+        (
+            "documents",
+            select(Document.id, Document.file_name, Document.storage_path).where(
+                Document.user_id == user_id
+            ),
+        ),
+        (
+            "voice_logs",
+            select(
+                VoiceLog.id,
+                VoiceLog.audio_storage_path.label("file_name"),
+                VoiceLog.audio_storage_path,
+            ).where(VoiceLog.user_id == user_id),
+        ),
+    ]
+
+
+def _row_json(row: Any) -> bytes:
+    data = {RENAMED_KEYS.get(key, key): value for key, value in row._mapping.items()}
+    return json_dumps(data)
+
+
+def _archive_name(folder: str, row_id: UUID, file_name: str) -> str:
+    """Path inside the archive, safe against names with directories in them"""
+    name = posixpath.basename(file_name.replace("\\", "/")) or "file"
+    return f"files/{folder}/{row_id}/{name}"
+
+
+def _drop_entry(archive: zipfile.ZipFile, name: str) -> None:
+    """
+    Leave a partly written entry out of the central directory
+
+    Its bytes have already been streamed, but zip readers list entries from
+    the central directory, so a truncated file never shows up as complete.
+    """
+    info = archive.NameToInfo.pop(name)
+    archive.filelist.remove(info)
+
+
+def _storage_url(path: str) -> str:
+    return (
+        f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/object/authenticated/"
+        f"{settings.SUPABASE_STORAGE_BUCKET}/{path}"
+    )
+
+
+async def stream_account_export(user_id: UUID) -> AsyncIterator[bytes]:
+    """
+    Yield the user's export ZIP, piece by piece
+
+    Opens its own database session, since the response streams after the
+    request's dependencies have been closed, and closes it before
+    downloading files.
+    """
+    sink = _ZipSink()
+    counts: Dict[str, int] = {}
+    missing_files: List[Dict[str, Any]] = []
+    headers = {
+        "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
+        "apikey": settings.SUPABASE_SERVICE_KEY,
+    }
+
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    files: List[Tuple[str, Any]] = []
+
+    async with AsyncSessionLocal() as db:
+        await db.connection(
+            execution_options={"isolation_level": "REPEATABLE READ", "postgresql_readonly": True}
+        )
+        for folder, query in _file_queries(user_id):
+            result = await db.execute(query)
+            files.extend((folder, row) for row in result)
+            counts[f"files/{folder}"] = 0
+
+        user = await db.execute(select(User.__table__).where(User.id == user_id))
+        archive.writestr("profile.json", _row_json(user.one()))
+        yield sink.drain()
+
+        for name, query in _table_queries(user_id):
+            counts[name] = 0
+            result = await db.stream(
+                query.execution_options(yield_per=settings.EXPORT_ROW_BATCH_SIZE)
+            )
+            with archive.open(f"{name}.ndjson", "w", force_zip64=True) as entry:
+                async for rows in result.partitions():
+                    entry.write(b"".join(_row_json(row) + b"\n" for row in rows))
+                    counts[name] += len(rows)
+                    yield sink.drain()
+            yield sink.drain()
+
+    archive.compresslevel = FILE_COMPRESS_LEVEL
+    async with httpx.AsyncClient(
+        headers=headers, timeout=settings.EXPORT_STORAGE_TIMEOUT_SECONDS
+    ) as storage:
+        for folder, (row_id, file_name, storage_path) in files:
+            name = None
+            try:
+                async with storage.stream("GET", _storage_url(storage_path)) as response:
+                    if response.status_code != 200:
+                        missing_files.append(
+                            {"path": storage_path, "error": f"HTTP {response.status_code}"}
+                        )
+                        continue
+                    name = _archive_name(folder, row_id, file_name)
+                    with archive.open(name, "w", force_zip64=True) as entry:
+                        async for chunk in response.aiter_bytes(settings.EXPORT_FILE_CHUNK_BYTES):
+                            entry.write(chunk)
+                            yield sink.drain()
+                    counts[f"files/{folder}"] += 1
+            except httpx.HTTPError as e:
+                if name is not None:
+                    _drop_entry(archive, name)
+                missing_files.append({"path": storage_path, "error": str(e)})
+            yield sink.drain()
+
+    manifest = {
+        "user_id": user_id,
+        "exported_at": datetime.now(timezone.utc),
+        "app_version": settings.APP_VERSION,
+        "counts": counts,
+        "missing_files": missing_files,
+    }
+    archive.compresslevel = None
+    archive.writestr("manifest.json", json_dumps(manifest))
+    archive.close()
+    yield sink.drain()
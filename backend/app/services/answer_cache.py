@@ -0,0 +1,114 @@
+"""
+Semantic answer cache
+
+Remembers chat answers per user, keyed by the question embedding. A new
+question whose embedding is close enough to a cached one, asked while the
+user's data version is unchanged, reuses the stored answer and sources
+without calling the model.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from math import sqrt
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+import copy
+import time
+
+from app.core.config import settings
+
+
+@dataclass
+class CachedAnswer:
+    """Answer stored for a question"""
+
+    question: str
+    answer: str
+    sources: List[Dict[str, Any]]
+    model_name: Optional[str]
+    token_count: Optional[int]
+    data_version: int
+    embedding: Tuple[float, ...] = field(repr=False)
+    created_at: float = field(default_factory=time.monotonic)
+
+
+def _normalize(vector: Sequence[float]) -> Tuple[float, ...]:
+    """Scale a vector to unit length so cosine similarity is a dot product"""
+    norm = sqrt(sum(x * x for x in vector)) or 1.0
+    return tuple(x / norm for x in vector)
+
+
+class AnswerCache:
+    """Per-user LRU of answers, looked up by embedding similarity"""
+
+    def __init__(
+        self,
+        similarity_threshold: float,
+        max_entries_per_user: int,
+        max_users: int,
+        ttl_seconds: float,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[UUID, List[CachedAnswer]]" = OrderedDict()
+        self._lock = Lock()
+
+    def lookup(
+        self, user_id: UUID, embedding: Sequence[float], data_version: int
+    ) -> Optional[CachedAnswer]:
+        """
+        Find the most similar cached answer still valid at data_version
+
+        Entries from older data versions or past their TTL are dropped on the way.
+        """
+        query = _normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries.get(user_id)
+            if not entries:
+                return None
+
+            entries[:] = [
+                entry
+                for entry in entries
+                if entry.data_version == data_version and now - entry.created_at < self.ttl_seconds
+            ]
+            best, best_score = None, self.similarity_threshold
+            for entry in entries:
+                score = sum(a * b for a, b in zip(query, entry.embedding))
+                if score >= best_score:
+                    best, best_score = entry, score
+
+            if best is None:
+                return None
+            self._entries.move_to_end(user_id)
+            return copy.deepcopy(best)
+
+    def store(self, user_id: UUID, embedding: Sequence[float], answer: CachedAnswer) -> None:
+        """Cache an answer for a question embedding"""
+        answer.embedding = _normalize(embedding)
+        with self._lock:
+            entries = self._entries.setdefault(user_id, [])
+            self._entries.move_to_end(user_id)
+            entries.append(answer)
+            del entries[: -self.max_entries_per_user]
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def clear(self, user_id: Optional[UUID] = None) -> None:
+        """Drop cached answers for one user, or for everyone"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+answer_cache = AnswerCache(
+    similarity_threshold=settings.CHAT_ANSWER_CACHE_SIMILARITY,
+    max_entries_per_user=settings.CHAT_ANSWER_CACHE_MAX_ENTRIES,
+    max_users=settings.CHAT_ANSWER_CACHE_MAX_USERS,
+    ttl_seconds=settings.CHAT_ANSWER_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,26 @@
+"""
+Commit-ordered change tracking
+
+documents, medical_entities, timeline_events and sync_tombstones carry
+change_xid, the id of the transaction that last wrote the row. Timestamps
+cannot order changes by commit: now() is a transaction's start time, so a
+long import commits rows stamped minutes in the past, behind any watermark
+taken while it ran.
+
+A snapshot's xmin can: every transaction with a lower id has finished, and
+later snapshots never have a lower xmin. A transaction that had not
+committed when the watermark was taken has an id at or above it, so
+reading rows with change_xid >= watermark later sees every write committed
+since, however long its transaction ran. Writes seen before may be read
+again, so readers must apply them idempotently.
+"""
+from sqlalchemy import BigInteger, Text, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Lowest transaction id still running when the statement's snapshot was taken
+SNAPSHOT_XMIN = cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger)
+
+
+async def get_change_watermark(db: AsyncSession) -> int:
+    """Watermark for a later read of the rows with change_xid >= it"""
+    return await db.scalar(select(SNAPSHOT_XMIN))
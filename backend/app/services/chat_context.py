@@ -0,0 +1,270 @@
+"""
+Chat context assembly for RAG
+
+Gathers everything the assistant needs to answer a question - relevant
+document chunks, the compact patient context, and recent conversation
+history - concurrently, each on its own pooled session and under its own
+timeout.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+from uuid import UUID
+import asyncio
+import logging
+
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.chat import ChatMessageReference
+from app.models.document import Document
+from app.models.embedding import DocumentChunk, Embedding
+from app.services import llm
+from app.services.chat_history import ChatHistoryManager, HistoryWindow, MessageKey
+from app.services.patient_context import PatientContext, patient_context_cache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class ContextChunk:
+    """Document chunk retrieved by vector similarity"""
+
+    chunk_id: UUID
+    document_id: UUID
+    document_name: str
+    document_date: Optional[date]
+    text: str
+    similarity: float
+
+
+@dataclass
+class ChatContext:
+    """Context assembled for a single chat turn"""
+
+    chunks: List[ContextChunk] = field(default_factory=list)
+    patient: Optional[PatientContext] = None
+    history: List[Dict[str, str]] = field(default_factory=list)
+    history_summary: Optional[str] = None
+    # Set when older turns fell out of the history window and need folding
+    history_fold_until: Optional[MessageKey] = None
+
+    def system_prompt(self) -> str:
+        """Render the system prompt with the retrieved patient records"""
+        sections = [llm.SYSTEM_PROMPT]
+
+        if self.history_summary:
+            sections.append("Summary of the earlier conversation:\n" + self.history_summary)
+
+        if self.patient is not None and self.patient.text:
+            sections.append("Patient records:\n" + self.patient.text)
+
+        if self.chunks:
+            excerpts = [
+                f"[{chunk.document_name}"
+                + (f", {chunk.document_date.isoformat()}" if chunk.document_date else "")
+                + f"]\n{chunk.text}"
+                for chunk in self.chunks
+            ]
+            sections.append("Relevant document excerpts:\n\n" + "\n\n".join(excerpts))
+
+        return "\n\n".join(sections)
+
+    def messages(self, question: str) -> List[Dict[str, str]]:
+        """
+        Conversation to send to the model: history followed by the new question
+
+        Providers expect alternating user/assistant turns starting with the
+        user, so system messages are dropped and consecutive turns from the
+        same role are merged.
+        """
+        messages: List[Dict[str, str]] = []
+        for message in [*self.history, {"role": "user", "content": question}]:
+            if message["role"] not in ("user", "assistant"):
+                continue
+            if not messages and message["role"] != "user":
+                continue
+            if messages and messages[-1]["role"] == message["role"]:
+                messages[-1] = {
+                    "role": message["role"],
+                    "content": messages[-1]["content"] + "\n\n" + message["content"],
+                }
+            else:
+                messages.append(dict(message))
+        return messages
+
+    def sources(self) -> List[Dict[str, Any]]:
+        """Sources used for this turn, one per referenced document or entity"""
+        sources: List[Dict[str, Any]] = []
+        seen = set()
+
+        for chunk in self.chunks:
+            if ("document", chunk.document_id) in seen:
+                continue
+            seen.add(("document", chunk.document_id))
+            sources.append(
+                {
+                    "type": "document",
+                    "document_id": chunk.document_id,
+                    "title": chunk.document_name,
+                    "relevance_score": round(chunk.similarity, 2),
+                }
+            )
+
+        if self.patient is not None:
+            for source in self.patient.sources:
+                if source["type"] == "document":
+                    key = ("document", source["document_id"])
+                else:
+                    key = ("medical_entity", source["medical_entity_id"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                sources.append(dict(source))
+
+        return sources
+
+
+async def _with_timeout(
+    name: str,
+    fetch: Callable[[AsyncSession], Awaitable[T]],
+    timeout: float,
+    default: Callable[[], T] = list,
+) -> T:
+    """
+    Run one context source on its own session
+
+    A slow or failing source is dropped instead of failing the whole turn.
+    """
+
+    async def run() -> T:
+        async with AsyncSessionLocal() as session:
+            return await fetch(session)
+
+    try:
+        return await asyncio.wait_for(run(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Chat context source '{name}' timed out after {timeout}s")
+    except Exception as e:
+        logger.warning(f"Chat context source '{name}' failed: {str(e)}")
+    return default()
+
+
+class ChatContextBuilder:
+    """Builds the RAG context for one chat turn"""
+
+    def __init__(
+        self,
+        user_id: UUID,
+        session_id: UUID,
+        exclude_message_id: Optional[UUID] = None,
+        query_vector: Optional[List[float]] = None,
+    ):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.exclude_message_id = exclude_message_id
+        self.query_vector = query_vector
+
+    async def build(
+        self, question: str, include_history: bool = True, max_history: int = 10
+    ) -> ChatContext:
+        """Fetch all context sources in parallel"""
+        query_timeout = settings.CHAT_CONTEXT_QUERY_TIMEOUT_SECONDS
+        sources = [
+            _with_timeout(
+                "vector",
+                lambda db: self._fetch_chunks(db, question),
+                settings.CHAT_RETRIEVAL_TIMEOUT_SECONDS,
+            ),
+            _with_timeout(
+                "patient",
+                lambda db: patient_context_cache.get(db, self.user_id),
+                query_timeout,
+                default=lambda: None,
+            ),
+        ]
+        if include_history and max_history > 0:
+            sources.append(
+                _with_timeout(
+                    "history",
+                    lambda db: ChatHistoryManager(self.session_id).window(
+                        db, max_history, exclude_message_id=self.exclude_message_id
+                    ),
+                    query_timeout,
+                    default=HistoryWindow,
+                )
+            )
+
+        chunks, patient, *history = await asyncio.gather(*sources)
+        window = history[0] if history else HistoryWindow()
+        return ChatContext(
+            chunks=chunks,
+            patient=patient,
+            history=window.messages,
+            history_summary=window.summary,
+            history_fold_until=window.fold_until,
+        )
+
+    async def _fetch_chunks(self, db: AsyncSession, question: str) -> List[ContextChunk]:
+        """Nearest document chunks to the question embedding"""
+        query_vector = self.query_vector or await llm.embed(question)
+        distance = Embedding.embedding_vector.cosine_distance(query_vector)
+
+        result = await db.execute(
+            select(
+                DocumentChunk.id,
+                DocumentChunk.document_id,
+                DocumentChunk.chunk_text,
+                Document.file_name,
+                Document.document_date,
+                (1 - distance).label("similarity"),
+            )
+            .join(DocumentChunk, Embedding.chunk_id == DocumentChunk.id)
+            .join(Document, DocumentChunk.document_id == Document.id)
+            .where(
+                Embedding.user_id == self.user_id,
+                Embedding.embedding_model == settings.OPENAI_EMBEDDING_MODEL,
+            )
+            .order_by(distance)
+            .limit(settings.CHAT_CONTEXT_CHUNKS)
+        )
+        # Threshold applied after the ORDER BY ... LIMIT so the vector index is used
+        return [
+            ContextChunk(
+                chunk_id=row.id,
+                document_id=row.document_id,
+                document_name=row.file_name,
+                document_date=row.document_date,
+                text=row.chunk_text,
+                similarity=float(row.similarity),
+            )
+            for row in result
+            if row.similarity >= settings.CHAT_CONTEXT_MIN_SIMILARITY
+        ]
+
+
+async def save_references(
+    db: AsyncSession, chat_message_id: UUID, sources: List[Dict[str, Any]]
+) -> None:
+    """Write the sources of an assistant message in a single multi-row INSERT"""
+    rows = [
+        {
+            "chat_message_id": chat_message_id,
+            "document_id": source.get("document_id"),
+            "medical_entity_id": source.get("medical_entity_id"),
+            "reference_type": "context",
+            "relevance_score": (
+                Decimal(str(source["relevance_score"]))
+                if source.get("relevance_score") is not None
+                else None
+            ),
+        }
+        for source in sources
+    ]
+    if rows:
+        await db.execute(insert(ChatMessageReference).values(rows))
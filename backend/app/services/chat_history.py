@@ -0,0 +1,237 @@
+"""
+Chat history windowing
+
+Keeps the prompt bounded however long a session runs: the most recent
+messages are packed into a token budget, and turns that fall out of the
+window are folded into ChatSession.summary in the background.
+
+The summary watermark - the (created_at, id) of the last folded message - is
+kept in ChatSession.doc_metadata["summary_through"] so each fold only reads
+messages that are not yet summarized.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+import asyncio
+import logging
+
+from sqlalchemy import select, update, tuple_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.chat import ChatMessage, ChatSession
+from app.services import llm
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a patient and a medical assistant.
+Update the existing summary with the new messages. Keep every medically relevant fact (symptoms, medications, test results, dates, questions still open) and drop small talk.
+Reply with the updated summary only, in at most a few short paragraphs."""
+
+MessageKey = Tuple[datetime, UUID]
+
+# Sessions with a fold in flight, and strong references to the running tasks
+_folding_sessions: Set[UUID] = set()
+_fold_tasks: Set[asyncio.Task] = set()
+
+
+def _encode_key(key: MessageKey) -> str:
+    """Serialize a message key for storage in JSONB"""
+    return f"{key[0].isoformat()}|{key[1]}"
+
+
+def _decode_key(value: Optional[str]) -> Optional[MessageKey]:
+    """Parse a stored message key"""
+    if not value:
+        return None
+    created_at, message_id = value.split("|", 1)
+    return datetime.fromisoformat(created_at), UUID(message_id)
+
+
+@dataclass
+class HistoryWindow:
+    """Recent history that fits the token budget"""
+
+    summary: Optional[str] = None
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    token_count: int = 0
+    # Messages older than this key are outside the window and should be folded
+    fold_until: Optional[MessageKey] = None
+
+
+class ChatHistoryManager:
+    """Packs session history into a token budget"""
+
+    def __init__(self, session_id: UUID, token_budget: Optional[int] = None):
+        self.session_id = session_id
+        self.token_budget = token_budget or settings.CHAT_HISTORY_TOKEN_BUDGET
+
+    async def window(
+        self,
+        db: AsyncSession,
+        max_messages: int,
+        exclude_message_id: Optional[UUID] = None,
+    ) -> HistoryWindow:
+        """
+        Build the history window for the next model call
+
+        Args:
+            db: Database session
+            max_messages: Upper bound on the number of recent messages
+            exclude_message_id: Message to leave out (the question being asked)
+
+        Returns:
+            Summary plus the newest messages that fit the budget, oldest first
+        """
+        session_row = (
+            await db.execute(
+                select(ChatSession.summary, ChatSession.doc_metadata).where(
+                    ChatSession.id == self.session_id
+                )
+            )
+        ).one_or_none()
+        summary, watermark = None, None
+        if session_row is not None:
+            summary = session_row.summary
+            watermark = _decode_key((session_row.doc_metadata or {}).get("summary_through"))
+
+        query = select(
+            ChatMessage.id,
+            ChatMessage.role,
+            ChatMessage.content,
+            ChatMessage.token_count,
+            ChatMessage.created_at,
+        ).where(ChatMessage.session_id == self.session_id)
+        if exclude_message_id is not None:
+            query = query.where(ChatMessage.id != exclude_message_id)
+        if watermark is not None:
+            query = query.where(tuple_(ChatMessage.created_at, ChatMessage.id) > watermark)
+
+        rows = list(
+            await db.execute(
+                query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(
+                    max_messages + 1
+                )
+            )
+        )
+
+        window = HistoryWindow(summary=summary)
+        used = llm.estimate_tokens(summary) if summary else 0
+        kept = []
+        for row in rows[:max_messages]:
+            tokens = row.token_count or llm.estimate_tokens(row.content)
+            if used + tokens > self.token_budget:
+                break
+            used += tokens
+            kept.append(row)
+
+        window.messages = [
+            {"role": row.role.value, "content": row.content} for row in reversed(kept)
+        ]
+        window.token_count = used
+
+        # Anything unsummarized older than the window needs folding
+        if len(kept) < len(rows):
+            boundary = kept[-1] if kept else rows[0]
+            window.fold_until = (boundary.created_at, boundary.id)
+
+        return window
+
+
+async def fold_into_summary(session_id: UUID, fold_until: MessageKey) -> None:
+    """
+    Fold unsummarized messages older than fold_until into the session summary
+
+    Works in batches of CHAT_SUMMARY_BATCH_SIZE. The summary is written with a
+    compare-and-set on the watermark, so concurrent folds of the same session
+    on different workers never overwrite each other.
+    """
+    while True:
+        async with AsyncSessionLocal() as db:
+            session_row = (
+                await db.execute(
+                    select(ChatSession.summary, ChatSession.doc_metadata).where(
+                        ChatSession.id == session_id
+                    )
+                )
+            ).one_or_none()
+            if session_row is None:
+                return
+
+            stored_watermark = (session_row.doc_metadata or {}).get("summary_through")
+            watermark = _decode_key(stored_watermark)
+
+            query = select(
+                ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at
+            ).where(
+                ChatMessage.session_id == session_id,
+                tuple_(ChatMessage.created_at, ChatMessage.id) < fold_until,
+            )
+            if watermark is not None:
+                query = query.where(tuple_(ChatMessage.created_at, ChatMessage.id) > watermark)
+            rows = list(
+                await db.execute(
+                    query.order_by(ChatMessage.created_at, ChatMessage.id).limit(
+                        settings.CHAT_SUMMARY_BATCH_SIZE
+                    )
+                )
+            )
+        if not rows:
+            return
+
+        # No connection is held while the model runs
+        transcript = "\n".join(f"{row.role.value.upper()}: {row.content}" for row in rows)
+        prompt = (
+            f"Existing summary:\n{session_row.summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        completion = await llm.complete_chat(
+            [{"role": "user", "content": prompt}],
+            system=SUMMARY_PROMPT,
+            max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+        )
+
+        new_watermark = _encode_key((rows[-1].created_at, rows[-1].id))
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(ChatSession)
+                .where(
+                    ChatSession.id == session_id,
+                    func.coalesce(ChatSession.doc_metadata["summary_through"].astext, "")
+                    == (stored_watermark or ""),
+                )
+                .values(
+                    summary=completion.text,
+                    doc_metadata=func.coalesce(
+                        ChatSession.doc_metadata, func.jsonb_build_object()
+                    ).op("||")(func.jsonb_build_object("summary_through", new_watermark)),
+                )
+            )
+            await db.commit()
+
+        if result.rowcount == 0:
+            # Another worker folded this range first
+            return
+        if len(rows) < settings.CHAT_SUMMARY_BATCH_SIZE:
+            return
+
+
+def schedule_summary_fold(session_id: UUID, fold_until: MessageKey) -> None:
+    """Start a background fold for a session unless one is already running"""
+    if session_id in _folding_sessions:
+        return
+    _folding_sessions.add(session_id)
+
+    async def run():
+        try:
+            await fold_into_summary(session_id, fold_until)
+        except Exception as e:
+            logger.error(f"Summary fold failed for chat session {session_id}: {str(e)}")
+        finally:
+            _folding_sessions.discard(session_id)
+
+    task = asyncio.create_task(run())
+    _fold_tasks.add(task)
+    task.add_done_callback(_fold_tasks.discard)
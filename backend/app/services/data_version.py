@@ -0,0 +1,21 @@
+"""Per-user data versions for cache invalidation"""
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.data_version import UserDataVersion
+
+
+async def get_data_version(db: AsyncSession, user_id: UUID) -> int:
+    """
+    Get the current data version of a user
+
+    The version is maintained by triggers on documents, medical_entities and
+    timeline_events, so any write through any code path invalidates caches
+    keyed on it. Users that never wrote anything are at version 0.
+    """
+    version = await db.scalar(
+        select(UserDataVersion.version).where(UserDataVersion.user_id == user_id)
+    )
+    return version or 0
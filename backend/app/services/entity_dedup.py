@@ -0,0 +1,277 @@
+"""
+Medical entity deduplication
+
+The same medication or diagnosis is often extracted from several documents.
+Duplicates are found in three steps, each cheaper than a pairwise scan:
+
+1. Only entities written since the user's last run are checked, tracked by
+   a change watermark in entity_dedup_state (see app.services.change_tracking)
+   and served by idx_entities_user_change.
+2. Candidates are blocked in SQL on (user, entity type, normalized name,
+   date within DEDUP_DATE_WINDOW_DAYS), served by idx_entities_dedup_block.
+   Lab results and vitals repeat legitimately, so only same-day copies of
+   those are candidates.
+3. Each candidate pair is scored by token-set similarity over the
+   entity_data fields both entities have.
+
+Pairs at or above DEDUP_SIMILARITY_THRESHOLD are clustered, and each
+cluster is merged into its verified or oldest entity: blank fields are
+filled in from the duplicates, timeline event links and chat references
+are re-pointed, and the duplicates are deleted.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from uuid import UUID
+import re
+
+from sqlalchemy import and_, column, delete, func, literal_column, or_, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.models.chat import ChatMessageReference
+from app.models.entity_dedup_state import EntityDedupState
+from app.models.medical_entity import MedicalEntity, EntityType
+from app.models.timeline import TimelineEventEntity
+from app.services.change_tracking import SNAPSHOT_XMIN
+
+# Matches the expression indexed by idx_entities_dedup_block
+DEDUP_KEY = func.entity_dedup_key(MedicalEntity.entity_type, MedicalEntity.entity_data)
+
+SAME_DAY_TYPES = {EntityType.LAB_RESULT, EntityType.VITAL_SIGN}
+
+# Provenance fields that differ between copies of the same fact
+IGNORED_KEYS = {"source", "fhir_id"}
+
+# Columns filled in on the surviving entity when it has no value
+MERGED_COLUMNS = ("document_id", "entity_date", "entity_end_date", "extraction_confidence")
+
+# Numbers and words separately, so "500mg" matches "500 mg"
+TOKEN = re.compile(r"[0-9]+(?:\.[0-9]+)?|[a-z]+")
+
+
+@dataclass
+class EntityMerge:
+    """Duplicates folded into one surviving entity"""
+
+    survivor_id: UUID
+    merged_ids: List[UUID]
+
+
+def _tokens(value: Any) -> FrozenSet[str]:
+    """Lowercase word tokens, with numbers normalized so "5.50" matches "5.5" """
+    tokens = set()
+    for token in TOKEN.findall(str(value).lower()):
+        try:
+            token = f"{float(token):g}"
+        except ValueError:
+            pass
+        tokens.add(token)
+    return frozenset(tokens)
+
+
+def _blank(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def similarity(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """
+    Mean token-set Jaccard similarity over the entity_data fields both have
+
+    Fields only one side has are ignored, since extraction from different
+    documents captures different details. No shared fields scores 1.0: the
+    blocking key already matched.
+    """
+    shared = [
+        key
+        for key in a.keys() & b.keys()
+        if key not in IGNORED_KEYS and not _blank(a[key]) and not _blank(b[key])
+    ]
+    if not shared:
+        return 1.0
+    total = 0.0
+    for key in shared:
+        left, right = _tokens(a[key]), _tokens(b[key])
+        union = left | right
+        total += len(left & right) / len(union) if union else 1.0
+    return total / len(shared)
+
+
+def _clusters(pairs: Iterable[Tuple[UUID, UUID]]) -> List[List[UUID]]:
+    """Connected components of the duplicate pairs (union-find)"""
+    parent: Dict[UUID, UUID] = {}
+
+    def find(node: UUID) -> UUID:
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for left, right in pairs:
+        root_left, root_right = find(left), find(right)
+        if root_left != root_right:
+            parent[root_right] = root_left
+    groups: Dict[UUID, List[UUID]] = {}
+    for node in parent:
+        groups.setdefault(find(node), []).append(node)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _merge_fields(survivor: MedicalEntity, duplicates: List[MedicalEntity]) -> None:
+    """Fill the survivor's blank fields from its duplicates, in survivor order"""
+    data = dict(survivor.entity_data or {})
+    for duplicate in duplicates:
+        for key, value in (duplicate.entity_data or {}).items():
+            if _blank(data.get(key)) and not _blank(value):
+                data[key] = value
+        for name in MERGED_COLUMNS:
+            if getattr(survivor, name) is None and getattr(duplicate, name) is not None:
+                setattr(survivor, name, getattr(duplicate, name))
+    if data != survivor.entity_data:
+        survivor.entity_data = data
+
+
+async def _candidate_pairs(
+    db: AsyncSession, user_id: UUID, since_xid: Optional[int]
+) -> Tuple[int, List[Tuple[UUID, UUID]]]:
+    """
+    Entities written since the change watermark and their blocked duplicate candidates
+
+    Returns:
+        Number of new entities checked, and unordered candidate id pairs
+    """
+    new = select(
+        MedicalEntity.id,
+        MedicalEntity.entity_type,
+        DEDUP_KEY.label("dedup_key"),
+        MedicalEntity.entity_date,
+    ).where(MedicalEntity.user_id == user_id, DEDUP_KEY.is_not(None))
+    if since_xid is not None:
+        new = new.where(MedicalEntity.change_xid >= since_xid)
+    new = new.cte("new_entities")
+
+    checked = await db.scalar(select(func.count()).select_from(new))
+    if not checked:
+        return 0, []
+
+    # A literal so the planner sees a date range over idx_entities_dedup_block
+    window = literal_column(str(int(settings.DEDUP_DATE_WINDOW_DAYS)))
+    candidate = aliased(MedicalEntity)
+    result = await db.execute(
+        select(new.c.id, candidate.id).join(
+            candidate,
+            and_(
+                candidate.user_id == user_id,
+                candidate.entity_type == new.c.entity_type,
+                func.entity_dedup_key(candidate.entity_type, candidate.entity_data)
+                == new.c.dedup_key,
+                candidate.id != new.c.id,
+                or_(
+                    and_(new.c.entity_date.is_(None), candidate.entity_date.is_(None)),
+                    candidate.entity_date.between(
+                        new.c.entity_date - window, new.c.entity_date + window
+                    ),
+                ),
+            ),
+        )
+    )
+    pairs = {tuple(sorted(pair)) for pair in result.tuples()}
+    return checked, list(pairs)
+
+
+async def deduplicate_new_entities(
+    db: AsyncSession, user_id: UUID
+) -> Tuple[int, List[EntityMerge]]:
+    """
+    Merge duplicates among the user's entities written since the last run
+
+    Runs are serialized per user with an advisory lock. Entities written by
+    transactions that commit after a run are still checked by the next
+    one, since the watermark is a snapshot xmin. Does not commit.
+
+    Returns:
+        Number of new entities checked, and the merges made
+    """
+    lock_key = func.hashtext(f"entity_dedup:{user_id}")
+    await db.execute(select(func.pg_advisory_xact_lock(lock_key)))
+    watermark = await db.scalar(select(SNAPSHOT_XMIN))
+    since_xid = await db.scalar(
+        select(EntityDedupState.checked_xid).where(EntityDedupState.user_id == user_id)
+    )
+
+    checked, pairs = await _candidate_pairs(db, user_id, since_xid)
+    merges: List[EntityMerge] = []
+    if pairs:
+        ids = {entity_id for pair in pairs for entity_id in pair}
+        result = await db.execute(select(MedicalEntity).where(MedicalEntity.id.in_(ids)))
+        entities = {entity.id: entity for entity in result.scalars().all()}
+
+        def is_duplicate(left: MedicalEntity, right: MedicalEntity) -> bool:
+            if left.entity_type in SAME_DAY_TYPES and left.entity_date != right.entity_date:
+                return False
+            score = similarity(left.entity_data or {}, right.entity_data or {})
+            return score >= settings.DEDUP_SIMILARITY_THRESHOLD
+
+        duplicates = [
+            (left, right)
+            for left, right in pairs
+            if is_duplicate(entities[left], entities[right])
+        ]
+        for cluster in _clusters(duplicates):
+            ranked = sorted(
+                (entities[entity_id] for entity_id in cluster),
+                key=lambda entity: (not entity.is_verified, entity.created_at, entity.id),
+            )
+            _merge_fields(ranked[0], ranked[1:])
+            merges.append(EntityMerge(ranked[0].id, [entity.id for entity in ranked[1:]]))
+
+    if merges:
+        await _apply_merges(db, merges)
+
+    await db.execute(
+        pg_insert(EntityDedupState)
+        .values(user_id=user_id, checked_xid=watermark)
+        .on_conflict_do_update(
+            index_elements=[EntityDedupState.user_id], set_={"checked_xid": watermark}
+        )
+    )
+    return checked, merges
+
+
+async def _apply_merges(db: AsyncSession, merges: List[EntityMerge]) -> None:
+    """Re-point links and references to the survivors, then delete the duplicates"""
+    await db.flush()  # Survivor field updates
+
+    rows = [
+        (duplicate_id, merge.survivor_id) for merge in merges for duplicate_id in merge.merged_ids
+    ]
+    mapping = values(
+        column("duplicate_id", PG_UUID(as_uuid=True)),
+        column("survivor_id", PG_UUID(as_uuid=True)),
+        name="merges",
+    ).data(rows)
+
+    await db.execute(
+        pg_insert(TimelineEventEntity)
+        .from_select(
+            ["timeline_event_id", "medical_entity_id"],
+            select(TimelineEventEntity.timeline_event_id, mapping.c.survivor_id).join(
+                mapping, TimelineEventEntity.medical_entity_id == mapping.c.duplicate_id
+            ),
+        )
+        .on_conflict_do_nothing()
+    )
+    await db.execute(
+        update(ChatMessageReference)
+        .where(ChatMessageReference.medical_entity_id == mapping.c.duplicate_id)
+        .values(medical_entity_id=mapping.c.survivor_id)
+        .execution_options(synchronize_session=False)
+    )
+    # Cascades to the duplicates' own timeline links
+    await db.execute(
+        delete(MedicalEntity)
+        .where(MedicalEntity.id.in_([duplicate_id for duplicate_id, _ in rows]))
+        .execution_options(synchronize_session=False)
+    )
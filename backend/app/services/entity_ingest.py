@@ -0,0 +1,142 @@
+"""
+Bulk medical entity ingest
+
+Validates a batch of entities item by item, then loads the valid ones with
+a single binary COPY over the session's asyncpg connection. COPY fires the
+same insert triggers as INSERT (row counts, data versions) and skips SQL
+parsing and per-row round trips. The target is 10k entities per second
+on one worker; measure it with scripts/bench_ingest.py.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+import uuid
+
+import orjson
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.document import Document
+from app.models.medical_entity import MedicalEntity
+from app.schemas.medical_entity import (
+    BulkItemError,
+    MedicalEntityBulkResponse,
+    MedicalEntityCreate,
+)
+from app.services.timeline_derivation import derive_timeline_events
+
+ENTITY_ADAPTER = TypeAdapter(MedicalEntityCreate)
+
+# Columns written by COPY; the rest take their column defaults
+COPY_COLUMNS = (
+    "id",
+    "user_id",
+    "document_id",
+    "entity_type",
+    "entity_data",
+    "entity_date",
+    "entity_end_date",
+    "extraction_confidence",
+)
+
+
+def _error_details(exc: ValidationError) -> List[Dict[str, Any]]:
+    """Validation errors without the offending input, which can be large"""
+    return [
+        {"loc": list(error["loc"]), "msg": error["msg"], "type": error["type"]}
+        for error in exc.errors()
+    ]
+
+
+async def copy_records(
+    db: AsyncSession, table_name: str, columns: Sequence[str], records: List[tuple]
+) -> None:
+    """
+    COPY rows into a table inside the session's transaction
+
+    Enum values must be the database labels and JSONB values JSON text, as
+    the asyncpg codecs expect.
+    """
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        table_name, records=records, columns=columns
+    )
+
+
+async def copy_medical_entities(db: AsyncSession, records: List[tuple]) -> None:
+    """COPY rows following COPY_COLUMNS into medical_entities"""
+    await copy_records(db, MedicalEntity.__tablename__, COPY_COLUMNS, records)
+
+
+async def ingest_medical_entities(
+    db: AsyncSession, user_id: UUID, items: List[Dict[str, Any]], atomic: bool = False
+) -> MedicalEntityBulkResponse:
+    """
+    Validate and load a batch of medical entities
+
+    Each item is validated against MedicalEntityCreate, and referenced
+    documents are checked for ownership with one query for the batch.
+    Valid items are loaded even when others fail, unless atomic is set.
+    Timeline events are derived for the loaded entities in the same
+    transaction. Does not commit.
+
+    Returns:
+        Per-item ids and errors; nothing is loaded when atomic and any
+        item failed
+    """
+    errors: List[BulkItemError] = []
+    valid: List[tuple] = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, ENTITY_ADAPTER.validate_python(item)))
+        except ValidationError as exc:
+            errors.append(BulkItemError(index=index, errors=_error_details(exc)))
+
+    document_ids = {entity.document_id for _, entity in valid if entity.document_id is not None}
+    if document_ids:
+        result = await db.execute(
+            select(Document.id).where(Document.user_id == user_id, Document.id.in_(document_ids))
+        )
+        missing = document_ids - set(result.scalars().all())
+        if missing:
+            not_found = {"loc": ["document_id"], "msg": "Document not found", "type": "not_found"}
+            errors.extend(
+                BulkItemError(index=index, errors=[not_found])
+                for index, entity in valid
+                if entity.document_id in missing
+            )
+            valid = [
+                (index, entity) for index, entity in valid if entity.document_id not in missing
+            ]
+    errors.sort(key=lambda error: error.index)
+
+    ids: List[Optional[UUID]] = [None] * len(items)
+    if errors and atomic:
+        return MedicalEntityBulkResponse(created=0, ids=ids, errors=errors)
+
+    records = []
+    for index, entity in valid:
+        entity_id = uuid.uuid4()
+        ids[index] = entity_id
+        records.append(
+            (
+                entity_id,
+                user_id,
+                entity.document_id,
+                entity.entity_type.value,
+                orjson.dumps(entity.entity_data).decode(),
+                entity.entity_date,
+                entity.entity_end_date,
+                entity.extraction_confidence,
+            )
+        )
+    events_created = 0
+    if records:
+        await copy_medical_entities(db, records)
+        events_created = await derive_timeline_events(
+            db, user_id, entity_ids=[record[0] for record in records]
+        )
+    return MedicalEntityBulkResponse(
+        created=len(records), events_created=events_created, ids=ids, errors=errors
+    )
@@ -0,0 +1,372 @@
+"""
+FHIR bundle import
+
+Imports FHIR R4 bundles exported from patient portals. The bundle is parsed
+as a stream with ijson, one `entry[].resource` at a time, so a bundle is
+never held in memory whole. Supported resources are mapped onto medical
+entities and timeline events, buffered, and written with COPY every
+FHIR_IMPORT_BATCH_SIZE resources, which keeps memory flat however large
+the bundle is.
+
+Mapped resources:
+- Observation: lab_result, or vital_sign for the vital-signs category
+- MedicationStatement: medication, with started and ended events
+- Condition: diagnosis
+- Immunization: immunization
+- AllergyIntolerance: allergy (no timeline event)
+
+Resources marked entered-in-error, and immunizations not given, are
+skipped. Every entity keeps its FHIR resource id in entity_data. After
+each batch, derive_timeline_events adds the derived events the mapping
+does not create itself.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+import uuid
+
+import ijson
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.medical_entity import EntityType
+from app.models.timeline import EventType, TimelineEvent, TimelineEventEntity
+from app.schemas.imports import FhirImportSummary
+from app.services.entity_ingest import copy_medical_entities, copy_records
+from app.services.timeline_derivation import derive_timeline_events
+
+# Path of each resource in a Bundle, in ijson prefix notation
+RESOURCE_PREFIX = "entry.item.resource"
+
+EVENT_COPY_COLUMNS = ("id", "user_id", "event_type", "title", "event_date", "doc_metadata")
+LINK_COPY_COLUMNS = ("timeline_event_id", "medical_entity_id")
+
+SKIPPED_STATUSES = {"entered-in-error", "not-done"}
+
+
+class FhirImportError(ValueError):
+    """The upload is not a parseable FHIR bundle"""
+
+
+@dataclass
+class MappedResource:
+    """A FHIR resource as one medical entity and its timeline events"""
+
+    entity_type: EntityType
+    data: Dict[str, Any]
+    entity_date: Optional[date] = None
+    entity_end_date: Optional[date] = None
+    events: List[Tuple[EventType, str, date]] = field(default_factory=list)
+
+
+def _date(value: Any) -> Optional[date]:
+    """Date of a FHIR date or dateTime; partial dates ("2021", "2021-03") fall on the first"""
+    if not isinstance(value, str):
+        return None
+    try:
+        parts = [int(part) for part in value[:10].split("-")]
+        return date(*(parts + [1, 1])[:3])
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(concept: Any) -> Optional[str]:
+    """Display text of a CodeableConcept"""
+    if not isinstance(concept, dict):
+        return None
+    if concept.get("text"):
+        return concept["text"]
+    for coding in concept.get("coding") or []:
+        if coding.get("display") or coding.get("code"):
+            return coding.get("display") or coding.get("code")
+    return None
+
+
+def _code(concept: Any) -> Optional[str]:
+    """First code of a CodeableConcept, e.g. a status"""
+    if not isinstance(concept, dict):
+        return None
+    for coding in concept.get("coding") or []:
+        if coding.get("code"):
+            return coding["code"]
+    return None
+
+
+def _first(items: Any) -> Dict[str, Any]:
+    return items[0] if isinstance(items, list) and items and isinstance(items[0], dict) else {}
+
+
+def _period(resource: Dict[str, Any], name: str) -> Tuple[Optional[date], Optional[date]]:
+    """Start and end of a `<name>[x]` choice element given as a dateTime or a Period"""
+    if f"{name}DateTime" in resource:
+        return _date(resource[f"{name}DateTime"]), None
+    period = resource.get(f"{name}Period") or {}
+    return _date(period.get("start")), _date(period.get("end"))
+
+
+def _quantity(quantity: Dict[str, Any]) -> Tuple[Any, Optional[str]]:
+    return quantity.get("value"), quantity.get("unit") or quantity.get("code")
+
+
+def _observation_value(resource: Dict[str, Any]) -> Tuple[Any, Optional[str]]:
+    """Value and unit of an Observation, joining components as in blood pressure "120/80" """
+    if "valueQuantity" in resource:
+        return _quantity(resource["valueQuantity"])
+    if "valueCodeableConcept" in resource:
+        return _text(resource["valueCodeableConcept"]), None
+    for key in ("valueString", "valueInteger", "valueBoolean"):
+        if key in resource:
+            return resource[key], None
+    components = [
+        _quantity(component.get("valueQuantity") or {})
+        for component in resource.get("component") or []
+    ]
+    components = [(value, unit) for value, unit in components if value is not None]
+    if components:
+        return "/".join(f"{value:g}" for value, _ in components), components[0][1]
+    return None, None
+
+
+def _map_observation(resource: Dict[str, Any]) -> Optional[MappedResource]:
+    name = _text(resource.get("code"))
+    if not name:
+        return None
+    value, unit = _observation_value(resource)
+    start, _ = _period(resource, "effective")
+    start = start or _date(resource.get("issued"))
+    categories = {_code(category) for category in resource.get("category") or []}
+
+    if "vital-signs" in categories:
+        data = {"type": name, "value": value, "unit": unit}
+        events = [(EventType.VITAL_RECORDED, name, start)] if start else []
+        return MappedResource(EntityType.VITAL_SIGN, data, start, events=events)
+
+    reference = _first(resource.get("referenceRange"))
+    reference_range = reference.get("text")
+    if reference_range is None and ("low" in reference or "high" in reference):
+        reference_range = {
+            "low": (reference.get("low") or {}).get("value"),
+            "high": (reference.get("high") or {}).get("value"),
+        }
+    data = {
+        "test_name": name,
+        "value": value,
+        "unit": unit,
+        "reference_range": reference_range,
+        "interpretation": _text(_first(resource.get("interpretation"))),
+        "status": resource.get("status"),
+    }
+    title = f"{name}: {value} {unit or ''}".rstrip() if value is not None else name
+    events = [(EventType.LAB_COMPLETED, title, start)] if start else []
+    return MappedResource(EntityType.LAB_RESULT, data, start, events=events)
+
+
+def _map_medication_statement(resource: Dict[str, Any]) -> Optional[MappedResource]:
+    name = _text(resource.get("medicationCodeableConcept")) or (
+        resource.get("medicationReference") or {}
+    ).get("display")
+    if not name:
+        return None
+    dosage = _first(resource.get("dosage"))
+    dose, dose_unit = _quantity(_first(dosage.get("doseAndRate")).get("doseQuantity") or {})
+    timing = dosage.get("timing") or {}
+    repeat = timing.get("repeat") or {}
+    frequency = _text(timing.get("code"))
+    if frequency is None and repeat.get("frequency"):
+        frequency = (
+            f"{repeat['frequency']} per {repeat.get('period', 1)} {repeat.get('periodUnit', 'd')}"
+        )
+    start, end = _period(resource, "effective")
+    start = start or _date(resource.get("dateAsserted"))
+    data = {
+        "name": name,
+        "dosage": dosage.get("text") or (f"{dose} {dose_unit or ''}".rstrip() if dose else None),
+        "frequency": frequency,
+        "status": resource.get("status"),
+    }
+    events = []
+    if start:
+        events.append((EventType.MEDICATION_STARTED, f"Started {name}", start))
+    if end:
+        events.append((EventType.MEDICATION_ENDED, f"Stopped {name}", end))
+    return MappedResource(EntityType.MEDICATION, data, start, end, events)
+
+
+def _map_condition(resource: Dict[str, Any]) -> Optional[MappedResource]:
+    name = _text(resource.get("code"))
+    if not name:
+        return None
+    start, _ = _period(resource, "onset")
+    start = start or _date(resource.get("recordedDate"))
+    end, _ = _period(resource, "abatement")
+    data = {
+        "condition_name": name,
+        "status": _code(resource.get("clinicalStatus")),
+        "severity": _text(resource.get("severity")),
+    }
+    events = [(EventType.DIAGNOSIS_RECEIVED, f"Diagnosed with {name}", start)] if start else []
+    return MappedResource(EntityType.DIAGNOSIS, data, start, end, events)
+
+
+def _map_immunization(resource: Dict[str, Any]) -> Optional[MappedResource]:
+    name = _text(resource.get("vaccineCode"))
+    if not name:
+        return None
+    start = _date(resource.get("occurrenceDateTime"))
+    data = {
+        "vaccine_name": name,
+        "lot_number": resource.get("lotNumber"),
+        "status": resource.get("status"),
+    }
+    events = [(EventType.IMMUNIZATION_RECEIVED, name, start)] if start else []
+    return MappedResource(EntityType.IMMUNIZATION, data, start, events=events)
+
+
+def _map_allergy_intolerance(resource: Dict[str, Any]) -> Optional[MappedResource]:
+    name = _text(resource.get("code"))
+    if not name:
+        return None
+    reaction = _first(resource.get("reaction"))
+    start, _ = _period(resource, "onset")
+    data = {
+        "allergen": name,
+        "reaction": _text(_first(reaction.get("manifestation"))),
+        "severity": reaction.get("severity") or resource.get("criticality"),
+        "status": _code(resource.get("clinicalStatus")),
+    }
+    return MappedResource(
+        EntityType.ALLERGY, data, start or _date(resource.get("recordedDate"))
+    )
+
+
+MAPPERS: Dict[str, Callable[[Dict[str, Any]], Optional[MappedResource]]] = {
+    "Observation": _map_observation,
+    "MedicationStatement": _map_medication_statement,
+    "Condition": _map_condition,
+    "Immunization": _map_immunization,
+    "AllergyIntolerance": _map_allergy_intolerance,
+}
+
+
+def map_resource(resource: Dict[str, Any]) -> Optional[MappedResource]:
+    """Map one FHIR resource, or None if it is unsupported or unusable"""
+    mapper = MAPPERS.get(resource.get("resourceType"))
+    if mapper is None or resource.get("status") in SKIPPED_STATUSES:
+        return None
+    if _code(resource.get("verificationStatus")) == "entered-in-error":
+        return None
+    mapped = mapper(resource)
+    if mapped is not None:
+        mapped.data = {key: value for key, value in mapped.data.items() if value is not None}
+        mapped.data["source"] = "fhir"
+        if resource.get("id"):
+            mapped.data["fhir_id"] = resource["id"]
+    return mapped
+
+
+class FhirBundleImporter:
+    """Buffers mapped resources for one user and writes them in COPY batches"""
+
+    def __init__(self, db: AsyncSession, user_id: UUID, batch_size: Optional[int] = None):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size or settings.FHIR_IMPORT_BATCH_SIZE
+        self.imported: Counter = Counter()
+        self.skipped: Counter = Counter()
+        self.entities_created = 0
+        self.events_created = 0
+        self._entities: List[tuple] = []
+        self._events: List[tuple] = []
+        self._links: List[tuple] = []
+
+    def add(self, resource: Dict[str, Any]) -> None:
+        """Map a resource into the buffers"""
+        resource_type = str(resource.get("resourceType") or "unknown")
+        mapped = map_resource(resource)
+        if mapped is None:
+            self.skipped[resource_type] += 1
+            return
+        self.imported[resource_type] += 1
+
+        entity_id = uuid.uuid4()
+        self._entities.append(
+            (
+                entity_id,
+                self.user_id,
+                None,
+                mapped.entity_type.value,
+                orjson.dumps(mapped.data).decode(),
+                mapped.entity_date,
+                mapped.entity_end_date,
+                None,
+            )
+        )
+        metadata = orjson.dumps({"source": "fhir", "resource_type": resource_type}).decode()
+        for event_type, title, event_date in mapped.events:
+            event_id = uuid.uuid4()
+            self._events.append(
+                (event_id, self.user_id, event_type.value, title, event_date, metadata)
+            )
+            self._links.append((event_id, entity_id))
+
+    @property
+    def pending(self) -> int:
+        return len(self._entities)
+
+    async def flush(self) -> None:
+        """
+        COPY the buffered rows, entities first so event links can reference them,
+        then derive the events the mapping left out
+        """
+        if self._entities:
+            await copy_medical_entities(self.db, self._entities)
+        if self._events:
+            await copy_records(
+                self.db, TimelineEvent.__tablename__, EVENT_COPY_COLUMNS, self._events
+            )
+            await copy_records(
+                self.db, TimelineEventEntity.__tablename__, LINK_COPY_COLUMNS, self._links
+            )
+        if self._entities:
+            self.events_created += await derive_timeline_events(
+                self.db, self.user_id, entity_ids=[row[0] for row in self._entities]
+            )
+        self.entities_created += len(self._entities)
+        self.events_created += len(self._events)
+        self._entities, self._events, self._links = [], [], []
+
+    async def run(self, stream: Any) -> FhirImportSummary:
+        """
+        Import every resource of a bundle read from a file-like object
+
+        The object needs an async read(size), as UploadFile has. Does not
+        commit.
+
+        Raises:
+            FhirImportError: If the stream is not valid JSON
+        """
+        try:
+            async for resource in ijson.items_async(stream, RESOURCE_PREFIX, use_float=True):
+                if not isinstance(resource, dict):
+                    continue
+                self.add(resource)
+                if self.pending >= self.batch_size:
+                    await self.flush()
+        except ijson.JSONError as exc:
+            message = str(exc).splitlines()[0] if str(exc) else type(exc).__name__
+            raise FhirImportError(f"Invalid JSON: {message}") from exc
+        await self.flush()
+        return FhirImportSummary(
+            entities_created=self.entities_created,
+            events_created=self.events_created,
+            imported=dict(self.imported),
+            skipped=dict(self.skipped),
+        )
+
+
+async def import_fhir_bundle(db: AsyncSession, user_id: UUID, stream: Any) -> FhirImportSummary:
+    """Stream a FHIR bundle into the user's medical entities and timeline"""
+    return await FhirBundleImporter(db, user_id).run(stream)
@@ -0,0 +1,220 @@
+"""
+Lab result time series
+
+Pulls one lab test's values for a user with a single indexed query, then
+computes trend statistics on NumPy arrays: a trailing rolling mean, a
+least-squares slope and reference-range flags. Long series can be reduced
+for charts with Largest-Triangle-Three-Buckets (LTTB) downsampling, which
+keeps the visual shape, peaks included, at a fixed point count.
+"""
+from collections import Counter
+from datetime import date
+from typing import Any, Optional, Tuple
+from uuid import UUID
+import re
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.medical_entity import MedicalEntity
+from app.schemas.medical_entity import LabSeriesPoint, LabSeriesResponse
+
+# Matches the expression indexed by idx_entities_lab_test_date
+TEST_NAME = func.lower(MedicalEntity.lab_test_name)
+
+NUMBER = r"-?\d+(?:\.\d+)?"
+# "13.5-17.5", "13.5 - 17.5", "13.5 to 17.5"
+BOUNDED_RANGE = re.compile(rf"^\s*({NUMBER})\s*(?:-|–|to)\s*({NUMBER})")
+# "<5.7", "<= 5.7", "≤5.7"
+UPPER_LIMIT = re.compile(rf"^\s*(?:<=?|≤)\s*({NUMBER})")
+# ">40", ">= 40", "≥40"
+LOWER_LIMIT = re.compile(rf"^\s*(?:>=?|≥)\s*({NUMBER})")
+
+SECONDS_PER_YEAR = 365.25 * 86400
+
+
+def parse_value(raw: Any) -> Optional[float]:
+    """
+    Numeric lab value from a number or a string such as "13.5 g/dL"
+
+    Qualified values like "<0.5" are read as their bound.
+    """
+    if isinstance(raw, bool):
+        return None
+    if isinstance(raw, (int, float)):
+        return float(raw)
+    if isinstance(raw, str):
+        match = re.search(NUMBER, raw)
+        if match:
+            return float(match.group())
+    return None
+
+
+def parse_reference_range(raw: Any) -> Tuple[Optional[float], Optional[float]]:
+    """Low and high bounds from a range string or a {low, high} object"""
+    if isinstance(raw, dict):
+        return parse_value(raw.get("low", raw.get("min"))), parse_value(
+            raw.get("high", raw.get("max"))
+        )
+    if not isinstance(raw, str):
+        return None, None
+    match = BOUNDED_RANGE.match(raw)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    match = UPPER_LIMIT.match(raw)
+    if match:
+        return None, float(match.group(1))
+    match = LOWER_LIMIT.match(raw)
+    if match:
+        return float(match.group(1)), None
+    return None, None
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over the last `window` values; shorter at the start of the series"""
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+
+def trend_slope(seconds: np.ndarray, values: np.ndarray) -> Optional[float]:
+    """Least-squares slope per year, or None when all values share one date"""
+    if len(values) < 2 or np.ptp(seconds) == 0:
+        return None
+    slope, _ = np.polyfit(seconds - seconds[0], values, 1)
+    return float(slope * SECONDS_PER_YEAR)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps
+
+    The first and last points are always kept. The points between are split
+    into threshold - 2 buckets, and from each bucket the point forming the
+    largest triangle with the previously kept point and the next bucket's
+    average is kept. Buckets are processed in order since each choice depends
+    on the previous one; the area computation within a bucket is vectorized.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket b spans edges[b]:edges[b + 1]; each holds at least one point
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    edges[-1] = n - 1
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    buckets = threshold - 2
+    for b in range(buckets):
+        start, end = edges[b], edges[b + 1]
+        if b + 1 < buckets:
+            next_x = x[edges[b + 1] : edges[b + 2]].mean()
+            next_y = y[edges[b + 1] : edges[b + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        px, py = x[previous], y[previous]
+        areas = np.abs((px - next_x) * (y[start:end] - py) - (px - x[start:end]) * (next_y - py))
+        previous = start + int(np.argmax(areas))
+        selected[b + 1] = previous
+    return selected
+
+
+async def get_lab_series(
+    db: AsyncSession,
+    user_id: UUID,
+    test: str,
+    window: int,
+    max_points: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> LabSeriesResponse:
+    """
+    Build the series for one lab test, matched case-insensitively by name
+
+    Reads the generated lab_test_name, lab_value and lab_unit columns, so
+    the lookup is a range scan on idx_entities_lab_test_date and only the
+    reference range is read from entity_data.
+
+    Args:
+        db: Database session
+        user_id: Owner of the results
+        test: Lab test name, as in entity_data.test_name
+        window: Measurements per rolling mean
+        max_points: Downsample to this many points with LTTB
+        start_date: Earliest measurement date
+        end_date: Latest measurement date
+    """
+    query = select(
+        MedicalEntity.id,
+        MedicalEntity.entity_date,
+        MedicalEntity.lab_value.label("value"),
+        MedicalEntity.lab_unit.label("unit"),
+        MedicalEntity.entity_data["reference_range"].label("reference_range"),
+    ).where(
+        MedicalEntity.user_id == user_id,
+        MedicalEntity.lab_test_name.is_not(None),
+        TEST_NAME == test.strip().lower(),
+        MedicalEntity.entity_date.is_not(None),
+        MedicalEntity.lab_value.is_not(None),
+    )
+    if start_date:
+        query = query.where(MedicalEntity.entity_date >= start_date)
+    if end_date:
+        query = query.where(MedicalEntity.entity_date <= end_date)
+    result = await db.execute(query.order_by(MedicalEntity.entity_date, MedicalEntity.id))
+
+    rows = [(row, float(row.value)) for row in result]
+
+    # Values in different units are not comparable; chart the most common one
+    units = Counter((row.unit or "").strip() for row, _ in rows)
+    unit = units.most_common(1)[0][0] if units else ""
+    series = [(row, value) for row, value in rows if (row.unit or "").strip() == unit]
+    if not series:
+        return LabSeriesResponse(
+            test=test, unit=unit or None, count=0, other_unit_count=len(rows), rolling_window=window
+        )
+
+    ids = [row.id for row, _ in series]
+    dates = [row.entity_date for row, _ in series]
+    values = np.fromiter((value for _, value in series), dtype=float, count=len(series))
+    seconds = np.array(dates, dtype="datetime64[D]").astype("datetime64[s]").astype(float)
+    bounds = [parse_reference_range(row.reference_range) for row, _ in series]
+    low = np.array([np.nan if b[0] is None else b[0] for b in bounds], dtype=float)
+    high = np.array([np.nan if b[1] is None else b[1] for b in bounds], dtype=float)
+
+    means = rolling_mean(values, window)
+    # Comparisons with NaN are False, so missing bounds never flag
+    below = values < low
+    above = values > high
+
+    keep = np.arange(len(values))
+    if max_points is not None:
+        keep = lttb_indices(seconds, values, max_points)
+
+    points = [
+        LabSeriesPoint(
+            entity_id=ids[i],
+            measured_on=dates[i],
+            value=values[i],
+            rolling_mean=means[i],
+            reference_low=None if np.isnan(low[i]) else low[i],
+            reference_high=None if np.isnan(high[i]) else high[i],
+            flag="low" if below[i] else "high" if above[i] else None,
+        )
+        for i in keep.tolist()
+    ]
+    return LabSeriesResponse(
+        test=test,
+        unit=unit or None,
+        count=len(values),
+        other_unit_count=len(rows) - len(series),
+        rolling_window=window,
+        slope_per_year=trend_slope(seconds, values),
+        out_of_range_count=int(np.count_nonzero(below | above)),
+        downsampled=len(keep) < len(values),
+        points=points,
+    )
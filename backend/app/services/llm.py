@@ -0,0 +1,489 @@
+"""
+LLM gateway
+
+Every chat, summarization and embedding call goes through this module. It
+keeps one pooled HTTP client per provider, caps in-flight requests per
+provider, retries transient failures with jittered backoff, and can hedge a
+slow request by racing a second provider. A deterministic stub provider
+stands in for the real APIs in load tests.
+"""
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import logging
+import random
+import time
+
+import anthropic
+import httpx
+import openai
+
+from app.core.config import settings
+from app.core.metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """You are a helpful medical assistant for HealthFlow+, a personal health data platform. You help patients understand their medical timeline and health data.
+
+Guidelines:
+- Be empathetic and supportive
+- Provide clear, easy-to-understand explanations
+- Reference specific events from the patient's records when relevant
+- If asked about medical advice, remind them to consult their healthcare provider
+- Keep responses concise and focused
+- Use markdown formatting for better readability"""
+
+TIME_TO_FIRST_TOKEN = histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from sending an LLM request to receiving the first streamed token",
+)
+COMPLETION_DURATION = histogram(
+    "llm_completion_duration_seconds",
+    "Total duration of a streamed LLM completion",
+    buckets=(0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0),
+)
+RETRIES = counter("llm_retries_total", "LLM requests retried after a transient failure")
+HEDGES = counter("llm_hedged_requests_total", "LLM requests hedged to a second provider")
+
+# Rough characters-per-token ratio for English text, used when no tokenizer count is available
+CHARS_PER_TOKEN = 4
+
+# Must match the embeddings.embedding_vector column
+EMBEDDING_DIMENSIONS = 1536
+
+# (stream, first token or None if the stream was empty, accumulator of that attempt)
+OpenedStream = Tuple[AsyncIterator[str], Optional[str], "Completion"]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for budgeting prompts"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+@dataclass
+class Completion:
+    """Accumulated result of a streamed completion"""
+
+    provider: str
+    model_name: str
+    text: str = ""
+    output_tokens: Optional[int] = None
+    time_to_first_token: Optional[float] = None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Whether a provider error is worth retrying"""
+    if isinstance(exc, (anthropic.APIConnectionError, openai.APIConnectionError)):
+        return True
+    if isinstance(exc, (anthropic.APIStatusError, openai.APIStatusError)):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    ceiling = min(
+        settings.LLM_RETRY_MAX_DELAY_SECONDS,
+        settings.LLM_RETRY_BASE_DELAY_SECONDS * (2**attempt),
+    )
+    return random.uniform(0, ceiling)
+
+
+def _pooled_http_client() -> httpx.AsyncClient:
+    """HTTP client that keeps connections alive between requests"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(settings.LLM_REQUEST_TIMEOUT_SECONDS, connect=5.0),
+    )
+
+
+class Provider:
+    """Base class for LLM providers"""
+
+    name: str
+    model_name: str
+
+    def stream(
+        self,
+        system: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        completion: Completion,
+    ) -> AsyncIterator[str]:
+        """Stream text deltas, setting completion.output_tokens when done"""
+        raise NotImplementedError
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed a text"""
+        raise NotImplementedError(f"LLM provider {self.name} does not support embeddings")
+
+    async def aclose(self) -> None:
+        """Release pooled connections"""
+
+
+class AnthropicProvider(Provider):
+    """Anthropic Messages API"""
+
+    name = "anthropic"
+
+    def __init__(self):
+        self.model_name = settings.ANTHROPIC_MODEL
+        self._http_client = _pooled_http_client()
+        # Retries are done by the gateway so they can be counted and hedged
+        self.client = anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY, http_client=self._http_client, max_retries=0
+        )
+
+    async def stream(self, system, messages, max_tokens, completion):
+        async with self.client.messages.stream(
+            model=self.model_name,
+            max_tokens=max_tokens,
+            system=system,
+            messages=messages,
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+            final_message = await stream.get_final_message()
+            completion.output_tokens = final_message.usage.output_tokens
+
+    async def aclose(self) -> None:
+        await self._http_client.aclose()
+
+
+class OpenAIProvider(Provider):
+    """OpenAI Chat Completions API, or any OpenAI-compatible endpoint"""
+
+    def __init__(
+        self,
+        name: str,
+        api_key: str,
+        model_name: str,
+        base_url: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+    ):
+        self.name = name
+        self.model_name = model_name
+        self.embedding_model = embedding_model
+        self._http_client = _pooled_http_client()
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key, base_url=base_url, http_client=self._http_client, max_retries=0
+        )
+
+    async def stream(self, system, messages, max_tokens, completion):
+        stream = await self.client.chat.completions.create(
+            model=self.model_name,
+            max_tokens=max_tokens,
+            messages=[{"role": "system", "content": system}, *messages],
+            stream=True,
+            # Sent as a raw body field since the pinned SDK predates the stream_options argument
+            extra_body={"stream_options": {"include_usage": True}},
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            # The final chunk carries usage and no choices. Endpoints that ignore
+            # stream_options never send it, and the count stays unknown.
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                # A plain dict in the pinned SDK, whose chunk model has no usage field
+                if isinstance(usage, dict):
+                    completion.output_tokens = usage.get("completion_tokens")
+                else:
+                    completion.output_tokens = usage.completion_tokens
+
+    async def embed(self, text: str) -> List[float]:
+        if not self.embedding_model:
+            return await super().embed(text)
+        response = await self.client.embeddings.create(input=text, model=self.embedding_model)
+        return response.data[0].embedding
+
+    async def aclose(self) -> None:
+        await self._http_client.aclose()
+
+
+class StubProvider(Provider):
+    """
+    Deterministic offline provider for load tests
+
+    Replies and embeddings depend only on the input, and an optional delay per
+    token simulates generation latency.
+    """
+
+    name = "stub"
+    model_name = "stub"
+
+    async def stream(self, system, messages, max_tokens, completion):
+        question = messages[-1]["content"] if messages else ""
+        digest = hashlib.sha256(question.encode()).hexdigest()[:12]
+        words = f"Stub answer {digest}: {question}".split()[:max_tokens]
+        for index, word in enumerate(words):
+            if settings.LLM_STUB_TOKEN_DELAY_SECONDS:
+                await asyncio.sleep(settings.LLM_STUB_TOKEN_DELAY_SECONDS)
+            yield word if index == 0 else f" {word}"
+        completion.output_tokens = len(words)
+
+    async def embed(self, text: str) -> List[float]:
+        rng = random.Random(hashlib.sha256(text.encode()).digest())
+        vector = [rng.gauss(0.0, 1.0) for _ in range(EMBEDDING_DIMENSIONS)]
+        norm = sum(x * x for x in vector) ** 0.5
+        return [x / norm for x in vector]
+
+
+def _create_provider(name: str) -> Provider:
+    """Instantiate a provider by name"""
+    if name == "anthropic":
+        return AnthropicProvider()
+    if name == "openai":
+        return OpenAIProvider(
+            "openai",
+            api_key=settings.OPENAI_API_KEY,
+            model_name=settings.OPENAI_MODEL,
+            embedding_model=settings.OPENAI_EMBEDDING_MODEL,
+        )
+    if name == "dedalus":
+        if not settings.DEDALUS_API_KEY or not settings.DEDALUS_BASE_URL:
+            raise ValueError("LLM provider dedalus requires DEDALUS_API_KEY and DEDALUS_BASE_URL")
+        return OpenAIProvider(
+            "dedalus",
+            api_key=settings.DEDALUS_API_KEY,
+            model_name=settings.DEDALUS_MODEL,
+            base_url=settings.DEDALUS_BASE_URL,
+        )
+    if name == "stub":
+        return StubProvider()
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+def _close_abandoned(task: asyncio.Task) -> None:
+    """Close the stream of a hedged attempt that lost the race"""
+    if task.cancelled() or task.exception() is not None:
+        return
+    stream, _, _ = task.result()
+    asyncio.ensure_future(stream.aclose())
+
+
+class LLMGateway:
+    """Shared entry point to every LLM provider"""
+
+    def __init__(self):
+        self._providers: Dict[str, Provider] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def provider(self, name: str) -> Provider:
+        """Get the pooled provider for a name, creating it on first use"""
+        if name not in self._providers:
+            self._providers[name] = _create_provider(name)
+            self._semaphores[name] = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        return self._providers[name]
+
+    async def _guarded_stream(
+        self,
+        provider: Provider,
+        system: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        completion: Completion,
+    ) -> AsyncIterator[str]:
+        """Provider stream holding a concurrency slot until it is finished or closed"""
+        async with self._semaphores[provider.name]:
+            async for text in provider.stream(system, messages, max_tokens, completion):
+                yield text
+
+    async def _open(
+        self,
+        provider_name: str,
+        system: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+    ) -> OpenedStream:
+        """
+        Start a stream and wait for its first token, retrying transient failures
+
+        Retries only happen before the first token; once text has reached the
+        caller a failure is final.
+        """
+        provider = self.provider(provider_name)
+        attempt = 0
+        while True:
+            completion = Completion(provider=provider.name, model_name=provider.model_name)
+            stream = self._guarded_stream(provider, system, messages, max_tokens, completion)
+            try:
+                return stream, await stream.__anext__(), completion
+            except StopAsyncIteration:
+                return stream, None, completion
+            except asyncio.CancelledError:
+                await stream.aclose()
+                raise
+            except Exception as e:
+                await stream.aclose()
+                if attempt >= settings.LLM_MAX_RETRIES or not _is_retryable(e):
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning(
+                    f"LLM provider {provider.name} failed with {type(e).__name__}, "
+                    f"retrying in {delay:.2f}s"
+                )
+                RETRIES.inc(provider=provider.name)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _open_hedged(
+        self,
+        provider_name: str,
+        system: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+    ) -> OpenedStream:
+        """
+        Open a stream, racing a second provider when the first one is slow
+
+        If the primary has not produced its first token within
+        LLM_HEDGE_AFTER_SECONDS, the same request goes to LLM_HEDGE_PROVIDER.
+        Whichever answers first wins and the other attempt is cancelled.
+        """
+        hedge_name = settings.LLM_HEDGE_PROVIDER
+        if not hedge_name or hedge_name == provider_name:
+            return await self._open(provider_name, system, messages, max_tokens)
+
+        pending: Set[asyncio.Task] = {
+            asyncio.create_task(self._open(provider_name, system, messages, max_tokens))
+        }
+        try:
+            done, pending = await asyncio.wait(pending, timeout=settings.LLM_HEDGE_AFTER_SECONDS)
+            if not done:
+                HEDGES.inc(provider=provider_name, hedge=hedge_name)
+                pending.add(
+                    asyncio.create_task(self._open(hedge_name, system, messages, max_tokens))
+                )
+
+            winner: Optional[asyncio.Task] = None
+            error: Optional[BaseException] = None
+            while winner is None:
+                if not done:
+                    if not pending:
+                        raise error
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    else:
+                        _close_abandoned(task)
+                done = set()
+            return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_close_abandoned)
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        completion: Completion,
+        system: str = SYSTEM_PROMPT,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion token by token
+
+        Args:
+            messages: Conversation as [{"role": ..., "content": ...}]
+            completion: Accumulator filled in as the stream progresses; its
+                provider and model are updated if a hedged request answered
+            system: System prompt
+            max_tokens: Maximum tokens to generate
+
+        Yields:
+            Text deltas as they arrive from the provider
+        """
+        started = time.perf_counter()
+        stream, first, attempt = await self._open_hedged(
+            completion.provider, system, messages, max_tokens or settings.CHAT_MAX_TOKENS
+        )
+        completion.provider = attempt.provider
+        completion.model_name = attempt.model_name
+        parts: List[str] = []
+
+        try:
+            if first is not None:
+                completion.time_to_first_token = time.perf_counter() - started
+                TIME_TO_FIRST_TOKEN.observe(
+                    completion.time_to_first_token, provider=completion.provider
+                )
+                parts.append(first)
+                yield first
+            async for text in stream:
+                parts.append(text)
+                yield text
+        finally:
+            await stream.aclose()
+
+        completion.text = "".join(parts)
+        completion.output_tokens = attempt.output_tokens
+        COMPLETION_DURATION.observe(time.perf_counter() - started, provider=completion.provider)
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed a text with the embedding provider, retrying transient failures"""
+        provider = self.provider(settings.EMBEDDING_PROVIDER)
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphores[provider.name]:
+                    return await provider.embed(text)
+            except Exception as e:
+                if attempt >= settings.LLM_MAX_RETRIES or not _is_retryable(e):
+                    raise
+                RETRIES.inc(provider=provider.name)
+                await asyncio.sleep(_backoff_delay(attempt))
+                attempt += 1
+
+    async def aclose(self) -> None:
+        """Close every pooled client"""
+        for provider in self._providers.values():
+            await provider.aclose()
+        self._providers.clear()
+        self._semaphores.clear()
+
+
+gateway = LLMGateway()
+
+
+def new_completion(provider: Optional[str] = None) -> Completion:
+    """Create a completion accumulator for the configured chat provider"""
+    provider = gateway.provider(provider or settings.CHAT_PROVIDER)
+    return Completion(provider=provider.name, model_name=provider.model_name)
+
+
+def stream_chat(
+    messages: List[Dict[str, str]],
+    completion: Completion,
+    system: str = SYSTEM_PROMPT,
+    max_tokens: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """Stream a chat completion through the gateway"""
+    return gateway.stream(messages, completion, system=system, max_tokens=max_tokens)
+
+
+async def complete_chat(
+    messages: List[Dict[str, str]],
+    system: str = SYSTEM_PROMPT,
+    max_tokens: Optional[int] = None,
+    provider: Optional[str] = None,
+) -> Completion:
+    """Run a chat completion to the end and return the accumulated result"""
+    completion = new_completion(provider)
+    async for _ in stream_chat(messages, completion, system=system, max_tokens=max_tokens):
+        pass
+    return completion
+
+
+async def embed(text: str) -> List[float]:
+    """Embed a text through the gateway"""
+    return await gateway.embed(text)
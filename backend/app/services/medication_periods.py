@@ -0,0 +1,322 @@
+"""
+Medication periods
+
+Answers "what was I taking on this date" and "which medications overlapped"
+in two ways:
+
+- find_active_medications queries Postgres through the GiST daterange index
+  idx_entities_medication_period and returns full entity rows.
+- MedicationPeriodCache keeps an in-memory interval tree of each user's
+  medication periods for the timeline canvas, whose hover queries repeat
+  many times a second. When the user's data version moves, the tree is
+  patched with the medications written or deleted since its change
+  watermark (see app.services.change_tracking) instead of being rebuilt.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+import asyncio
+import random
+
+from sqlalchemy import Date, cast, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.medical_entity import MedicalEntity, EntityType
+from app.models.sync_tombstone import SyncTombstone
+from app.services.change_tracking import SNAPSHOT_XMIN
+from app.services.data_version import get_data_version
+
+# Spelled as a literal (not a bound parameter) so queries match the partial
+# index predicate of idx_entities_medication_period
+IS_MEDICATION = MedicalEntity.entity_type == literal_column(f"'{EntityType.MEDICATION.value}'")
+
+# Matches the expression indexed by idx_entities_medication_period
+MEDICATION_PERIOD = func.medication_period(MedicalEntity.entity_date, MedicalEntity.entity_end_date)
+
+
+def _date_range(start: date, end: date):
+    """Inclusive daterange literal for comparisons with MEDICATION_PERIOD"""
+    return func.daterange(cast(start, Date), cast(end, Date), "[]")
+
+
+async def find_active_medications(
+    db: AsyncSession, user_id: UUID, start: date, end: date
+) -> List[MedicalEntity]:
+    """
+    Medications taken at any time between start and end, inclusive
+
+    A single day (start == end) is a point-in-time query. Served by the GiST
+    index on (user_id, medication_period(...)).
+    """
+    if start == end:
+        condition = MEDICATION_PERIOD.op("@>")(cast(start, Date))
+    else:
+        condition = MEDICATION_PERIOD.op("&&")(_date_range(start, end))
+    result = await db.execute(
+        select(MedicalEntity)
+        .where(
+            MedicalEntity.user_id == user_id,
+            IS_MEDICATION,
+            MedicalEntity.entity_date.is_not(None),
+            condition,
+        )
+        .order_by(MedicalEntity.entity_date, MedicalEntity.id)
+    )
+    return list(result.scalars().all())
+
+
+@dataclass
+class MedicationPeriod:
+    """One medication's period, with what the canvas shows on hover"""
+
+    entity_id: UUID
+    start_date: date
+    end_date: Optional[date]  # None while ongoing
+    name: Optional[str] = None
+    dosage: Optional[str] = None
+    frequency: Optional[str] = None
+
+    @property
+    def last_day(self) -> date:
+        """Last day in the period; ongoing periods extend forever"""
+        if self.end_date is None:
+            return date.max
+        return max(self.end_date, self.start_date)
+
+
+class _Node:
+    """Treap node keyed on (start_date, entity_id), augmented with the subtree's last day"""
+
+    __slots__ = ("period", "key", "priority", "left", "right", "max_end")
+
+    def __init__(self, period: MedicationPeriod):
+        self.period = period
+        self.key = (period.start_date, period.entity_id.int)
+        self.priority = random.random()
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+        self.max_end = period.last_day
+
+    def update(self) -> "_Node":
+        """Recompute max_end from the children"""
+        self.max_end = self.period.last_day
+        for child in (self.left, self.right):
+            if child is not None and child.max_end > self.max_end:
+                self.max_end = child.max_end
+        return self
+
+
+def _split(node: Optional[_Node], key: Tuple) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """Split into nodes with keys < key and nodes with keys >= key"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        return node.update(), right
+    left, node.left = _split(node.left, key)
+    return left, node.update()
+
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    """Join two treaps where every key in left is below every key in right"""
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return left.update()
+    right.left = _merge(left, right.left)
+    return right.update()
+
+
+class IntervalTree:
+    """
+    Interval tree over medication periods
+
+    A treap ordered by start date where each node also knows the latest end
+    in its subtree, so inserts and deletes are O(log n) and overlap queries
+    skip every subtree that ends before the query starts or begins after it
+    ends: O(log n + matches).
+    """
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._periods: Dict[UUID, MedicationPeriod] = {}
+
+    def __len__(self) -> int:
+        return len(self._periods)
+
+    def upsert(self, period: MedicationPeriod) -> None:
+        """Insert a period, replacing any earlier version of the same medication"""
+        self.remove(period.entity_id)
+        node = _Node(period)
+        left, right = _split(self._root, node.key)
+        self._root = _merge(_merge(left, node), right)
+        self._periods[period.entity_id] = period
+
+    def remove(self, entity_id: UUID) -> None:
+        """Remove a medication's period, if present"""
+        period = self._periods.pop(entity_id, None)
+        if period is None:
+            return
+        key = (period.start_date, entity_id.int)
+        left, rest = _split(self._root, key)
+        _, right = _split(rest, (key[0], key[1] + 1))
+        self._root = _merge(left, right)
+
+    def overlapping(self, start: date, end: date) -> List[MedicationPeriod]:
+        """Periods overlapping [start, end], ordered by start date"""
+        return list(self._search(self._root, start, end))
+
+    def _search(self, node: Optional[_Node], start: date, end: date) -> Iterator[MedicationPeriod]:
+        if node is None or node.max_end < start:
+            return
+        yield from self._search(node.left, start, end)
+        if node.period.start_date > end:
+            # Everything to the right starts later still
+            return
+        if node.period.last_day >= start:
+            yield node.period
+        yield from self._search(node.right, start, end)
+
+
+def _period_from_row(row: Any) -> MedicationPeriod:
+    data = row.entity_data or {}
+    return MedicationPeriod(
+        entity_id=row.id,
+        start_date=row.entity_date,
+        end_date=row.entity_end_date,
+        name=data.get("name"),
+        dosage=data.get("dosage"),
+        frequency=data.get("frequency"),
+    )
+
+
+@dataclass
+class _Entry:
+    """One user's tree and the point it is current to"""
+
+    tree: IntervalTree
+    data_version: int
+    watermark: int  # Change watermark taken before the last read
+    refreshed_at: datetime  # Database time of the last read, for tombstone retention
+    lock: asyncio.Lock
+
+
+class MedicationPeriodCache:
+    """Per-user LRU of medication interval trees, patched as medications change"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._entries: "OrderedDict[UUID, _Entry]" = OrderedDict()
+        self._lock = Lock()
+
+    async def get(self, db: AsyncSession, user_id: UUID) -> IntervalTree:
+        """The user's tree at their current data version"""
+        data_version = await get_data_version(db, user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        if entry is None:
+            entry = await self._build(db, user_id, data_version)
+        elif entry.data_version != data_version:
+            async with entry.lock:
+                if entry.data_version != data_version:
+                    await self._refresh(db, user_id, entry, data_version)
+        return entry.tree
+
+    async def _build(self, db: AsyncSession, user_id: UUID, data_version: int) -> _Entry:
+        """Load every dated medication of the user into a new tree"""
+        refreshed_at, watermark = (await db.execute(select(func.now(), SNAPSHOT_XMIN))).one()
+        result = await db.execute(
+            select(
+                MedicalEntity.id,
+                MedicalEntity.entity_date,
+                MedicalEntity.entity_end_date,
+                MedicalEntity.entity_data,
+            ).where(
+                MedicalEntity.user_id == user_id,
+                IS_MEDICATION,
+                MedicalEntity.entity_date.is_not(None),
+            )
+        )
+        tree = IntervalTree()
+        for row in result:
+            tree.upsert(_period_from_row(row))
+
+        entry = _Entry(tree, data_version, watermark, refreshed_at, asyncio.Lock())
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return entry
+
+    async def _refresh(
+        self, db: AsyncSession, user_id: UUID, entry: _Entry, data_version: int
+    ) -> None:
+        """
+        Apply medication changes since the entry's change watermark
+
+        Reads entities written since then (any type, since an entity can stop
+        being a medication) and the sync tombstones of deleted entities by
+        change_xid, so writes from transactions that commit late are never
+        missed. Falls back to a full rebuild once the tombstones may have
+        been pruned.
+        """
+        refreshed_at, watermark = (await db.execute(select(func.now(), SNAPSHOT_XMIN))).one()
+        retention = timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        if entry.refreshed_at < refreshed_at - retention:
+            fresh = await self._build(db, user_id, data_version)
+            entry.tree, entry.watermark = fresh.tree, fresh.watermark
+            entry.refreshed_at, entry.data_version = fresh.refreshed_at, data_version
+            return
+
+        changed = await db.execute(
+            select(
+                MedicalEntity.id,
+                MedicalEntity.entity_type,
+                MedicalEntity.entity_date,
+                MedicalEntity.entity_end_date,
+                MedicalEntity.entity_data,
+            ).where(
+                MedicalEntity.user_id == user_id, MedicalEntity.change_xid >= entry.watermark
+            )
+        )
+        changed_rows = changed.all()
+        deleted = await db.execute(
+            select(SyncTombstone.row_id).where(
+                SyncTombstone.user_id == user_id,
+                SyncTombstone.table_name == MedicalEntity.__tablename__,
+                SyncTombstone.change_xid >= entry.watermark,
+            )
+        )
+        deleted_ids = deleted.scalars().all()
+
+        # No awaits from here on, so readers never see a half-patched tree
+        for row in changed_rows:
+            if row.entity_type == EntityType.MEDICATION and row.entity_date is not None:
+                entry.tree.upsert(_period_from_row(row))
+            else:
+                entry.tree.remove(row.id)
+        for entity_id in deleted_ids:
+            entry.tree.remove(entity_id)
+        entry.watermark, entry.refreshed_at = watermark, refreshed_at
+        entry.data_version = data_version
+
+    def clear(self, user_id: Optional[UUID] = None) -> None:
+        """Drop cached trees for one user, or for everyone"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+medication_period_cache = MedicationPeriodCache(
+    max_users=settings.MEDICATION_PERIOD_CACHE_MAX_USERS
+)
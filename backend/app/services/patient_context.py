@@ -0,0 +1,269 @@
+"""
+Compact patient context
+
+Renders a patient's medications, allergies, diagnoses and timeline into a
+short, deduplicated text block that fits a token budget. Building it reads
+the whole timeline, so the result is cached per user and reused by every
+chat turn until the user's data version or the date changes; which
+medications are active depends on both.
+"""
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+import copy
+
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.medical_entity import MedicalEntity, EntityType
+from app.models.timeline import TimelineEvent
+from app.services.data_version import get_data_version
+from app.services.llm import estimate_tokens
+
+# Event descriptions are cut to this length; details live in the source documents
+DESCRIPTION_MAX_CHARS = 160
+
+
+@dataclass
+class PatientContext:
+    """Prebuilt patient context for one data version and day"""
+
+    text: str
+    token_count: int
+    data_version: int
+    as_of: date  # Day the active medications were chosen for
+    event_count: int = 0
+    omitted_event_count: int = 0
+    # Entities and event documents the text was built from, for chat references
+    sources: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def _describe_entity(entity_type: EntityType, data: Dict[str, Any]) -> str:
+    """One-line description of a medication, allergy or diagnosis"""
+    if entity_type == EntityType.ALLERGY:
+        parts = [data.get("allergen"), data.get("reaction"), data.get("severity")]
+    elif entity_type == EntityType.DIAGNOSIS:
+        name = data.get("condition_name") or data.get("condition") or data.get("name")
+        parts = [name, data.get("severity")]
+    else:
+        parts = [data.get("name"), data.get("dosage"), data.get("frequency")]
+    return ", ".join(str(part) for part in parts if part) or entity_type.value
+
+
+def _date_range(first: date, last: date) -> str:
+    """Render a date or a date span"""
+    if first == last:
+        return first.isoformat()
+    return f"{first.isoformat()} to {last.isoformat()}"
+
+
+class PatientContextBuilder:
+    """Builds the compact context for one user"""
+
+    def __init__(self, user_id: UUID, token_budget: Optional[int] = None):
+        self.user_id = user_id
+        self.token_budget = token_budget or settings.PATIENT_CONTEXT_TOKEN_BUDGET
+
+    async def build(
+        self, db: AsyncSession, data_version: int, as_of: Optional[date] = None
+    ) -> PatientContext:
+        """Read the user's entities and timeline and render them into the budget"""
+        as_of = as_of or date.today()
+        sources: List[Dict[str, Any]] = []
+        sections: List[str] = []
+
+        entity_lines = await self._entity_lines(db, as_of, sources)
+        if entity_lines:
+            sections.append(
+                "Active medications, allergies and diagnoses:\n" + "\n".join(entity_lines)
+            )
+
+        used = sum(estimate_tokens(section) for section in sections)
+        event_lines, event_count, omitted = await self._event_lines(
+            db, self.token_budget - used, sources
+        )
+        if event_lines:
+            sections.append("Timeline (newest first):\n" + "\n".join(event_lines))
+
+        text = "\n\n".join(sections)
+        return PatientContext(
+            text=text,
+            token_count=estimate_tokens(text) if text else 0,
+            data_version=data_version,
+            as_of=as_of,
+            event_count=event_count,
+            omitted_event_count=omitted,
+            sources=sources,
+        )
+
+    async def _entity_lines(
+        self, db: AsyncSession, as_of: date, sources: List[Dict[str, Any]]
+    ) -> List[str]:
+        """Medications current on as_of plus all allergies and diagnoses, one line per item"""
+        result = await db.execute(
+            select(
+                MedicalEntity.id,
+                MedicalEntity.entity_type,
+                MedicalEntity.entity_data,
+                MedicalEntity.entity_date,
+            )
+            .where(
+                MedicalEntity.user_id == self.user_id,
+                or_(
+                    MedicalEntity.entity_type.in_([EntityType.ALLERGY, EntityType.DIAGNOSIS]),
+                    (MedicalEntity.entity_type == EntityType.MEDICATION)
+                    & (
+                        MedicalEntity.entity_end_date.is_(None)
+                        | (MedicalEntity.entity_end_date >= as_of)
+                    ),
+                ),
+            )
+            .order_by(MedicalEntity.entity_type, MedicalEntity.entity_date.desc().nulls_last())
+        )
+
+        lines = []
+        seen = set()
+        for row in result:
+            description = _describe_entity(row.entity_type, row.entity_data or {})
+            key = (row.entity_type, description.casefold())
+            if key in seen:
+                continue
+            seen.add(key)
+            since = f" (since {row.entity_date.isoformat()})" if row.entity_date else ""
+            lines.append(f"- {row.entity_type.value.upper()}: {description}{since}")
+            sources.append(
+                {
+                    "type": "medical_entity",
+                    "medical_entity_id": row.id,
+                    "title": description,
+                    "relevance_score": None,
+                }
+            )
+        return lines
+
+    async def _event_lines(
+        self, db: AsyncSession, budget: int, sources: List[Dict[str, Any]]
+    ) -> Tuple[List[str], int, int]:
+        """
+        Timeline lines, newest first, within a token budget
+
+        Repeats of the same event (same type and title) collapse into one line
+        with a count and date span. Events that do not fit are summarized as
+        counts per event type.
+        """
+        result = await db.execute(
+            select(
+                TimelineEvent.event_type,
+                TimelineEvent.title,
+                TimelineEvent.description,
+                TimelineEvent.event_date,
+                TimelineEvent.document_id,
+            )
+            .where(TimelineEvent.user_id == self.user_id)
+            .order_by(TimelineEvent.event_date.desc(), TimelineEvent.id.desc())
+            .limit(settings.PATIENT_CONTEXT_MAX_EVENTS)
+        )
+
+        # Group repeats, keeping the order of their most recent occurrence
+        groups: "OrderedDict[Tuple[Any, str], Dict[str, Any]]" = OrderedDict()
+        for row in result:
+            key = (row.event_type, row.title.strip().casefold())
+            group = groups.get(key)
+            if group is None:
+                groups[key] = {"row": row, "count": 1, "first": row.event_date, "documents": []}
+                group = groups[key]
+            else:
+                group["count"] += 1
+                group["first"] = row.event_date
+            if row.document_id is not None and row.document_id not in group["documents"]:
+                group["documents"].append(row.document_id)
+
+        lines: List[str] = []
+        used = 0
+        omitted: Counter = Counter()
+        seen_documents = set()
+        for group in groups.values():
+            row = group["row"]
+            dates = _date_range(group["first"], row.event_date)
+            line = f"- {dates} {row.event_type.value}: {row.title}"
+            if group["count"] > 1:
+                line += f" (x{group['count']})"
+            if row.description:
+                description = " ".join(row.description.split())
+                if len(description) > DESCRIPTION_MAX_CHARS:
+                    description = description[: DESCRIPTION_MAX_CHARS - 3].rstrip() + "..."
+                line += f" - {description}"
+            tokens = estimate_tokens(line)
+            if omitted or used + tokens > budget:
+                omitted[row.event_type.value] += group["count"]
+                continue
+            used += tokens
+            lines.append(line)
+            for document_id in group["documents"]:
+                if document_id in seen_documents:
+                    continue
+                seen_documents.add(document_id)
+                sources.append(
+                    {
+                        "type": "document",
+                        "document_id": document_id,
+                        "title": row.title,
+                        "relevance_score": None,
+                    }
+                )
+
+        if omitted:
+            counts = ", ".join(
+                f"{count} {event_type}" for event_type, count in omitted.most_common()
+            )
+            lines.append(f"- Earlier: {counts}")
+
+        event_count = sum(group["count"] for group in groups.values())
+        return lines, event_count, sum(omitted.values())
+
+
+class PatientContextCache:
+    """Per-user LRU of built contexts, valid while the data version and date are unchanged"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._entries: "OrderedDict[UUID, PatientContext]" = OrderedDict()
+        self._lock = Lock()
+
+    async def get(self, db: AsyncSession, user_id: UUID) -> PatientContext:
+        """Get the context for the user's current data version, building it on a miss"""
+        # Read the version before building so a concurrent write forces a rebuild
+        data_version = await get_data_version(db, user_id)
+        today = date.today()
+        with self._lock:
+            context = self._entries.get(user_id)
+            if (
+                context is not None
+                and context.data_version == data_version
+                and context.as_of == today
+            ):
+                self._entries.move_to_end(user_id)
+                return copy.deepcopy(context)
+
+        context = await PatientContextBuilder(user_id).build(db, data_version, today)
+        with self._lock:
+            self._entries[user_id] = context
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return copy.deepcopy(context)
+
+    def clear(self, user_id: Optional[UUID] = None) -> None:
+        """Drop cached contexts for one user, or for everyone"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+patient_context_cache = PatientContextCache(max_users=settings.PATIENT_CONTEXT_CACHE_MAX_USERS)
@@ -0,0 +1,26 @@
+"""Trigger-maintained row counts for list totals"""
+from enum import Enum
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.row_count import UserRowCount
+
+
+async def get_row_count(
+    db: AsyncSession, user_id: UUID, table_name: str, row_type: Optional[Enum] = None
+) -> int:
+    """
+    Count a user's rows in a table, optionally of a single type
+
+    Reads the counters kept by triggers on inserts, deletes and type changes,
+    so the cost does not grow with the number of rows.
+    """
+    query = select(func.coalesce(func.sum(UserRowCount.row_count), 0)).where(
+        UserRowCount.user_id == user_id, UserRowCount.table_name == table_name
+    )
+    if row_type is not None:
+        query = query.where(UserRowCount.row_type == row_type.value)
+    return int(await db.scalar(query))
@@ -0,0 +1,121 @@
+"""
+Timeline aggregation
+
+Counts a user's timeline events per date bucket and event type, for
+zoomed-out timeline views that need density rather than rows. Results are
+cached per (user, granularity, range) and stay valid until the user's data
+version changes.
+"""
+from collections import OrderedDict
+from datetime import date
+from threading import Lock
+from typing import Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Date, TIMESTAMP, cast, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.timeline import TimelineEvent
+from app.schemas.timeline import TimelineAggregateResponse, TimelineBucket, TimelineGranularity
+from app.services.data_version import get_data_version
+
+AggregateKey = Tuple[UUID, TimelineGranularity, Optional[date], Optional[date]]
+
+
+async def aggregate_timeline(
+    db: AsyncSession,
+    user_id: UUID,
+    granularity: TimelineGranularity,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> TimelineAggregateResponse:
+    """
+    Count events per bucket and event type with a single GROUP BY
+
+    The user and date range predicates are served by idx_timeline_user_date.
+    """
+    # event_date is a DATE; truncate it as a timestamp without time zone so
+    # the bucket does not depend on the session time zone. The unit is a
+    # literal (from the enum) so the SELECT and GROUP BY expressions match.
+    unit = literal_column(f"'{granularity.value}'")
+    bucket = cast(
+        func.date_trunc(unit, cast(TimelineEvent.event_date, TIMESTAMP)), Date
+    ).label("bucket")
+    query = (
+        select(bucket, TimelineEvent.event_type, func.count().label("count"))
+        .where(TimelineEvent.user_id == user_id)
+        .group_by(bucket, TimelineEvent.event_type)
+        .order_by(bucket)
+    )
+    if start_date:
+        query = query.where(TimelineEvent.event_date >= start_date)
+    if end_date:
+        query = query.where(TimelineEvent.event_date <= end_date)
+
+    buckets: "OrderedDict[date, TimelineBucket]" = OrderedDict()
+    for row in await db.execute(query):
+        entry = buckets.get(row.bucket)
+        if entry is None:
+            entry = buckets[row.bucket] = TimelineBucket(start=row.bucket, total=0, counts={})
+        entry.counts[row.event_type.value] = row.count
+        entry.total += row.count
+
+    return TimelineAggregateResponse(
+        granularity=granularity,
+        start_date=start_date,
+        end_date=end_date,
+        total=sum(entry.total for entry in buckets.values()),
+        buckets=list(buckets.values()),
+    )
+
+
+class TimelineAggregateCache:
+    """LRU of aggregates, valid while the user's data version is unchanged"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[AggregateKey, Tuple[int, TimelineAggregateResponse]]" = (
+            OrderedDict()
+        )
+        self._lock = Lock()
+
+    async def get(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        granularity: TimelineGranularity,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> TimelineAggregateResponse:
+        """Get the aggregate for the user's current data version, computing it on a miss"""
+        key = (user_id, granularity, start_date, end_date)
+        # Read the version before computing so a concurrent write forces a recompute
+        data_version = await get_data_version(db, user_id)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == data_version:
+                self._entries.move_to_end(key)
+                return cached[1].model_copy(deep=True)
+
+        aggregate = await aggregate_timeline(db, user_id, granularity, start_date, end_date)
+        with self._lock:
+            self._entries[key] = (data_version, aggregate)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return aggregate.model_copy(deep=True)
+
+    def clear(self, user_id: Optional[UUID] = None) -> None:
+        """Drop cached aggregates for one user, or for everyone"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+
+timeline_aggregate_cache = TimelineAggregateCache(
+    max_entries=settings.TIMELINE_AGGREGATE_CACHE_MAX_ENTRIES
+)
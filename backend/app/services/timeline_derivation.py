@@ -0,0 +1,215 @@
+"""
+Timeline derivation
+
+Turns medical entities into timeline events: a medication becomes
+medication_started (and medication_ended once it has an end date), a lab
+result lab_completed, a diagnosis diagnosis_received, and so on. Allergies
+and doctors have no date of their own and get no events.
+
+A whole scope of entities, e.g. everything extracted from one document, is
+derived with a single statement: an INSERT ... SELECT over a UNION ALL of
+one SELECT per rule, chained through a CTE into the INSERT of the entity
+links. Derived events carry source_entity_id, and the unique index
+idx_timeline_source_entity turns re-runs into ON CONFLICT DO UPDATE, so
+an event whose entity was edited gets the new title and date. Only events
+still marked as derived are rewritten, and only when something changed.
+Entities linked to another event of the same type, such as FHIR imports
+or events posted by clients, are skipped.
+
+Entity writes (single and bulk creates, updates, FHIR imports) call
+derive_timeline_events in their own transaction, scoped to the entities
+they wrote.
+"""
+from dataclasses import dataclass
+from typing import Any, List, Optional
+from uuid import UUID
+
+from sqlalchemy import Text, exists, func, literal, literal_column, select, tuple_, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models.medical_entity import MedicalEntity, EntityType
+from app.models.timeline import EventType, TimelineEvent, TimelineEventEntity
+
+DERIVED_METADATA = literal_column("""'{"source": "derived"}'::jsonb""")
+
+
+def _data(key: str):
+    """entity_data->>'key'"""
+    return MedicalEntity.entity_data.op("->>", return_type=Text)(literal_column(f"'{key}'"))
+
+
+def _name(*keys: str, default: str):
+    """First present entity_data key, or a fallback title"""
+    return func.coalesce(*(_data(key) for key in keys), literal(default))
+
+
+@dataclass(frozen=True)
+class Derivation:
+    """One entity type to event type rule"""
+
+    entity_type: EntityType
+    event_type: EventType
+    title: Any  # SQL expression over MedicalEntity
+    event_date: Any = None  # SQL expression; the entity's own date when None
+
+
+DERIVATIONS: List[Derivation] = [
+    Derivation(
+        EntityType.MEDICATION,
+        EventType.MEDICATION_STARTED,
+        func.concat(
+            literal("Started "), func.coalesce(MedicalEntity.medication_name, literal("medication"))
+        ),
+    ),
+    Derivation(
+        EntityType.MEDICATION,
+        EventType.MEDICATION_ENDED,
+        func.concat(
+            literal("Stopped "), func.coalesce(MedicalEntity.medication_name, literal("medication"))
+        ),
+        MedicalEntity.entity_end_date,
+    ),
+    Derivation(
+        EntityType.LAB_RESULT,
+        EventType.LAB_COMPLETED,
+        # concat() skips NULLs: "HbA1c: 5.6 %", "HbA1c: positive" or "HbA1c"
+        func.concat(
+            func.coalesce(MedicalEntity.lab_test_name, literal("Lab result")),
+            literal(": ").concat(_data("value")),
+            literal(" ").concat(MedicalEntity.lab_unit),
+        ),
+    ),
+    Derivation(
+        EntityType.DIAGNOSIS,
+        EventType.DIAGNOSIS_RECEIVED,
+        func.concat(
+            literal("Diagnosed with "),
+            _name("condition_name", "condition", "name", default="a condition"),
+        ),
+    ),
+    Derivation(
+        EntityType.PROCEDURE,
+        EventType.PROCEDURE_COMPLETED,
+        _name("procedure_name", "name", default="Procedure"),
+    ),
+    Derivation(
+        EntityType.IMMUNIZATION,
+        EventType.IMMUNIZATION_RECEIVED,
+        _name("vaccine_name", default="Immunization"),
+    ),
+    Derivation(
+        EntityType.VITAL_SIGN,
+        EventType.VITAL_RECORDED,
+        _name("type", "name", default="Vital sign"),
+    ),
+    Derivation(
+        EntityType.SYMPTOM,
+        EventType.SYMPTOM_LOGGED,
+        _name("symptom_name", "name", default="Symptom"),
+    ),
+    Derivation(
+        EntityType.APPOINTMENT,
+        EventType.APPOINTMENT_SCHEDULED,
+        func.concat(literal("Appointment"), literal(" with ").concat(_data("provider"))),
+    ),
+]
+
+
+def _derivation_select(rule: Derivation, scope: List[Any]):
+    """Event rows for one rule over the entities in scope"""
+    link = aliased(TimelineEventEntity)
+    event = aliased(TimelineEvent)
+    # Spelled as literals to match the database enum labels
+    event_type = literal_column(f"'{rule.event_type.value}'::event_type")
+    event_date = MedicalEntity.entity_date if rule.event_date is None else rule.event_date
+    already_linked = exists().where(
+        link.medical_entity_id == MedicalEntity.id,
+        event.id == link.timeline_event_id,
+        event.event_type == event_type,
+        # The entity's own derived event is refreshed through ON CONFLICT instead
+        event.source_entity_id.is_distinct_from(MedicalEntity.id),
+    )
+    return select(
+        func.gen_random_uuid(),
+        MedicalEntity.user_id,
+        MedicalEntity.document_id,
+        event_type,
+        rule.title,
+        event_date,
+        MedicalEntity.id,
+        DERIVED_METADATA,
+    ).where(
+        *scope,
+        MedicalEntity.entity_type == literal_column(f"'{rule.entity_type.value}'"),
+        event_date.is_not(None),
+        ~already_linked,
+    )
+
+
+async def derive_timeline_events(
+    db: AsyncSession,
+    user_id: UUID,
+    document_id: Optional[UUID] = None,
+    entity_ids: Optional[List[UUID]] = None,
+) -> int:
+    """
+    Create or refresh the timeline events and links derived from a user's entities
+
+    Args:
+        db: Database session
+        user_id: Owner of the entities
+        document_id: Only entities extracted from this document
+        entity_ids: Only these entities
+
+    Returns:
+        Number of events created, not counting refreshed ones; 0 when
+        everything was already derived. Does not commit.
+    """
+    scope = [MedicalEntity.user_id == user_id]
+    if document_id is not None:
+        scope.append(MedicalEntity.document_id == document_id)
+    if entity_ids is not None:
+        scope.append(MedicalEntity.id.in_(entity_ids))
+
+    rows = union_all(*(_derivation_select(rule, scope) for rule in DERIVATIONS))
+    insert = pg_insert(TimelineEvent)
+    refreshed = (insert.excluded.document_id, insert.excluded.title, insert.excluded.event_date)
+    derived = (
+        insert.from_select(
+            [
+                "id",
+                "user_id",
+                "document_id",
+                "event_type",
+                "title",
+                "event_date",
+                "source_entity_id",
+                "doc_metadata",
+            ],
+            rows,
+            include_defaults=False,  # Server defaults fill tags and is_starred
+        )
+        .on_conflict_do_update(
+            index_elements=[TimelineEvent.source_entity_id, TimelineEvent.event_type],
+            index_where=TimelineEvent.source_entity_id.is_not(None),
+            set_=dict(zip(("document_id", "title", "event_date"), refreshed)),
+            # Leave events a client has taken over alone, and skip no-op writes
+            where=(TimelineEvent.doc_metadata["source"].astext == "derived")
+            & tuple_(TimelineEvent.document_id, TimelineEvent.title, TimelineEvent.event_date)
+            .is_distinct_from(tuple_(*refreshed)),
+        )
+        .returning(TimelineEvent.id, TimelineEvent.source_entity_id)
+        .cte("derived")
+    )
+    result = await db.execute(
+        pg_insert(TimelineEventEntity)
+        .from_select(
+            ["timeline_event_id", "medical_entity_id"],
+            select(derived.c.id, derived.c.source_entity_id),
+        )
+        .on_conflict_do_nothing()
+        .returning(TimelineEventEntity.timeline_event_id)
+    )
+    return len(result.all())
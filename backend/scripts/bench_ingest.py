@@ -0,0 +1,73 @@
+"""
+Benchmark of bulk medical entity ingest
+
+Loads synthetic lab results for an existing user through
+ingest_medical_entities (validation, then one COPY per batch) and reports
+entities per second against the 10k/s target. Each batch runs in its own
+transaction, which is rolled back unless --keep is given. Needs the
+database from DATABASE_URL.
+
+Usage, from backend/:
+    python -m scripts.bench_ingest --user-id <uuid> [--entities 50000] [--batch 5000]
+"""
+from datetime import date, timedelta
+from uuid import UUID
+import argparse
+import asyncio
+import time
+
+from app.core.database import AsyncSessionLocal, engine
+from app.services.entity_ingest import ingest_medical_entities
+
+TARGET_PER_SECOND = 10_000
+
+
+def _items(count: int, offset: int):
+    return [
+        {
+            "entity_type": "lab_result",
+            "entity_data": {"test_name": "Hemoglobin", "value": 13.5 + i % 10 / 10, "unit": "g/dL"},
+            "entity_date": (date(2020, 1, 1) + timedelta(days=(offset + i) % 2000)).isoformat(),
+            "extraction_confidence": 0.95,
+        }
+        for i in range(count)
+    ]
+
+
+async def _run(user_id: UUID, entities: int, batch: int, keep: bool) -> None:
+    loaded = 0
+    elapsed = 0.0
+    while loaded < entities:
+        items = _items(min(batch, entities - loaded), loaded)
+        async with AsyncSessionLocal() as db:
+            start = time.perf_counter()
+            result = await ingest_medical_entities(db, user_id, items, atomic=True)
+            if result.errors:
+                raise SystemExit(f"ingest rejected items: {result.errors[:3]}")
+            await db.flush()
+            elapsed += time.perf_counter() - start
+            if keep:
+                await db.commit()
+            else:
+                await db.rollback()
+        loaded += result.created
+    await engine.dispose()
+
+    rate = loaded / elapsed
+    verdict = "meets" if rate >= TARGET_PER_SECOND else "misses"
+    print(f"{loaded} entities in batches of {batch}: {elapsed:.2f}s, {rate:,.0f}/s")
+    print(f"{verdict} the {TARGET_PER_SECOND:,}/s target")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--user-id", type=UUID, required=True)
+    parser.add_argument("--entities", type=int, default=50_000)
+    parser.add_argument("--batch", type=int, default=5_000)
+    parser.add_argument("--keep", action="store_true", help="commit the entities")
+    args = parser.parse_args()
+    asyncio.run(_run(args.user_id, args.entities, args.batch, args.keep))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Micro-benchmark of list endpoint serialization
+
+Compares the old response path (model_validate per row, FastAPI's
+response_model re-validation, json.dumps) with the fast path (one cached
+TypeAdapter pass, orjson) on synthetic ORM rows. No database is needed.
+
+Usage, from backend/:
+    python -m scripts.bench_serialization [--rows 100] [--repeat 200]
+"""
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Union
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+try:
+    from fastapi.utils import create_model_field
+except ImportError:  # FastAPI < 0.110
+    from fastapi.utils import create_response_field as create_model_field
+
+from app.core.responses import ORJSONResponse
+from app.models.document import Document, DocumentType, ProcessingStatus
+from app.models.medical_entity import MedicalEntity, EntityType
+from app.models.timeline import TimelineEvent, EventType
+from app.schemas.common import CursorPage, PaginatedResponse
+from app.schemas.document import DocumentItem, DOCUMENT_FIELDS
+from app.schemas.medical_entity import MedicalEntityItem, ENTITY_FIELDS
+from app.schemas.timeline import TimelineEventItem, TIMELINE_FIELDS
+
+
+def _documents(count: int):
+    now = datetime.now(timezone.utc)
+    return [
+        Document(
+            id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            file_name=f"lab-report-{i}.pdf",
+            storage_path=f"user/lab-report-{i}.pdf",
+            mime_type="application/pdf",
+            file_size=120_000 + i,
+            document_type=DocumentType.LAB_REPORT,
+            processing_status=ProcessingStatus.COMPLETED,
+            extracted_text="Hemoglobin 13.5 g/dL " * 200,
+            doc_metadata={"pages": 3, "source": "upload"},
+            tags=["labs", "annual"],
+            document_date=date(2024, 1, 1) + timedelta(days=i),
+            uploaded_at=now - timedelta(minutes=i),
+            created_at=now - timedelta(minutes=i),
+            updated_at=now - timedelta(minutes=i),
+        )
+        for i in range(count)
+    ]
+
+
+def _entities(count: int):
+    now = datetime.now(timezone.utc)
+    return [
+        MedicalEntity(
+            id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            entity_type=EntityType.LAB_RESULT,
+            entity_data={"test_name": "Hemoglobin", "value": 13.5, "unit": "g/dL"},
+            entity_date=date(2024, 1, 1) + timedelta(days=i),
+            extracted_at=now,
+            extraction_confidence=Decimal("0.95"),
+            is_verified=False,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def _events(count: int):
+    now = datetime.now(timezone.utc)
+    return [
+        TimelineEvent(
+            id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            event_type=EventType.LAB_COMPLETED,
+            title=f"Blood panel {i}",
+            description="Routine blood panel, all values within range",
+            event_date=date(2024, 1, 1) + timedelta(days=i),
+            doc_metadata={"source": "upload"},
+            tags=["labs"],
+            is_starred=False,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def _old_path(field, selection, item_type, rows, selected) -> bytes:
+    """model_validate per row, then FastAPI validates and encodes the response_model"""
+    schema = selection.response_schema(selected)
+    page = CursorPage[item_type](
+        items=[schema.model_validate(row) for row in rows], page_size=len(rows), total=len(rows)
+    )
+    content = asyncio.run(serialize_response(field=field, response_content=page))
+    return JSONResponse(content).body
+
+
+def _new_path(selection, rows, selected) -> bytes:
+    page = CursorPage.model_construct(
+        items=selection.serialize(rows, selected), page_size=len(rows), total=len(rows)
+    )
+    return ORJSONResponse(page).body
+
+
+def _time(fn, repeat: int) -> float:
+    """Best-of-three mean milliseconds per call"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    cases = [
+        ("documents", DOCUMENT_FIELDS, DocumentItem, _documents, None),
+        ("documents?fields=*", DOCUMENT_FIELDS, DocumentItem, _documents, ()),
+        ("medical-entities", ENTITY_FIELDS, MedicalEntityItem, _entities, None),
+        ("medical-entities?fields=*", ENTITY_FIELDS, MedicalEntityItem, _entities, ()),
+        ("timeline", TIMELINE_FIELDS, TimelineEventItem, _events, None),
+        ("timeline?fields=*", TIMELINE_FIELDS, TimelineEventItem, _events, ()),
+    ]
+
+    print(f"{args.rows} rows per page, {args.repeat} pages per run")
+    print(f"{'endpoint':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, selection, item_type, make_rows, selected in cases:
+        rows = make_rows(args.rows)
+        if selected == ():
+            selected = tuple(selection.schema.model_fields)
+        field = create_model_field(
+            name="Response_" + name,
+            type_=Union[CursorPage[item_type], PaginatedResponse],
+            mode="serialization",
+        )
+
+        schema = selection.response_schema(selected)
+        expected = [schema.model_validate(row).model_dump(mode="json") for row in rows]
+        if json.loads(_new_path(selection, rows, selected))["items"] != expected:
+            raise SystemExit(f"{name}: fast path output differs from the schema")
+
+        before = _time(lambda: _old_path(field, selection, item_type, rows, selected), args.repeat)
+        after = _time(lambda: _new_path(selection, rows, selected), args.repeat)
+        print(f"{name:<28}{before:>12.3f}{after:>12.3f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Tests for chat authentication with Supabase session tokens"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.security import create_access_token
+from app.main import app
+from app.models.user import User
+
+USER_ID = uuid4()
+CHAT_URL = f"{settings.API_V1_PREFIX}/chat/"
+
+
+class _Session:
+    """Answers the user lookup made by authentication, and nothing else"""
+
+    async def execute(self, statement):
+        return SimpleNamespace(scalar_one_or_none=lambda: User(id=USER_ID, email="a@b.c"))
+
+
+async def _session():
+    yield _Session()
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_db] = _session
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+
+
+def _supabase_token(secret=None, audience="authenticated"):
+    """Shaped like the access_token of a Supabase session"""
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": str(USER_ID),
+        "aud": audience,
+        "role": "authenticated",
+        "email": "a@b.c",
+        "iat": now,
+        "exp": now + timedelta(hours=1),
+        "user_metadata": {},
+    }
+    return jwt.encode(claims, secret or settings.JWT_SECRET, algorithm="HS256")
+
+
+def _post(client, token):
+    # An empty body fails validation only once authentication has passed
+    return client.post(CHAT_URL, json={}, headers={"Authorization": f"Bearer {token}"})
+
+
+def test_supabase_session_token_is_accepted(client):
+    assert _post(client, _supabase_token()).status_code == 422
+
+
+def test_supabase_token_is_checked_against_the_supabase_secret(client, monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", "supabase-secret")
+    assert _post(client, _supabase_token("supabase-secret")).status_code == 422
+    assert _post(client, _supabase_token()).status_code == 401
+
+
+def test_backend_token_is_still_accepted(client):
+    token = create_access_token({"sub": str(USER_ID)})
+    assert _post(client, token).status_code == 422
+
+
+@pytest.mark.parametrize(
+    "token",
+    [_supabase_token(secret="wrong-secret"), _supabase_token(audience="anon"), "not-a-jwt"],
+)
+def test_invalid_tokens_are_rejected(client, token):
+    assert _post(client, token).status_code == 401
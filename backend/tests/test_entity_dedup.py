@@ -0,0 +1,65 @@
+"""Tests for duplicate scoring and clustering"""
+from uuid import uuid4
+
+import pytest
+
+from app.services.entity_dedup import _clusters, similarity
+
+
+def test_identical_data_scores_one():
+    data = {"name": "Metformin", "dosage": "500 mg", "frequency": "twice daily"}
+    assert similarity(data, dict(data)) == 1.0
+
+
+def test_jaccard_over_tokens_with_numbers_and_case_normalized():
+    # {"metformin", "500", "mg"} on both sides: "500mg" splits, "500.0" reads as 500
+    assert similarity({"dosage": "500mg Metformin"}, {"dosage": "metformin 500.0 MG"}) == 1.0
+    # {"500", "mg"} vs {"1000", "mg"}: 1 shared of 3
+    assert similarity({"dosage": "500 mg"}, {"dosage": "1000 mg"}) == pytest.approx(1 / 3)
+
+
+def test_score_is_the_mean_over_shared_fields():
+    a = {"name": "Lisinopril", "dosage": "10 mg"}
+    b = {"name": "Lisinopril", "dosage": "20 mg"}
+    assert similarity(a, b) == pytest.approx((1.0 + 1 / 3) / 2)
+
+
+def test_one_sided_blank_and_provenance_fields_are_ignored():
+    a = {"name": "Aspirin", "dosage": "81 mg", "source": "fhir", "fhir_id": "abc", "notes": ""}
+    b = {"name": "aspirin", "frequency": "daily", "source": "upload", "notes": "with food"}
+    assert similarity(a, b) == 1.0
+
+
+def test_no_comparable_fields_scores_one():
+    assert similarity({"dosage": "5 mg"}, {"frequency": "daily"}) == 1.0
+    assert similarity({}, {}) == 1.0
+
+
+def test_similarity_is_symmetric():
+    a = {"name": "Vitamin D3", "dosage": "1000 IU"}
+    b = {"name": "Vitamin D", "dosage": "2000 IU"}
+    assert similarity(a, b) == similarity(b, a)
+
+
+def test_clusters_join_transitive_pairs():
+    a, b, c, d, e = (uuid4() for _ in range(5))
+    # a-b and b-c link a and c without a direct pair; d-e is separate
+    clusters = _clusters([(a, b), (d, e), (b, c)])
+    assert sorted(map(frozenset, clusters), key=len) == [frozenset({d, e}), frozenset({a, b, c})]
+
+
+def test_clusters_merge_two_groups_joined_late():
+    ids = [uuid4() for _ in range(6)]
+    # Three pairs, then two pairs joining them into one group
+    pairs = [(ids[0], ids[1]), (ids[2], ids[3]), (ids[4], ids[5])]
+    pairs += [(ids[1], ids[3]), (ids[5], ids[2])]
+    clusters = _clusters(pairs)
+    assert len(clusters) == 1
+    assert set(clusters[0]) == set(ids)
+    assert len(clusters[0]) == len(ids)
+
+
+def test_clusters_of_no_pairs_and_self_pairs_are_empty():
+    only = uuid4()
+    assert _clusters([]) == []
+    assert _clusters([(only, only)]) == []
@@ -0,0 +1,44 @@
+"""Tests for FHIR resource mapping"""
+from datetime import date
+
+from app.models.medical_entity import EntityType
+from app.models.timeline import EventType
+from app.services.fhir_import import map_resource
+
+
+def test_condition_maps_to_the_documented_diagnosis_shape():
+    mapped = map_resource(
+        {
+            "resourceType": "Condition",
+            "id": "c1",
+            "code": {"text": "Type 2 diabetes"},
+            "clinicalStatus": {"coding": [{"code": "active"}]},
+            "severity": {"text": "Mild"},
+            "onsetDateTime": "2021-03-04",
+        }
+    )
+    assert mapped.entity_type == EntityType.DIAGNOSIS
+    assert mapped.data["condition_name"] == "Type 2 diabetes"
+    assert mapped.data["severity"] == "Mild"
+    assert "condition" not in mapped.data
+    assert mapped.data["source"] == "fhir" and mapped.data["fhir_id"] == "c1"
+    assert mapped.events == [
+        (EventType.DIAGNOSIS_RECEIVED, "Diagnosed with Type 2 diabetes", date(2021, 3, 4))
+    ]
+
+
+def test_vital_sign_observation_maps_to_the_documented_shape():
+    mapped = map_resource(
+        {
+            "resourceType": "Observation",
+            "status": "final",
+            "category": [{"coding": [{"code": "vital-signs"}]}],
+            "code": {"text": "Heart rate"},
+            "valueQuantity": {"value": 72, "unit": "beats/min"},
+            "effectiveDateTime": "2024-01-02T08:00:00Z",
+        }
+    )
+    assert mapped.entity_type == EntityType.VITAL_SIGN
+    assert mapped.data["type"] == "Heart rate"
+    assert mapped.data["unit"] == "beats/min"
+    assert "name" not in mapped.data
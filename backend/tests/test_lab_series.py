@@ -0,0 +1,52 @@
+"""Tests for the lab series helpers"""
+import numpy as np
+import pytest
+
+from app.services.lab_series import lttb_indices, rolling_mean
+
+
+def test_rolling_mean_is_trailing_and_shorter_at_the_start():
+    values = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+    assert rolling_mean(values, 3).tolist() == pytest.approx([1.0, 1.5, 2.0, 3.0, 4.0])
+
+
+def test_rolling_mean_window_of_one_is_identity():
+    values = np.array([3.0, -1.0, 7.5])
+    assert rolling_mean(values, 1).tolist() == pytest.approx(values.tolist())
+
+
+def test_rolling_mean_window_longer_than_series_is_cumulative_mean():
+    values = np.array([2.0, 4.0, 6.0])
+    assert rolling_mean(values, 10).tolist() == pytest.approx([2.0, 3.0, 4.0])
+
+
+@pytest.mark.parametrize("threshold", [5, 6, 100])
+def test_lttb_keeps_everything_when_threshold_is_at_least_n(threshold):
+    x = np.arange(5, dtype=float)
+    y = np.array([1.0, 3.0, 2.0, 5.0, 4.0])
+    assert lttb_indices(x, y, threshold).tolist() == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("threshold", [0, 2])
+def test_lttb_keeps_everything_when_threshold_leaves_no_buckets(threshold):
+    x = np.arange(5, dtype=float)
+    y = np.array([1.0, 3.0, 2.0, 5.0, 4.0])
+    assert lttb_indices(x, y, threshold).tolist() == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("n, threshold", [(10, 3), (100, 10), (1000, 37), (7, 6)])
+def test_lttb_keeps_endpoints_and_returns_sorted_unique_indices(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.sort(rng.uniform(0, 1000, n))
+    y = rng.normal(size=n)
+    indices = lttb_indices(x, y, threshold)
+    assert len(indices) == threshold
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(101, dtype=float)
+    y = np.zeros(101)
+    y[50] = 100.0
+    assert 50 in lttb_indices(x, y, 10).tolist()
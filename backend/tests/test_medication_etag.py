@@ -0,0 +1,61 @@
+"""Tests for conditional GETs of date-dependent medication reads"""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import medical_entities
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.security import get_current_user
+from app.main import app
+from app.models.user import User
+
+ACTIVE_URL = f"{settings.API_V1_PREFIX}/medical-entities/medications/active"
+
+
+class _Today(date):
+    """date whose today() the test controls"""
+
+    current = date(2024, 6, 1)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def data_version(db, user_id):
+        return 7
+
+    async def no_medications(db, user_id, start, end):
+        return []
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(medical_entities, "date", _Today)
+    monkeypatch.setattr(medical_entities, "get_data_version", data_version)
+    monkeypatch.setattr(medical_entities, "find_active_medications", no_medications)
+    app.dependency_overrides[get_db] = no_db
+    app.dependency_overrides[get_current_user] = lambda: User(id=None)
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_defaulted_date_is_part_of_the_etag(client):
+    _Today.current = date(2024, 6, 1)
+    etag = client.get(ACTIVE_URL).headers["etag"]
+    assert client.get(ACTIVE_URL, headers={"If-None-Match": etag}).status_code == 304
+
+    _Today.current = date(2024, 6, 2)
+    response = client.get(ACTIVE_URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_explicit_dates_get_their_own_etags(client):
+    first = client.get(ACTIVE_URL, params={"on": "2024-01-01"}).headers["etag"]
+    second = client.get(ACTIVE_URL, params={"on": "2024-01-02"}).headers["etag"]
+    assert first != second
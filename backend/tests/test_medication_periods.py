@@ -0,0 +1,129 @@
+"""Tests for the medication period interval tree"""
+from datetime import date, timedelta
+from typing import Optional
+from uuid import uuid4
+import math
+import random
+
+import pytest
+
+from app.services.medication_periods import IntervalTree, MedicationPeriod
+
+BASE = date(2020, 1, 1)
+
+
+def _period(start: int, length: Optional[int] = None) -> MedicationPeriod:
+    """A period starting `start` days after BASE; ongoing without a length"""
+    end = None if length is None else BASE + timedelta(days=start + length)
+    return MedicationPeriod(uuid4(), BASE + timedelta(days=start), end)
+
+
+def _depth(node) -> int:
+    if node is None:
+        return 0
+    return 1 + max(_depth(node.left), _depth(node.right))
+
+
+def _check_invariants(node, low=None, high=None):
+    """BST order on key, heap order on priority, and max_end of each subtree"""
+    if node is None:
+        return date.min
+    assert low is None or node.key > low
+    assert high is None or node.key < high
+    for child in (node.left, node.right):
+        assert child is None or child.priority <= node.priority
+    max_end = max(
+        node.period.last_day,
+        _check_invariants(node.left, low, node.key),
+        _check_invariants(node.right, node.key, high),
+    )
+    assert node.max_end == max_end
+    return max_end
+
+
+def _brute_force(periods, start, end):
+    return sorted(
+        (p for p in periods if p.start_date <= end and p.last_day >= start),
+        key=lambda p: (p.start_date, p.entity_id.int),
+    )
+
+
+@pytest.fixture(autouse=True)
+def _seed():
+    random.seed(1234)
+
+
+def test_treap_stays_balanced_on_sorted_inserts():
+    tree = IntervalTree()
+    n = 2000
+    for day in range(n):
+        tree.upsert(_period(day, 30))
+    assert len(tree) == n
+    _check_invariants(tree._root)
+    # A plain BST would be a 2000-deep list; a treap's expected depth is ~3 ln n
+    assert _depth(tree._root) < 6 * math.log(n)
+
+
+def test_overlapping_matches_brute_force_after_upserts_and_removals():
+    rng = random.Random(99)
+    tree = IntervalTree()
+    periods = {}
+    for _ in range(500):
+        period = _period(rng.randrange(1000), rng.choice([None, 0, 5, 60, 400]))
+        tree.upsert(period)
+        periods[period.entity_id] = period
+    for entity_id in rng.sample(sorted(periods), 150):
+        tree.remove(entity_id)
+        del periods[entity_id]
+    _check_invariants(tree._root)
+
+    for _ in range(200):
+        start = BASE + timedelta(days=rng.randrange(-50, 1500))
+        end = start + timedelta(days=rng.choice([0, 1, 30, 365]))
+        expected = _brute_force(periods.values(), start, end)
+        assert tree.overlapping(start, end) == expected
+
+
+def test_point_query_and_period_edges():
+    tree = IntervalTree()
+    ten_days = _period(10, 10)  # Inclusive: days 10 through 20
+    ongoing = _period(30)
+    tree.upsert(ten_days)
+    tree.upsert(ongoing)
+
+    def on(day):
+        return tree.overlapping(BASE + timedelta(days=day), BASE + timedelta(days=day))
+
+    assert on(9) == []
+    assert on(10) == [ten_days]
+    assert on(20) == [ten_days]
+    assert on(21) == []
+    assert on(10_000) == [ongoing]
+
+
+def test_end_before_start_counts_as_a_single_day():
+    period = MedicationPeriod(uuid4(), BASE, BASE - timedelta(days=3))
+    tree = IntervalTree()
+    tree.upsert(period)
+    assert tree.overlapping(BASE, BASE) == [period]
+    assert tree.overlapping(BASE - timedelta(days=3), BASE - timedelta(days=1)) == []
+
+
+def test_upsert_replaces_the_previous_version():
+    tree = IntervalTree()
+    period = _period(0, 5)
+    tree.upsert(period)
+    moved = MedicationPeriod(period.entity_id, BASE + timedelta(days=100), None)
+    tree.upsert(moved)
+
+    assert len(tree) == 1
+    assert tree.overlapping(BASE, BASE + timedelta(days=5)) == []
+    assert tree.overlapping(BASE + timedelta(days=200), BASE + timedelta(days=200)) == [moved]
+    _check_invariants(tree._root)
+
+
+def test_remove_unknown_id_is_a_no_op():
+    tree = IntervalTree()
+    tree.upsert(_period(0, 1))
+    tree.remove(uuid4())
+    assert len(tree) == 1
@@ -0,0 +1,146 @@
+"""Tests for keyset pagination and cursors"""
+from base64 import urlsafe_b64encode
+from datetime import date
+from uuid import UUID, uuid4
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Column, Date, Integer, create_engine, select
+from sqlalchemy.orm import Session, declarative_base
+
+from app.core.pagination import Keyset, check_pagination_mode, decode_cursor, encode_cursor
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "rows"
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=True)
+
+
+# Ties on day, and several NULLs, which a NULLS LAST seek must step through
+DAYS = [date(2024, 1, 3), date(2024, 1, 1), None, date(2024, 1, 3), None, date(2024, 1, 2), None]
+
+KEYSET = Keyset(Row.day, Row.id, parse=date.fromisoformat, nullable=True)
+
+
+@pytest.fixture(scope="module")
+def session():
+    # SQLite has row values and NULLS FIRST/LAST, which is all the seek needs
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(Row(id=index + 1, day=day) for index, day in enumerate(DAYS))
+        session.commit()
+        yield session
+
+
+def _expected_order():
+    """Day descending with NULLs last, then id descending"""
+    rows = [(day, index + 1) for index, day in enumerate(DAYS)]
+    dated = sorted((r for r in rows if r[0] is not None), reverse=True)
+    undated = sorted((r for r in rows if r[0] is None), key=lambda r: r[1], reverse=True)
+    return [row_id for _, row_id in dated + undated]
+
+
+def _page(session, key=None, reverse=False, size=2):
+    query = select(Row)
+    if key is not None:
+        query = query.where(KEYSET.seek(key, reverse=reverse))
+    rows = session.scalars(query.order_by(*KEYSET.order_by(reverse)).limit(size)).all()
+    return list(reversed(rows)) if reverse else list(rows)
+
+
+def _key(row):
+    return decode_cursor(KEYSET.cursor(row), date.fromisoformat, int)
+
+
+def test_forward_seek_walks_the_whole_list_nulls_last(session):
+    seen, key = [], None
+    while True:
+        rows = _page(session, key)
+        if not rows:
+            break
+        seen.extend(row.id for row in rows)
+        key = _key(rows[-1])
+    assert seen == _expected_order()
+
+
+def test_backward_seek_walks_the_whole_list_from_the_end(session):
+    order = _expected_order()
+    last = session.get(Row, order[-1])
+    seen, key = [last.id], _key(last)
+    while True:
+        rows = _page(session, key, reverse=True)
+        if not rows:
+            break
+        seen[:0] = [row.id for row in rows]
+        key = _key(rows[0])
+    assert seen == order
+
+
+@pytest.mark.parametrize("position", range(len(DAYS)))
+def test_seek_from_every_row_in_both_directions(session, position):
+    order = _expected_order()
+    key = _key(session.get(Row, order[position]))
+    after = [row.id for row in _page(session, key, size=len(DAYS))]
+    before = [row.id for row in _page(session, key, reverse=True, size=len(DAYS))]
+    assert after == order[position + 1 :]
+    assert before == order[:position]
+
+
+def test_cursor_round_trip():
+    row_id = uuid4()
+    cursor = encode_cursor(date(2024, 5, 1), row_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, date.fromisoformat, UUID) == (date(2024, 5, 1), row_id)
+    assert decode_cursor(encode_cursor(None, row_id), date.fromisoformat, UUID) == (None, row_id)
+    assert decode_cursor(None, date.fromisoformat, UUID) is None
+
+
+def _raw(payload: bytes) -> str:
+    return urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        "a",
+        _raw(b"\xff\xfe"),
+        _raw(b"not json"),
+        _raw(b'{"day": "2024-01-01"}'),
+        _raw(b'["2024-01-01"]'),
+        _raw(b'["2024-01-01", "%s", 3]' % str(uuid4()).encode()),
+        _raw(b'["yesterday", "%s"]' % str(uuid4()).encode()),
+        _raw(b'["2024-01-01", "not-a-uuid"]'),
+        _raw(b'[20240101, "%s"]' % str(uuid4()).encode()),
+    ],
+)
+def test_tampered_cursors_are_rejected_with_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor, date.fromisoformat, UUID)
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.detail == "Invalid cursor"
+
+
+def test_offset_pagination_stays_the_default():
+    assert check_pagination_mode(None, None, None) is False
+    assert check_pagination_mode(2, None, None) is False
+
+
+def test_cursor_paging_is_selected_by_flag_or_cursor():
+    assert check_pagination_mode(None, None, None, cursor=True) is True
+    assert check_pagination_mode(None, "cursor", None) is True
+    assert check_pagination_mode(None, None, "cursor") is True
+
+
+@pytest.mark.parametrize(
+    "after, before, cursor", [("cursor", None, False), (None, "cursor", False), (None, None, True)]
+)
+def test_page_cannot_be_mixed_with_cursors(after, before, cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        check_pagination_mode(1, after, before, cursor)
+    assert excinfo.value.status_code == 400
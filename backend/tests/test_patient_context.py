@@ -0,0 +1,23 @@
+"""Tests for the compact patient context"""
+from app.models.medical_entity import EntityType
+from app.services.patient_context import _describe_entity
+
+
+def test_diagnosis_uses_the_documented_condition_name_and_severity():
+    data = {"icd10_code": "E11.9", "condition_name": "Type 2 diabetes", "severity": "mild"}
+    assert _describe_entity(EntityType.DIAGNOSIS, data) == "Type 2 diabetes, mild"
+
+
+def test_diagnosis_falls_back_to_condition_then_name():
+    assert _describe_entity(EntityType.DIAGNOSIS, {"condition": "Asthma"}) == "Asthma"
+    assert _describe_entity(EntityType.DIAGNOSIS, {"name": "Migraine"}) == "Migraine"
+    assert _describe_entity(EntityType.DIAGNOSIS, {}) == "diagnosis"
+
+
+def test_distinct_diagnoses_get_distinct_descriptions():
+    names = ["Hypertension", "Hyperlipidemia", "Hypothyroidism"]
+    descriptions = {
+        _describe_entity(EntityType.DIAGNOSIS, {"condition_name": name}).casefold()
+        for name in names
+    }
+    assert len(descriptions) == len(names)
@@ -1,82 +1,46 @@
 import { NextResponse } from "next/server";
-import Anthropic from "@anthropic-ai/sdk";
 
-const anthropic = new Anthropic({
-  apiKey: process.env.ANTHROPIC_API_KEY || "",
-});
+const API_URL = process.env.NEXT_PUBLIC_API_URL;
 
+// Proxies the backend chat endpoint, which builds the patient context and calls
+// the model through its LLM gateway. The reply streams back as server-sent events.
 export async function POST(request: Request) {
-  try {
-    const { message, events } = await request.json();
-
-    // Build medical context from timeline events
-    const medicalContext = events.map((e: any) => {
-      const dateStr = new Date(e.date).toLocaleDateString("en-US", {
-        month: "long",
-        day: "numeric",
-        year: "numeric",
-      });
-      const endDateStr = e.endDate
-        ? ` (until ${new Date(e.endDate).toLocaleDateString("en-US", {
-            month: "long",
-            day: "numeric",
-            year: "numeric",
-          })})`
-        : "";
-
-      return `${e.type.toUpperCase()}: ${e.title} - ${e.description} (Date: ${dateStr}${endDateStr})`;
-    }).join("\n");
-
-    // Create system prompt for medical AI
-    const systemPrompt = `You are a helpful medical assistant for HealthFlow+, a personal health data platform. You help patients understand their medical timeline and health data.
-
-Current Patient Timeline:
-${medicalContext}
-
-Guidelines:
-- Be empathetic and supportive
-- Provide clear, easy-to-understand explanations
-- Reference specific events from the timeline when relevant
-- If asked about medical advice, remind them to consult their healthcare provider
-- Keep responses concise and focused
-- Use markdown formatting for better readability`;
+  const { message, sessionId } = await request.json();
+  const authorization = request.headers.get("authorization");
+
+  if (!API_URL || !authorization) {
+    return NextResponse.json(
+      { detail: API_URL ? "Not authenticated" : "Chat backend is not configured" },
+      { status: API_URL ? 401 : 500 }
+    );
+  }
 
-    // Call Anthropic Claude API
-    const completion = await anthropic.messages.create({
-      model: "claude-3-5-sonnet-20241022",
-      max_tokens: 1024,
-      system: systemPrompt,
-      messages: [
-        {
-          role: "user",
-          content: message,
-        },
-      ],
+  try {
+    const upstream = await fetch(`${API_URL}/api/v1/chat/`, {
+      method: "POST",
+      headers: {
+        Authorization: authorization,
+        "Content-Type": "application/json",
+        Accept: "text/event-stream",
+      },
+      body: JSON.stringify({ message, session_id: sessionId ?? null }),
+      cache: "no-store",
     });
 
-    const responseText = completion.content[0].type === "text"
-      ? completion.content[0].text
-      : "I'm having trouble processing that request.";
-
-    return NextResponse.json({ message: responseText });
-  } catch (error: any) {
-    console.error("Chat API error:", error);
-
-    // Fallback to simple responses if AI fails
-    const { message, events } = await request.json();
-    const lowerMessage = message.toLowerCase();
-
-    let fallbackResponse = "";
-
-    if (lowerMessage.includes("medication")) {
-      const medications = events.filter((e: any) => e.type === "medication");
-      fallbackResponse = `You have ${medications.length} medication(s):\n\n${medications.map((m: any) => `• ${m.title}: ${m.description}`).join("\n")}`;
-    } else if (lowerMessage.includes("summary")) {
-      fallbackResponse = `**Health Summary**\n\n📊 ${events.length} total events\n💊 ${events.filter((e: any) => e.type === "medication").length} medications\n🏥 ${events.filter((e: any) => e.type === "appointment").length} appointments`;
-    } else {
-      fallbackResponse = "AI is temporarily unavailable. Please add your ANTHROPIC_API_KEY to .env.local file.";
+    if (!upstream.ok) {
+      const error = await upstream.json().catch(() => ({ detail: "Chat request failed" }));
+      return NextResponse.json(error, { status: upstream.status || 502 });
     }
 
-    return NextResponse.json({ message: fallbackResponse });
+    return new Response(upstream.body, {
+      headers: {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+      },
+    });
+  } catch (error) {
+    console.error("Chat API error:", error);
+    return NextResponse.json({ detail: "Chat backend is unavailable" }, { status: 502 });
   }
 }
@@ -4,6 +4,7 @@ import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { ArrowUp, MessageCircle, ChevronRight, Loader2 } from "lucide-react";
 import { useState } from "react";
+import { auth } from "@/lib/supabase";
 
 interface MedicalEvent {
   id: string;
@@ -28,10 +29,36 @@ interface Message {
   timestamp: Date;
 }
 
+// Parse a server-sent event stream into (event, data) pairs as they arrive
+async function* readServerSentEvents(body: ReadableStream<Uint8Array>) {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (data) yield { event, data: JSON.parse(data) };
+      boundary = buffer.indexOf("\n\n");
+    }
+  }
+}
+
 export function ChatPanel({ collapsed, onToggle, selectedEvent, events = [] }: ChatPanelProps) {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
+  const [sessionId, setSessionId] = useState<string | null>(null);
 
   // Show selected event details in chat
   const handleEventSelection = (eventId: string | null) => {
@@ -73,31 +100,41 @@ export function ChatPanel({ collapsed, onToggle, selectedEvent, events = [] }: C
     setIsLoading(true);
 
     try {
-      // Call backend API
+      // Call backend API; the patient's records are loaded server-side
+      const {
+        data: { session },
+      } = await auth.getSession();
       const response = await fetch("/api/chat", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          ...(session ? { Authorization: `Bearer ${session.access_token}` } : {}),
         },
-        body: JSON.stringify({
-          message: input,
-          events: events, // Send medical context
-        }),
+        body: JSON.stringify({ message: input, sessionId }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error("Failed to get response");
       }
 
-      const data = await response.json();
+      // Show the reply as it streams in, token by token
+      const aiMessageId = (Date.now() + 1).toString();
+      setMessages((prev) => [
+        ...prev,
+        { id: aiMessageId, role: "assistant", content: "", timestamp: new Date() },
+      ]);
 
-      const aiMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        role: "assistant",
-        content: data.message || "I'm analyzing your health data.",
-        timestamp: new Date(),
-      };
-      setMessages((prev) => [...prev, aiMessage]);
+      for await (const { event, data } of readServerSentEvents(response.body)) {
+        if (event === "token") {
+          setMessages((prev) =>
+            prev.map((m) => (m.id === aiMessageId ? { ...m, content: m.content + data.text } : m))
+          );
+        } else if (event === "sources") {
+          setSessionId(data.session_id);
+        } else if (event === "error") {
+          throw new Error(data.detail);
+        }
+      }
     } catch (error) {
       console.error("Chat error:", error);
       const errorMessage: Message = {
@@ -6,6 +6,8 @@
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE EXTENSION IF NOT EXISTS "pgcrypto";
 CREATE EXTENSION IF NOT EXISTS "vector";
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+CREATE EXTENSION IF NOT EXISTS "btree_gist";
 
 -- ============================================================================
 -- ENUMS
@@ -124,7 +126,10 @@ CREATE TABLE documents (
 
     -- Audit
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    -- Delta sync: the transaction that last wrote the row (set_change_xid on update)
+    change_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint)
 );
 
 COMMENT ON TABLE documents IS 'Uploaded healthcare documents with metadata and processing status';
@@ -157,15 +162,34 @@ CREATE TABLE medical_entities (
     extraction_confidence DECIMAL(3,2), -- 0.00 to 1.00
     is_verified BOOLEAN DEFAULT FALSE, -- User-verified accuracy
 
+    -- Frequently filtered entity_data keys as typed columns, kept in sync by Postgres
+    medication_name TEXT GENERATED ALWAYS AS (
+        CASE WHEN entity_type = 'medication' THEN entity_data->>'name' END
+    ) STORED,
+    lab_test_name TEXT GENERATED ALWAYS AS (
+        CASE WHEN entity_type = 'lab_result' THEN entity_data->>'test_name' END
+    ) STORED,
+    lab_value NUMERIC GENERATED ALWAYS AS (
+        CASE WHEN entity_type = 'lab_result'
+            THEN substring(entity_data->>'value' FROM '-?[0-9]+(?:\.[0-9]+)?')::NUMERIC END
+    ) STORED,
+    lab_unit TEXT GENERATED ALWAYS AS (
+        CASE WHEN entity_type = 'lab_result' THEN NULLIF(btrim(entity_data->>'unit'), '') END
+    ) STORED,
+
     -- Audit
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    -- Delta sync: the transaction that last wrote the row (set_change_xid on update)
+    change_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint)
 );
 
 COMMENT ON TABLE medical_entities IS 'Structured medical data extracted from documents';
 COMMENT ON COLUMN medical_entities.entity_data IS 'Type-specific fields stored as JSON (see documentation for schemas)';
 COMMENT ON COLUMN medical_entities.extraction_confidence IS 'AI extraction confidence score';
 COMMENT ON COLUMN medical_entities.is_verified IS 'User has confirmed accuracy';
+COMMENT ON COLUMN medical_entities.lab_value IS 'First number in entity_data.value, so "13.5 g/dL" is 13.5';
 
 -- Example entity_data structures (documented):
 COMMENT ON COLUMN medical_entities.entity_data IS
@@ -207,13 +231,20 @@ CREATE TABLE timeline_events (
     is_starred BOOLEAN DEFAULT FALSE,
     user_notes TEXT,
 
+    -- Derivation
+    source_entity_id UUID REFERENCES medical_entities(id) ON DELETE CASCADE,
+
     -- Audit
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    -- Delta sync: the transaction that last wrote the row (set_change_xid on update)
+    change_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint)
 );
 
 COMMENT ON TABLE timeline_events IS 'Unified timeline of all health events';
 COMMENT ON COLUMN timeline_events.metadata IS 'Event-specific additional data';
+COMMENT ON COLUMN timeline_events.source_entity_id IS 'Medical entity the event was derived from; NULL for events created by clients';
 
 -- Join table for timeline events and medical entities (many-to-many)
 CREATE TABLE timeline_event_entities (
@@ -379,6 +410,58 @@ CREATE TABLE chat_message_references (
 
 COMMENT ON TABLE chat_message_references IS 'Links chat messages to referenced documents and entities';
 
+-- ============================================================================
+-- CACHE INVALIDATION
+-- ============================================================================
+
+CREATE TABLE user_data_versions (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE user_data_versions IS 'Per-user counter bumped on every write to documents, entities or timeline events';
+COMMENT ON COLUMN user_data_versions.version IS 'Cached answers and derived views built at an older version are stale';
+
+CREATE TABLE user_row_counts (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    table_name TEXT NOT NULL,
+    row_type TEXT NOT NULL,
+    row_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, table_name, row_type)
+);
+
+COMMENT ON TABLE user_row_counts IS 'Per-user, per-type row counts of documents, entities and timeline events, maintained by triggers';
+
+-- ============================================================================
+-- DELTA SYNC
+-- ============================================================================
+
+CREATE TABLE sync_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    table_name TEXT NOT NULL,
+    row_id UUID NOT NULL,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    change_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint)
+);
+
+COMMENT ON TABLE sync_tombstones IS 'Deleted documents, entities and timeline events, so sync clients can drop their copies';
+COMMENT ON COLUMN sync_tombstones.deleted_at IS 'Pruned by prune_sync_tombstones(); clients older than the retention resync in full';
+COMMENT ON COLUMN sync_tombstones.change_xid IS 'Transaction that deleted the row; sync tokens are snapshot xmins compared against it';
+
+-- ============================================================================
+-- ENTITY DEDUPLICATION
+-- ============================================================================
+
+CREATE TABLE entity_dedup_state (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    checked_xid BIGINT NOT NULL
+);
+
+COMMENT ON TABLE entity_dedup_state IS 'How far each user''s medical entities have been checked for duplicates';
+COMMENT ON COLUMN entity_dedup_state.checked_xid IS 'Change watermark; entities with change_xid at or above it are checked on the next run';
+
 -- ============================================================================
 -- INDEXES
 -- ============================================================================
@@ -392,6 +475,10 @@ CREATE INDEX idx_documents_user_id ON documents(user_id);
 CREATE INDEX idx_documents_document_type ON documents(document_type);
 CREATE INDEX idx_documents_processing_status ON documents(processing_status);
 CREATE INDEX idx_documents_uploaded_at ON documents(uploaded_at DESC);
+-- Keyset pagination of a user's documents on (uploaded_at, id)
+CREATE INDEX idx_documents_user_uploaded ON documents(user_id, uploaded_at DESC, id DESC);
+-- Delta sync pages through a user's rows written since a watermark on (change_xid, id)
+CREATE INDEX idx_documents_user_change ON documents(user_id, change_xid, id);
 CREATE INDEX idx_documents_document_date ON documents(document_date DESC NULLS LAST);
 CREATE INDEX idx_documents_user_date ON documents(user_id, document_date DESC NULLS LAST);
 CREATE INDEX idx_documents_tags ON documents USING GIN(tags);
@@ -399,6 +486,8 @@ CREATE INDEX idx_documents_metadata ON documents USING GIN(metadata);
 
 -- Full-text search on extracted text
 CREATE INDEX idx_documents_extracted_text_fts ON documents USING GIN(to_tsvector('english', extracted_text));
+-- Ranked search's file name fallback (ILIKE '%...%')
+CREATE INDEX idx_documents_file_name_trgm ON documents USING GIN(file_name gin_trgm_ops);
 
 -- Medical Entities
 CREATE INDEX idx_entities_user_id ON medical_entities(user_id);
@@ -406,32 +495,91 @@ CREATE INDEX idx_entities_document_id ON medical_entities(document_id);
 CREATE INDEX idx_entities_entity_type ON medical_entities(entity_type);
 CREATE INDEX idx_entities_entity_date ON medical_entities(entity_date DESC NULLS LAST);
 CREATE INDEX idx_entities_user_type ON medical_entities(user_id, entity_type);
-CREATE INDEX idx_entities_user_date ON medical_entities(user_id, entity_date DESC NULLS LAST);
+-- Trailing id makes (entity_date, id) a unique key for keyset pagination
+CREATE INDEX idx_entities_user_date ON medical_entities(user_id, entity_date DESC NULLS LAST, id DESC);
+CREATE INDEX idx_entities_user_change ON medical_entities(user_id, change_xid, id);
 CREATE INDEX idx_entities_data ON medical_entities USING GIN(entity_data);
+-- Ranked search over the string values of entity_data; the expression must match the query's
+CREATE INDEX idx_entities_data_fts ON medical_entities
+    USING GIN(jsonb_to_tsvector('english', entity_data, '["string"]'));
 CREATE INDEX idx_entities_verified ON medical_entities(is_verified) WHERE is_verified = TRUE;
 
--- Specific entity_data searches (examples for common queries)
-CREATE INDEX idx_entities_medication_name ON medical_entities
-    USING GIN((entity_data->'name') gin_trgm_ops)
-    WHERE entity_type = 'medication';
-
-CREATE INDEX idx_entities_lab_test_name ON medical_entities
-    USING GIN((entity_data->'test_name') gin_trgm_ops)
-    WHERE entity_type = 'lab_result';
+-- Name filters and lab series on the generated columns: case-insensitive
+-- equality and value ranges are B-tree scans, substring matches use trigrams
+CREATE INDEX idx_entities_medication_name ON medical_entities(user_id, lower(medication_name))
+    WHERE medication_name IS NOT NULL;
+CREATE INDEX idx_entities_lab_test_date ON medical_entities(user_id, lower(lab_test_name), entity_date)
+    WHERE lab_test_name IS NOT NULL;
+CREATE INDEX idx_entities_lab_test_value ON medical_entities(user_id, lower(lab_test_name), lab_value)
+    WHERE lab_test_name IS NOT NULL;
+
+CREATE INDEX idx_entities_medication_name_trgm ON medical_entities
+    USING GIN(medication_name gin_trgm_ops)
+    WHERE medication_name IS NOT NULL;
+CREATE INDEX idx_entities_lab_test_name_trgm ON medical_entities
+    USING GIN(lab_test_name gin_trgm_ops)
+    WHERE lab_test_name IS NOT NULL;
+
+-- Period a medication was taken, both ends inclusive; no end date means ongoing.
+-- An end before the start collapses to the start day instead of failing the insert.
+CREATE OR REPLACE FUNCTION medication_period(start_date DATE, end_date DATE)
+RETURNS DATERANGE AS $$
+    SELECT daterange(start_date, CASE WHEN end_date < start_date THEN start_date ELSE end_date END, '[]');
+$$ LANGUAGE sql IMMUTABLE;
+
+COMMENT ON FUNCTION medication_period IS 'Inclusive date range of a medication; indexed by idx_entities_medication_period';
+
+-- "Active on date" (@>) and "overlapping a range" (&&) medication queries
+CREATE INDEX idx_entities_medication_period ON medical_entities
+    USING GIST(user_id, medication_period(entity_date, entity_end_date))
+    WHERE entity_type = 'medication' AND entity_date IS NOT NULL;
+
+-- Name that duplicates of an entity share: the type's name field, lowercased,
+-- with runs of anything but letters and digits collapsed to one space
+CREATE OR REPLACE FUNCTION entity_dedup_key(kind entity_type, data JSONB)
+RETURNS TEXT AS $$
+    SELECT NULLIF(btrim(regexp_replace(lower(
+        CASE kind
+            WHEN 'medication' THEN data->>'name'
+            WHEN 'lab_result' THEN data->>'test_name'
+            WHEN 'diagnosis' THEN COALESCE(data->>'condition_name', data->>'condition', data->>'name')
+            WHEN 'symptom' THEN COALESCE(data->>'symptom_name', data->>'name')
+            WHEN 'doctor' THEN data->>'name'
+            WHEN 'appointment' THEN COALESCE(data->>'provider', data->>'reason')
+            WHEN 'procedure' THEN COALESCE(data->>'procedure_name', data->>'name')
+            WHEN 'allergy' THEN data->>'allergen'
+            WHEN 'vital_sign' THEN COALESCE(data->>'type', data->>'name')
+            WHEN 'immunization' THEN data->>'vaccine_name'
+        END), '[^a-z0-9]+', ' ', 'g')), '');
+$$ LANGUAGE sql IMMUTABLE;
+
+COMMENT ON FUNCTION entity_dedup_key IS 'Blocking key for duplicate detection; indexed by idx_entities_dedup_block';
+
+-- Duplicate candidates: same user, type and name within a date window
+CREATE INDEX idx_entities_dedup_block ON medical_entities
+    (user_id, entity_type, entity_dedup_key(entity_type, entity_data), entity_date);
 
 -- Timeline Events
 CREATE INDEX idx_timeline_user_id ON timeline_events(user_id);
 CREATE INDEX idx_timeline_document_id ON timeline_events(document_id);
 CREATE INDEX idx_timeline_event_type ON timeline_events(event_type);
 CREATE INDEX idx_timeline_event_date ON timeline_events(event_date DESC);
-CREATE INDEX idx_timeline_user_date ON timeline_events(user_id, event_date DESC);
+CREATE INDEX idx_timeline_user_date ON timeline_events(user_id, event_date DESC, id DESC);
+CREATE INDEX idx_timeline_user_change ON timeline_events(user_id, change_xid, id);
 CREATE INDEX idx_timeline_starred ON timeline_events(user_id, is_starred) WHERE is_starred = TRUE;
+-- One derived event per entity and event type; derivation re-runs hit ON CONFLICT
+CREATE UNIQUE INDEX idx_timeline_source_entity ON timeline_events(source_entity_id, event_type)
+    WHERE source_entity_id IS NOT NULL;
 CREATE INDEX idx_timeline_tags ON timeline_events USING GIN(tags);
 
 -- Timeline Event Entities (join table)
 CREATE INDEX idx_timeline_entities_event ON timeline_event_entities(timeline_event_id);
 CREATE INDEX idx_timeline_entities_entity ON timeline_event_entities(medical_entity_id);
 
+-- Sync Tombstones
+CREATE INDEX idx_sync_tombstones_user_change ON sync_tombstones(user_id, change_xid, id);
+CREATE INDEX idx_sync_tombstones_deleted_at ON sync_tombstones(deleted_at);
+
 -- Voice Logs
 CREATE INDEX idx_voice_logs_user_id ON voice_logs(user_id);
 CREATE INDEX idx_voice_logs_document_id ON voice_logs(document_id);
@@ -504,6 +652,25 @@ CREATE TRIGGER update_entities_updated_at BEFORE UPDATE ON medical_entities
 CREATE TRIGGER update_timeline_updated_at BEFORE UPDATE ON timeline_events
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Stamp updated rows of the synced tables with the writing transaction.
+-- Inserts get it from the column default.
+CREATE OR REPLACE FUNCTION set_change_xid()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_xid = pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER set_documents_change_xid BEFORE UPDATE ON documents
+    FOR EACH ROW EXECUTE FUNCTION set_change_xid();
+
+CREATE TRIGGER set_entities_change_xid BEFORE UPDATE ON medical_entities
+    FOR EACH ROW EXECUTE FUNCTION set_change_xid();
+
+CREATE TRIGGER set_timeline_change_xid BEFORE UPDATE ON timeline_events
+    FOR EACH ROW EXECUTE FUNCTION set_change_xid();
+
 CREATE TRIGGER update_voice_logs_updated_at BEFORE UPDATE ON voice_logs
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
@@ -524,6 +691,157 @@ $$ LANGUAGE plpgsql;
 CREATE TRIGGER update_session_last_message AFTER INSERT ON chat_messages
     FOR EACH ROW EXECUTE FUNCTION update_chat_session_last_message();
 
+-- Bump the per-user data version once per statement for every user it touched.
+-- Statement-level with transition tables so bulk inserts cost one upsert per user.
+CREATE OR REPLACE FUNCTION bump_user_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Joining users skips users being deleted, whose rows cascade away with them
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO user_data_versions (user_id, version, updated_at)
+        SELECT DISTINCT r.user_id, 1, NOW() FROM old_rows r JOIN users u ON u.id = r.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET version = user_data_versions.version + 1, updated_at = NOW();
+    ELSE
+        INSERT INTO user_data_versions (user_id, version, updated_at)
+        SELECT DISTINCT r.user_id, 1, NOW() FROM new_rows r JOIN users u ON u.id = r.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET version = user_data_versions.version + 1, updated_at = NOW();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE TRIGGER bump_version_documents_insert AFTER INSERT ON documents
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+CREATE TRIGGER bump_version_documents_update AFTER UPDATE ON documents
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+CREATE TRIGGER bump_version_documents_delete AFTER DELETE ON documents
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+
+CREATE TRIGGER bump_version_entities_insert AFTER INSERT ON medical_entities
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+CREATE TRIGGER bump_version_entities_update AFTER UPDATE ON medical_entities
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+CREATE TRIGGER bump_version_entities_delete AFTER DELETE ON medical_entities
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+
+CREATE TRIGGER bump_version_timeline_insert AFTER INSERT ON timeline_events
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+CREATE TRIGGER bump_version_timeline_update AFTER UPDATE ON timeline_events
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+CREATE TRIGGER bump_version_timeline_delete AFTER DELETE ON timeline_events
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+
+-- Keep user_row_counts in step with inserts, deletes and type changes, one
+-- upsert per (user, type) per statement. TG_ARGV[0] is the type column.
+-- Upserts run in key order so concurrent statements cannot deadlock.
+CREATE OR REPLACE FUNCTION maintain_user_row_counts()
+RETURNS TRIGGER AS $$
+DECLARE
+    upsert CONSTANT TEXT := '
+        INSERT INTO user_row_counts (user_id, table_name, row_type, row_count)
+        SELECT changes.user_id, %L, changes.row_type, SUM(changes.delta)
+        FROM (%s) changes
+        JOIN users u ON u.id = changes.user_id
+        GROUP BY changes.user_id, changes.row_type
+        HAVING SUM(changes.delta) <> 0
+        ORDER BY changes.user_id, changes.row_type
+        ON CONFLICT (user_id, table_name, row_type) DO UPDATE
+        SET row_count = user_row_counts.row_count + EXCLUDED.row_count';
+    changes TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changes := format('SELECT user_id, %1$I::text AS row_type, 1 AS delta FROM new_rows', TG_ARGV[0]);
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := format('SELECT user_id, %1$I::text AS row_type, -1 AS delta FROM old_rows', TG_ARGV[0]);
+    ELSE
+        -- Only rows whose owner or type changed move between counters
+        changes := format(
+            'SELECT o.user_id, o.%1$I::text AS row_type, -1 AS delta
+             FROM old_rows o JOIN new_rows n ON n.id = o.id
+             WHERE (o.user_id, o.%1$I) IS DISTINCT FROM (n.user_id, n.%1$I)
+             UNION ALL
+             SELECT n.user_id, n.%1$I::text, 1
+             FROM old_rows o JOIN new_rows n ON n.id = o.id
+             WHERE (o.user_id, o.%1$I) IS DISTINCT FROM (n.user_id, n.%1$I)',
+            TG_ARGV[0]
+        );
+    END IF;
+    EXECUTE format(upsert, TG_TABLE_NAME, changes);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE TRIGGER count_documents_insert AFTER INSERT ON documents
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_user_row_counts('document_type');
+CREATE TRIGGER count_documents_update AFTER UPDATE ON documents
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_user_row_counts('document_type');
+CREATE TRIGGER count_documents_delete AFTER DELETE ON documents
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_user_row_counts('document_type');
+
+CREATE TRIGGER count_entities_insert AFTER INSERT ON medical_entities
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_user_row_counts('entity_type');
+CREATE TRIGGER count_entities_update AFTER UPDATE ON medical_entities
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_user_row_counts('entity_type');
+CREATE TRIGGER count_entities_delete AFTER DELETE ON medical_entities
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_user_row_counts('entity_type');
+
+CREATE TRIGGER count_timeline_insert AFTER INSERT ON timeline_events
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_user_row_counts('event_type');
+CREATE TRIGGER count_timeline_update AFTER UPDATE ON timeline_events
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_user_row_counts('event_type');
+CREATE TRIGGER count_timeline_delete AFTER DELETE ON timeline_events
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_user_row_counts('event_type');
+
+-- Record a tombstone per deleted row for delta sync, one INSERT per statement.
+-- Joining users skips users being deleted: their tombstones would cascade away anyway.
+CREATE OR REPLACE FUNCTION record_sync_tombstones()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sync_tombstones (user_id, table_name, row_id)
+    SELECT r.user_id, TG_TABLE_NAME, r.id FROM old_rows r JOIN users u ON u.id = r.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE TRIGGER tombstone_documents_delete AFTER DELETE ON documents
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+CREATE TRIGGER tombstone_entities_delete AFTER DELETE ON medical_entities
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+CREATE TRIGGER tombstone_timeline_delete AFTER DELETE ON timeline_events
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+-- Backfill counters for rows written before the triggers existed
+INSERT INTO user_row_counts (user_id, table_name, row_type, row_count)
+SELECT user_id, 'documents', document_type::text, COUNT(*) FROM documents GROUP BY 1, 3
+UNION ALL
+SELECT user_id, 'medical_entities', entity_type::text, COUNT(*) FROM medical_entities GROUP BY 1, 3
+UNION ALL
+SELECT user_id, 'timeline_events', event_type::text, COUNT(*) FROM timeline_events GROUP BY 1, 3
+ON CONFLICT (user_id, table_name, row_type) DO NOTHING;
+
 -- ============================================================================
 -- ROW LEVEL SECURITY (RLS)
 -- ============================================================================
@@ -540,6 +858,10 @@ ALTER TABLE embeddings ENABLE ROW LEVEL SECURITY;
 ALTER TABLE chat_sessions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE chat_messages ENABLE ROW LEVEL SECURITY;
 ALTER TABLE chat_message_references ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_data_versions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_row_counts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE sync_tombstones ENABLE ROW LEVEL SECURITY;
+ALTER TABLE entity_dedup_state ENABLE ROW LEVEL SECURITY;
 
 -- Users policies
 CREATE POLICY "Users can view own profile"
@@ -708,6 +1030,26 @@ CREATE POLICY "Users can manage own message references"
         )
     );
 
+-- User data versions policies (written only by triggers)
+CREATE POLICY "Users can view own data version"
+    ON user_data_versions FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- User row counts policies (written only by triggers)
+CREATE POLICY "Users can view own row counts"
+    ON user_row_counts FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- Sync tombstones policies (written only by triggers)
+CREATE POLICY "Users can view own sync tombstones"
+    ON sync_tombstones FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- Entity dedup state policies (written by the dedup engine)
+CREATE POLICY "Users can view own dedup state"
+    ON entity_dedup_state FOR SELECT
+    USING (auth.uid() = user_id);
+
 -- ============================================================================
 -- HELPER FUNCTIONS
 -- ============================================================================
@@ -828,6 +1170,21 @@ $$ LANGUAGE plpgsql STABLE;
 
 COMMENT ON FUNCTION get_entity_summary IS 'Get summary statistics of medical entities by type';
 
+-- Function to drop tombstones older than the sync retention (schedule daily, e.g. with pg_cron).
+-- Keep retention in step with SYNC_TOMBSTONE_RETENTION_DAYS in the backend settings.
+CREATE OR REPLACE FUNCTION prune_sync_tombstones(retention INTERVAL DEFAULT INTERVAL '30 days')
+RETURNS BIGINT AS $$
+DECLARE
+    pruned BIGINT;
+BEGIN
+    DELETE FROM sync_tombstones WHERE deleted_at < NOW() - retention;
+    GET DIAGNOSTICS pruned = ROW_COUNT;
+    RETURN pruned;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION prune_sync_tombstones IS 'Delete sync tombstones older than the retention; returns the number deleted';
+
 -- ============================================================================
 -- VIEWS
 -- ============================================================================
@@ -858,7 +1215,7 @@ CREATE VIEW active_medications AS
 SELECT
     me.id,
     me.user_id,
-    me.entity_data->>'name' AS medication_name,
+    me.medication_name,
     me.entity_data->>'dosage' AS dosage,
     me.entity_data->>'frequency' AS frequency,
     me.entity_date AS start_date,